@@ -1,5 +1,11 @@
+import asyncio
 import socket
 import threading
+import time
+import re
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
 from tkinter import Text, END
 import datetime
 import numpy as np
@@ -88,6 +94,10 @@ MyType = np.dtype([('len', np.int16,),
                    ('Reserve3', np.int8, (24,)),
                    ])
 
+# Every feedback packet is one MyType record; test_value carries this magic
+FEED_PACKET_SIZE = MyType.itemsize
+FEED_MAGIC = 0x123456789abcdef
+
 
 # Read controller and servo alarm files
 def alarmAlarmJsonFile():
@@ -102,8 +112,158 @@ def alarmAlarmJsonFile():
     return dataController, dataServo
 
 
+class CommandEncoder:
+    """
+  Precompiled builder for one controller command
+  Fixed parameters go through a format string prepared once, optional dynParams
+  are appended comma separated, and the result is the UTF-8 payload to send.
+  Commands called without parameters return a constant bytes object.
+  """
+
+    def __init__(self, name, fixed=""):
+        self.name = name
+        self.head = name + "("
+        self._format = (self.head + fixed).format
+        self.bare = (name + "()").encode("utf-8")
+
+    def __call__(self, *args, dynParams=()):
+        if not args and not dynParams:
+            return self.bare
+        text = self._format(*args) if args else self.head
+        if dynParams:
+            extra = ",".join([str(params) for params in dynParams])
+            text = text + "," + extra if args else text + extra
+        return (text + ")").encode("utf-8")
+
+
+# Command name -> format of its fixed parameters (optional ones are dynParams)
+COMMAND_TABLE = (
+    # Dashboard port 29999
+    ("EnableRobot", ""), ("DisableRobot", ""), ("ClearError", ""), ("ResetRobot", ""),
+    ("SpeedFactor", "{:d}"), ("User", "{:d}"), ("Tool", "{:d}"), ("RobotMode", ""),
+    ("PayLoad", "{:f},{:f}"), ("DO", "{:d},{:d}"),
+    ("AccJ", "{:d}"), ("AccL", "{:d}"), ("SpeedJ", "{:d}"), ("SpeedL", "{:d}"),
+    ("Arch", "{:d}"), ("CP", "{:d}"), ("LimZ", "{:d}"), ("RunScript", "{:s}"),
+    ("StopScript", ""), ("PauseScript", ""), ("ContinueScript", ""),
+    ("GetHoldRegs", "{:d},{:d},{:d}"), ("SetHoldRegs", "{:d},{:d},{:d},{:d}"),
+    ("GetErrorID", ""), ("DOExecute", "{:d},{:d}"), ("ToolDO", "{:d},{:d}"),
+    ("ToolDOExecute", "{:d},{:d}"), ("SetArmOrientation", "{:d}"), ("SetPayload", "{:f}"),
+    ("PositiveSolution", "{:f},{:f},{:f},{:f},{:d},{:d}"),
+    ("InverseSolution", "{:f},{:f},{:f},{:f},{:d},{:d}"),
+    ("SetCollisionLevel", "{:d}"), ("GetAngle", ""), ("GetPose", ""), ("EmergencyStop", ""),
+    ("ModbusCreate", "{:s},{:d},{:d},{:d}"), ("ModbusClose", "{:d}"),
+    ("GetInBits", "{:d},{:d},{:d}"), ("GetInRegs", "{:d},{:d},{:d}"),
+    ("GetCoils", "{:d},{:d},{:d}"), ("SetCoils", "{:d},{:d},{:d}"),
+    ("DI", "{:d}"), ("ToolDI", "{:d}"), ("DOGroup", ""), ("BrakeControl", "{:d},{:d}"),
+    ("StartDrag", ""), ("StopDrag", ""), ("LoadSwitch", "{:d}"),
+    ("wait", "{:d}"), ("pause", ""), ("continue", ""),
+    # Move port 30003
+    ("MovJ", "{:f},{:f},{:f},{:f}"), ("MovL", "{:f},{:f},{:f},{:f}"),
+    ("JointMovJ", "{:f},{:f},{:f},{:f}"), ("RelMovJ", "{:f},{:f},{:f},{:f}"),
+    ("RelMovL", "{:f},{:f},{:f},{:f}"), ("MovLIO", "{:f},{:f},{:f},{:f}"),
+    ("MovJIO", "{:f},{:f},{:f},{:f}"), ("Arc", "{:f},{:f},{:f},{:f},{:f},{:f},{:f},{:f}"),
+    ("Circle", "{:f},{:f},{:f},{:f},{:f},{:f},{:f},{:f},{:d}"), ("MoveJog", "{:s}"),
+    ("Sync", ""), ("RelMovJUser", "{:f},{:f},{:f},{:f},{:d}"),
+    ("RelMovLUser", "{:f},{:f},{:f},{:f},{:d}"), ("RelJointMovJ", "{:f},{:f},{:f},{:f}"),
+    ("MovJExt", "{:f}"), ("SyncAll", ""),
+    ("ServoJ", "{:f},{:f},{:f},{:f}"), ("ServoP", "{:f},{:f},{:f},{:f}"),
+)
+COMMANDS = {name: CommandEncoder(name, fixed) for name, fixed in COMMAND_TABLE}
+
+# Send/receive tracing level of DobotApi.log_level
+LOG_OFF = 0
+LOG_ERROR = 1
+LOG_TRACE = 2
+
+
+# Parsed command reply: "ErrorID,{values},Command(params);"
+class DobotReply(namedtuple("DobotReply", ["error_id", "values", "command"])):
+    __slots__ = ()
+
+    @property
+    def numbers(self):
+        """
+    All numbers in values, flattened in order (e.g. the alarm ids of GetErrorID)
+    """
+        found = []
+        stack = [iter(self.values)]
+        while stack:
+            for item in stack[-1]:
+                if isinstance(item, tuple):
+                    stack.append(iter(item))
+                    break
+                if isinstance(item, (int, float)) and not isinstance(item, bool):
+                    found.append(item)
+            else:
+                stack.pop()
+        return found
+
+
+_REPLY_PATTERN = re.compile(r"^\s*(-?\d+)\s*,\s*\{(.*)\}\s*,?\s*(.*?)\s*;?\s*$", re.S)
+
+
+def _to_tuple(value):
+    if isinstance(value, list):
+        return tuple(_to_tuple(v) for v in value)
+    return value
+
+
+def parse_reply(reply):
+    """
+    Split a raw reply string into DobotReply(error_id, values, command)
+    values holds numbers (nested lists become tuples); error_id is None when
+    the reply does not follow the controller format
+    """
+    match = _REPLY_PATTERN.match(reply or "")
+    if match is None:
+        return DobotReply(None, (), reply)
+    error_id, body, command = match.groups()
+    try:
+        values = _to_tuple(json.loads("[" + body + "]"))
+    except ValueError:
+        values = tuple(v.strip() for v in body.split(",") if v.strip())
+    return DobotReply(int(error_id), values, command)
+
+
+class ReplyFramer:
+    """
+  Reassemble ';'-terminated replies from a byte stream
+  Partial replies are kept until the terminator arrives and bytes after it are
+  kept for the next reply, so split and coalesced reads stay in step
+  """
+
+    TERMINATOR = b";"
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+    Append received bytes to the buffer
+    """
+        self.buffer += data
+
+    def pop(self):
+        """
+    Return the next complete reply already buffered, or None
+    """
+        end = self.buffer.find(self.TERMINATOR)
+        if end < 0:
+            return None
+        reply = bytes(self.buffer[:end + 1])
+        del self.buffer[:end + 1]
+        return str(reply, encoding="utf-8").strip()
+
+    def clear(self):
+        self.buffer.clear()
+
+
 class DobotApi:
-    def __init__(self, ip, port, *args):
+    # LOG_TRACE logs every command and reply; set LOG_ERROR or LOG_OFF (on the
+    # class or an instance) to skip that formatting on high-rate paths
+    log_level = LOG_TRACE
+
+    def __init__(self, ip, port, *args, pipelined=False, reply_timeout=None, connect_timeout=None):
         self.ip = ip
         self.port = port
         self.socket_dobot = 0
@@ -112,10 +272,25 @@ class DobotApi:
         if args:
             self.text_log = args[0]
 
+        # Pipelined transport: requests are written back to back and a reader
+        # thread resolves one Future per reply in FIFO order (the controller
+        # answers commands on a port strictly in the order it received them).
+        self.pipelined = pipelined
+        self.reply_timeout = reply_timeout
+        self.__sendLock = threading.Lock()
+        self.__pending = deque()
+        self.__local = threading.local()
+        self.__reader = None
+        self.__readerError = None
+        self.framer = ReplyFramer()
+
         if self.port == 29999 or self.port == 30003 or self.port == 30004:
             try:
                 self.socket_dobot = socket.socket()
+                # Bounded connect when asked; replies are then awaited without a socket timeout
+                self.socket_dobot.settimeout(connect_timeout)
                 self.socket_dobot.connect((self.ip, self.port))
+                self.socket_dobot.settimeout(None)
             except socket.error:
                 print(socket.error)
                 raise Exception(
@@ -124,6 +299,13 @@ class DobotApi:
             raise Exception(
                 f"Connect to dashboard server need use port {self.port} !")
 
+        if self.pipelined:
+            if self.port == 30004:
+                raise Exception(
+                    f"Pipelined mode is only available on the command ports, not {self.port} !")
+            self.__reader = threading.Thread(target=self.__read_replies, daemon=True)
+            self.__reader.start()
+
     def log(self, text):
         if self.text_log:
             date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S ")
@@ -131,120 +313,441 @@ class DobotApi:
         else:
             print(text)
 
+    def trace(self, direction, payload):
+        """
+    Log a sent or received payload; formatted only when tracing is enabled
+    """
+        if self.log_level >= LOG_TRACE:
+            if isinstance(payload, bytes):
+                payload = str(payload, encoding="utf-8")
+            self.log(f"{direction} {self.ip}:{self.port}: {payload}")
+
     def send_data(self, string):
         try:
-            self.log(f"Send to {self.ip}:{self.port}: {string}")
-            self.socket_dobot.send(str.encode(string, 'utf-8'))
+            self.trace("Send to", string)
+            self.socket_dobot.send(string if isinstance(string, bytes) else str.encode(string, 'utf-8'))
         except Exception as e:
-            print(e)
+            if self.log_level >= LOG_ERROR:
+                print(e)
 
     def wait_reply(self):
         """
     Read the return value
+    Reads until the ';' terminator; bytes of a following reply are kept
     """
-        data = ""
+        data_str = self.framer.pop()
         try:
-            data = self.socket_dobot.recv(1024)
+            while data_str is None:
+                data = self.socket_dobot.recv(1024)
+                if len(data) == 0:
+                    break
+                self.framer.feed(data)
+                data_str = self.framer.pop()
         except Exception as e:
-            print(e)
+            if self.log_level >= LOG_ERROR:
+                print(e)
 
-        finally:
-            if len(data) == 0:
-                data_str = data
-            else:
-                data_str = str(data, encoding="utf-8")
-                self.log(f'Receive from {self.ip}:{self.port}: {data_str}')
-            return data_str
+        if data_str is None:
+            return ""
+        self.trace("Receive from", data_str)
+        return data_str
 
     def close(self):
         """
     Close the port
+    shutdown() first, since close() alone does not wake a thread blocked in
+    recv on this socket; commands still waiting for a reply fail with
+    ConnectionError
     """
         if (self.socket_dobot != 0):
+            try:
+                self.socket_dobot.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.socket_dobot.close()
+        if self.pipelined:
+            error = ConnectionError(f"Connection to {self.ip}:{self.port} closed")
+            with self.__sendLock:
+                if self.__readerError is None:
+                    self.__readerError = error
+            while self.__pending:
+                future = self.__pending.popleft()
+                if not future.done():
+                    future.set_exception(error)
+            reader = self.__reader
+            if reader is not None and reader is not threading.current_thread():
+                reader.join(timeout=1.0)
 
     def sendRecvMsg(self, string):
         """
     send-recv Sync
+    In pipelined mode the command is submitted without taking the global lock;
+    inside a deferred() block the Future is returned instead of the reply
     """
+        if self.pipelined:
+            future = self.submit(string)
+            deferred = getattr(self.__local, "deferred", None)
+            if deferred is not None:
+                deferred.append(future)
+                return future
+            return future.result(self.reply_timeout)
         with self.__globalLock:
             self.send_data(string)
             recvData = self.wait_reply()
             return recvData
 
+    def submit(self, string):
+        """
+    Send a command (str or encoded bytes) without waiting for its reply
+    (pipelined mode only); return a Future that resolves to the reply string
+    """
+        if not self.pipelined:
+            raise Exception(f"Port {self.port} is not opened in pipelined mode !")
+        future = Future()
+        with self.__sendLock:
+            if self.__readerError is not None:
+                future.set_exception(self.__readerError)
+                return future
+            # Register before sending so the reader can never see a reply
+            # whose Future is not queued yet.
+            self.__pending.append(future)
+            try:
+                self.trace("Send to", string)
+                self.socket_dobot.sendall(string if isinstance(string, bytes) else str.encode(string, 'utf-8'))
+            except Exception as e:
+                self.__pending.remove(future)
+                future.set_exception(e)
+        return future
+
+    @contextmanager
+    def deferred(self):
+        """
+    Queue every command issued by this thread inside the block without waiting
+    for the replies; they are all awaited when the block exits
+    example: with move.deferred() as pending: move.MovJ(...); move.MovL(...)
+    """
+        if not self.pipelined:
+            yield []
+            return
+        outer = getattr(self.__local, "deferred", None)
+        pending = []
+        self.__local.deferred = pending
+        try:
+            yield pending
+        finally:
+            self.__local.deferred = outer
+        for future in pending:
+            future.result(self.reply_timeout)
+
+    def __read_replies(self):
+        error = None
+        try:
+            while True:
+                data = self.socket_dobot.recv(1024)
+                if len(data) == 0:
+                    error = ConnectionError(f"Connection to {self.ip}:{self.port} closed")
+                    break
+                self.framer.feed(data)
+                # Several replies may arrive in one read, or one across reads
+                reply_str = self.framer.pop()
+                while reply_str is not None:
+                    self.trace("Receive from", reply_str)
+                    # popleft is atomic; taking __sendLock here could deadlock
+                    # against a sendall() blocked on a full controller buffer.
+                    future = self.__pending.popleft() if self.__pending else None
+                    if future is not None:
+                        future.set_result(reply_str)
+                    reply_str = self.framer.pop()
+        except Exception as e:
+            error = e
+        with self.__sendLock:
+            if self.__readerError is None:
+                self.__readerError = error
+        while self.__pending:
+            future = self.__pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    @property
+    def connection_error(self):
+        """
+    The error that stopped the pipelined reader, None while the port is healthy
+    """
+        return self.__readerError
+
+    def sendRecvReply(self, string):
+        """
+    send-recv Sync, returning the parsed DobotReply(error_id, values, command)
+    """
+        return parse_reply(self.sendRecvMsg(string))
+
     def __del__(self):
         self.close()
 
 
-class DobotApiDashboard(DobotApi):
+class FeedbackReader:
     """
-  Define class dobot_api_dashboard to establish a connection to Dobot
+  Realtime feedback reader for port 30004
+  Packets are received with recv_into straight into a preallocated ring of
+  MyType records, so no bytes are allocated or copied per packet. latest is a
+  1-element MyType array (indexed like np.frombuffer(data, dtype=MyType)) that
+  stays valid until the ring wraps around; copy() it to keep it longer.
+  """
+
+    def __init__(self, feed, slots=4):
+        # feed: a DobotApi connected to port 30004, or a connected socket
+        self.socket_dobot = getattr(feed, "socket_dobot", feed)
+        self._ring = np.zeros(slots, dtype=MyType)
+        raw = self._ring.view(np.uint8).reshape(slots, FEED_PACKET_SIZE)
+        self._buffers = [memoryview(raw[i]) for i in range(slots)]
+        self._slots = [self._ring[i:i + 1] for i in range(slots)]
+        self._magic = self._ring['test_value']
+        self._index = 0
+        self.latest = None
+        self.packet_count = 0
+        self.bad_packets = 0
+        self.listeners = []
+        self.running = False
+        self.thread = None
+
+    def read_packet(self):
+        """
+    Block until one full packet is received
+    Return it as a 1-element MyType array, or None if the magic number is wrong
+    """
+        index = self._index
+        buffer = self._buffers[index]
+        hasRead = 0
+        while hasRead < FEED_PACKET_SIZE:
+            view = buffer if hasRead == 0 else buffer[hasRead:]
+            count = self.socket_dobot.recv_into(view, FEED_PACKET_SIZE - hasRead)
+            if count == 0:
+                raise ConnectionError("Feedback connection closed")
+            hasRead += count
+        if self._magic[index] != FEED_MAGIC:
+            self.bad_packets += 1
+            return None
+        self._index = (index + 1) % len(self._slots)
+        record = self._slots[index]
+        self.latest = record
+        self.packet_count += 1
+        for listener in self.listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                print(f"Feedback listener error: {e}")
+        return record
+
+    def add_listener(self, callback):
+        """
+    Call callback(record) from the reader thread for every valid packet
+    """
+        self.listeners.append(callback)
+
+    def run(self):
+        self.running = True
+        try:
+            while self.running:
+                self.read_packet()
+        except Exception as e:
+            if self.running:
+                print(f"Feedback reader stopped: {e}")
+        finally:
+            self.running = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout=1.0):
+        """
+    Stop the reader thread and wait up to timeout for it to exit
+    A thread blocked in recv only wakes once its socket is shut down, so
+    close the feed client first.
+    """
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+
+class MotionMonitor:
+    """
+  Motion completion driven by the feedback stream instead of Sync() or polling
+  Register update() as a FeedbackReader listener; waiters block on a
+  threading.Condition (or await an asyncio.Event) that is signalled by the
+  feedback thread, and wake up when the arm is within tolerance of the target
+  and the controller reports that it is neither running a motion nor working
+  through its command queue. Only packets received after the wait started
+  count, so feedback from before the move cannot satisfy it.
+  Call reset() when the feedback connection drops: waiters then fail at once
+  and has_feedback() is False until packets arrive again.
+  """
+
+    def __init__(self, reader=None, tolerance=1.0):
+        self.tolerance = tolerance
+        self.pose = None
+        self.joints = None
+        self.running = False
+        self.queue_running = False
+        self.error = False
+        self.packet_count = 0
+        self.live = False
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        if reader is not None:
+            reader.add_listener(self.update)
+
+    def update(self, record):
+        pose = [float(v) for v in record['tool_vector_actual'][0][:4]]
+        joints = [float(v) for v in record['q_actual'][0][:4]]
+        with self._cond:
+            self.pose = pose
+            self.joints = joints
+            self.running = bool(record['RunningStatus'][0][0])
+            self.queue_running = bool(record['isRunQueuedCmd'][0][0])
+            self.error = bool(record['ErrorStatus'][0][0])
+            self.packet_count += 1
+            self.live = True
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event, predicate in waiters:
+            if predicate():
+                loop.call_soon_threadsafe(event.set)
+
+    def has_feedback(self):
+        return self.live
+
+    def reset(self):
+        """
+    Forget the feedback state after the feedback connection is lost
+    """
+        with self._cond:
+            self.live = False
+            self.pose = None
+            self.joints = None
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event, predicate in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def arrived(self, target, tolerance=None, joint=False, since=None):
+        """
+    True when the first len(target) axes are within tolerance, no motion is
+    running and the command queue is idle
+    target: (x, y, z, r), or (j1, j2, j3, j4) with joint=True
+    since: a packet_count; only packets received after it count
+    """
+        actual = self.joints if joint else self.pose
+        if actual is None or self.running or self.queue_running:
+            return False
+        if since is not None and self.packet_count <= since:
+            return False
+        tolerance = self.tolerance if tolerance is None else tolerance
+        for index in range(len(target)):
+            if abs(actual[index] - target[index]) > tolerance:
+                return False
+        return True
+
+    def wait_arrive(self, target, tolerance=None, joint=False, timeout=None, since=None):
+        """
+    Block until arrived(target) or the robot reports an error
+    since: packet_count taken before the motion was sent; by default the
+    count when the wait starts, so at least one new packet is required
+    Return True on arrival, False on error, lost feedback or timeout
+    """
+        with self._cond:
+            since = self.packet_count if since is None else since
+
+            def done():
+                return self.error or not self.live or self.arrived(target, tolerance, joint, since)
+
+            self._cond.wait_for(done, timeout)
+            return not self.error and self.arrived(target, tolerance, joint, since)
+
+    async def wait_arrive_async(self, target, tolerance=None, joint=False, timeout=None, since=None):
+        """
+    asyncio version of wait_arrive
+    """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        since = self.packet_count if since is None else since
+
+        def predicate():
+            return self.error or not self.live or self.arrived(target, tolerance, joint, since)
+
+        waiter = (loop, event, predicate)
+        with self._cond:
+            if predicate():
+                event.set()
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.remove(waiter)
+        with self._cond:
+            return not self.error and self.arrived(target, tolerance, joint, since)
+
+
+class DashboardCommands:
+    """
+  Dashboard (29999) commands; each returns self.sendRecvMsg(command), so the
+  blocking and the asyncio clients share them
   """
 
     def EnableRobot(self, *dynParams):
         """
     Enable the robot
     """
-        string = "EnableRobot("
-        for i in range(len(dynParams)):
-            if i == len(dynParams) - 1:
-                string = string + str(dynParams[i])
-            else:
-                string = string + str(dynParams[i]) + ","
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["EnableRobot"](dynParams=dynParams))
 
     def DisableRobot(self):
         """
     Disable the robot
     """
-        string = "DisableRobot()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["DisableRobot"]())
 
     def ClearError(self):
         """
     Clear controller alarm information
     """
-        string = "ClearError()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ClearError"]())
 
     def ResetRobot(self):
         """
     Robot stop
     """
-        string = "ResetRobot()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ResetRobot"]())
 
     def SpeedFactor(self, speed):
         """
     Setting the Global rate
     speed:Rate value(Value range:1~100)
     """
-        string = "SpeedFactor({:d})".format(speed)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SpeedFactor"](speed))
 
     def User(self, index):
         """
     Select the calibrated user coordinate system
     index : Calibrated index of user coordinates
     """
-        string = "User({:d})".format(index)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["User"](index))
 
     def Tool(self, index):
         """
     Select the calibrated tool coordinate system
     index : Calibrated index of tool coordinates
     """
-        string = "Tool({:d})".format(index)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["Tool"](index))
 
     def RobotMode(self):
         """
     View the robot status
     """
-        string = "RobotMode()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RobotMode"]())
 
     def PayLoad(self, weight, inertia):
         """
@@ -252,8 +755,7 @@ class DobotApiDashboard(DobotApi):
     weight : The load weight
     inertia: The load moment of inertia
     """
-        string = "PayLoad({:f},{:f})".format(weight, inertia)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["PayLoad"](weight, inertia))
 
     def DO(self, index, status):
         """
@@ -261,93 +763,81 @@ class DobotApiDashboard(DobotApi):
     index : Digital output index (Value range:1~24)
     status : Status of digital signal output port(0:Low level, 1:High level)
     """
-        string = "DO({:d},{:d})".format(index, status)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["DO"](index, status))
 
     def AccJ(self, speed):
         """
     Set joint acceleration ratio (Only for MovJ, MovJIO, MovJR, JointMovJ commands)
     speed : Joint acceleration ratio (Value range:1~100)
     """
-        string = "AccJ({:d})".format(speed)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["AccJ"](speed))
 
     def AccL(self, speed):
         """
     Set the coordinate system acceleration ratio (Only for MovL, MovLIO, MovLR, Jump, Arc, Circle commands)
     speed : Cartesian acceleration ratio (Value range:1~100)
     """
-        string = "AccL({:d})".format(speed)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["AccL"](speed))
 
     def SpeedJ(self, speed):
         """
     Set joint speed ratio (Only for MovJ, MovJIO, MovJR, JointMovJ commands)
     speed : Joint velocity ratio (Value range:1~100)
     """
-        string = "SpeedJ({:d})".format(speed)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SpeedJ"](speed))
 
     def SpeedL(self, speed):
         """
     Set the cartesian acceleration ratio (Only for MovL, MovLIO, MovLR, Jump, Arc, Circle commands)
     speed : Cartesian acceleration ratio (Value range:1~100)
     """
-        string = "SpeedL({:d})".format(speed)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SpeedL"](speed))
 
     def Arch(self, index):
         """
     Set the Jump gate parameter index (This index contains: start point lift height, maximum lift height, end point drop height)
     index : Parameter index (Value range:0~9)
     """
-        string = "Arch({:d})".format(index)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["Arch"](index))
 
     def CP(self, ratio):
         """
     Set smooth transition ratio
     ratio : Smooth transition ratio (Value range:1~100)
     """
-        string = "CP({:d})".format(ratio)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["CP"](ratio))
 
     def LimZ(self, value):
         """
     Set the maximum lifting height of door type parameters
     value : Maximum lifting height (Highly restricted:Do not exceed the limit position of the z-axis of the manipulator)
     """
-        string = "LimZ({:d})".format(value)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["LimZ"](value))
 
     def RunScript(self, project_name):
         """
     Run the script file
     project_name : Script file name
     """
-        string = "RunScript({:s})".format(project_name)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RunScript"](project_name))
 
     def StopScript(self):
         """
     Stop scripts
     """
-        string = "StopScript()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["StopScript"]())
 
     def PauseScript(self):
         """
     Pause the script
     """
-        string = "PauseScript()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["PauseScript"]())
 
     def ContinueScript(self):
         """
     Continue running the script
     """
-        string = "ContinueScript()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ContinueScript"]())
 
     def GetHoldRegs(self, id, addr, count, type=None):
         """
@@ -363,13 +853,7 @@ class DobotApiDashboard(DobotApi):
         "F32" : reads 32-bit single-precision floating-point number (4 bytes, occupying 2 registers)
         "F64" : reads 64-bit double precision floating point number (8 bytes, occupying 4 registers)
     """
-        if type is not None:
-            string = "GetHoldRegs({:d},{:d},{:d},{:s})".format(
-                id, addr, count, type)
-        else:
-            string = "GetHoldRegs({:d},{:d},{:d})".format(
-                id, addr, count)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetHoldRegs"](id, addr, count, dynParams=(type,) if type is not None else ()))
 
     def SetHoldRegs(self, id, addr, count, table, type=None):
         """
@@ -385,150 +869,292 @@ class DobotApiDashboard(DobotApi):
         "F32" : reads 32-bit single-precision floating-point number (4 bytes, occupying 2 registers)
         "F64" : reads 64-bit double precision floating point number (8 bytes, occupying 4 registers)
     """
-        if type is not None:
-            string = "SetHoldRegs({:d},{:d},{:d},{:d})".format(
-                id, addr, count, table)
-        else:
-            string = "SetHoldRegs({:d},{:d},{:d},{:d},{:s})".format(
-                id, addr, count, table, type)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SetHoldRegs"](id, addr, count, table, dynParams=(type,) if type is not None else ()))
 
     def GetErrorID(self):
         """
     Get robot error code
     """
-        string = "GetErrorID()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetErrorID"]())
 
     def DOExecute(self, offset1, offset2):
-        string = "DOExecute({:d},{:d}".format(offset1, offset2) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["DOExecute"](offset1, offset2))
 
     def ToolDO(self, offset1, offset2):
-        string = "ToolDO({:d},{:d}".format(offset1, offset2) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ToolDO"](offset1, offset2))
 
     def ToolDOExecute(self, offset1, offset2):
-        string = "ToolDOExecute({:d},{:d}".format(offset1, offset2) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ToolDOExecute"](offset1, offset2))
 
     def SetArmOrientation(self, offset1):
-        string = "SetArmOrientation({:d}".format(offset1) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SetArmOrientation"](offset1))
 
     def SetPayload(self, offset1, *dynParams):
-        string = "SetPayload({:f}".format(
-            offset1)
-        for params in dynParams:
-            string = string + "," + str(params) + ","
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SetPayload"](offset1, dynParams=dynParams))
 
     def PositiveSolution(self, offset1, offset2, offset3, offset4, user, tool):
-        string = "PositiveSolution({:f},{:f},{:f},{:f},{:d},{:d}".format(offset1, offset2, offset3, offset4, user,
-                                                                           tool) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["PositiveSolution"](offset1, offset2, offset3, offset4, user, tool))
 
     def InverseSolution(self, offset1, offset2, offset3, offset4, user, tool, *dynParams):
-        string = "InverseSolution({:f},{:f},{:f},{:f},{:d},{:d}".format(offset1, offset2, offset3, offset4, user, tool)
-        for params in dynParams:
-            print(type(params), params)
-            string = string + repr(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["InverseSolution"](offset1, offset2, offset3, offset4, user, tool, dynParams=dynParams))
 
     def SetCollisionLevel(self, offset1):
-        string = "SetCollisionLevel({:d}".format(offset1) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SetCollisionLevel"](offset1))
 
     def GetAngle(self):
-        string = "GetAngle()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetAngle"]())
 
     def GetPose(self):
-        string = "GetPose()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetPose"]())
 
     def EmergencyStop(self):
-        string = "EmergencyStop()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["EmergencyStop"]())
 
     def ModbusCreate(self, ip, port, slave_id, isRTU):
-        string = "ModbusCreate({:s},{:d},{:d},{:d}".format(ip, port, slave_id, isRTU) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ModbusCreate"](ip, port, slave_id, isRTU))
 
     def ModbusClose(self, offset1):
-        string = "ModbusClose({:d}".format(offset1) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ModbusClose"](offset1))
 
     def GetInBits(self, offset1, offset2, offset3):
-        string = "GetInBits({:d},{:d},{:d}".format(offset1, offset2, offset3) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetInBits"](offset1, offset2, offset3))
 
     def GetInRegs(self, offset1, offset2, offset3, *dynParams):
-        string = "GetInRegs({:d},{:d},{:d}".format(offset1, offset2, offset3)
-        for params in dynParams:
-            print(type(params), params)
-            string = string + params[0]
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetInRegs"](offset1, offset2, offset3, dynParams=[params[0] for params in dynParams]))
 
     def GetCoils(self, offset1, offset2, offset3):
-        string = "GetCoils({:d},{:d},{:d}".format(offset1, offset2, offset3) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["GetCoils"](offset1, offset2, offset3))
 
     def SetCoils(self, offset1, offset2, offset3, offset4):
-        string = "SetCoils({:d},{:d},{:d}".format(offset1, offset2, offset3) + "," + repr(offset4) + ")"
-        print(str(offset4))
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["SetCoils"](offset1, offset2, offset3, dynParams=(repr(offset4),)))
 
     def DI(self, offset1):
-        string = "DI({:d}".format(offset1) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["DI"](offset1))
 
     def ToolDI(self, offset1):
-        string = "DI({:d}".format(offset1) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["ToolDI"](offset1))
 
     def DOGroup(self, *dynParams):
-        string = "DOGroup("
-        for params in dynParams:
-            string = string + str(params) + ","
-        string = string + ")"
-        return self.wait_reply()
+        return self.sendRecvMsg(COMMANDS["DOGroup"](dynParams=dynParams))
 
     def BrakeControl(self, offset1, offset2):
-        string = "BrakeControl({:d},{:d}".format(offset1, offset2) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["BrakeControl"](offset1, offset2))
 
     def StartDrag(self):
-        string = "StartDrag()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["StartDrag"]())
 
     def StopDrag(self):
-        string = "StopDrag()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["StopDrag"]())
 
     def LoadSwitch(self, offset1):
-        string = "LoadSwitch({:d}".format(offset1) + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["LoadSwitch"](offset1))
 
     def wait(self,t):
-        string = "wait({:d}".format(t)+")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["wait"](t))
 
     def pause(self):
-        string = "pause()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["pause"]())
 
     def Continue(self):
-        string = "continue()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["continue"]())
 
 
-class DobotApiMove(DobotApi):
+class DobotApiDashboard(DobotApi, DashboardCommands):
     """
-  Define class dobot_api_move to establish a connection to Dobot
+  Define class dobot_api_dashboard to establish a connection to Dobot
+  """
+
+
+class Trajectory:
+    """
+  Builder that queues a whole motion path and syncs only once at the end
+  Each waypoint takes a blend value, the CP (smooth transition) ratio used when
+  passing it (0: stop at the waypoint, 1~100: blend into the next segment).
+  The ratio is set with the dashboard's CP(ratio) command, so blending needs
+  the dashboard client. Waypoints sharing a ratio are queued back to back; a
+  ratio change waits until the controller has acknowledged every segment
+  queued before it. The last waypoint always
+  stops exactly on target and leaves CP at 0 for later motion commands.
+  example:
+      move.trajectory(dash).movj(x1, y1, z1, r, blend=50).movl(x2, y2, z2, r).run()
+  """
+
+    def __init__(self, move, dash=None):
+        self.move = move
+        self.dash = dash
+        self.waypoints = []
+
+    def _add(self, command, values, blend, dynParams):
+        self.waypoints.append((command, values, int(blend), dynParams))
+        return self
+
+    def movj(self, x, y, z, r, *dynParams, blend=0):
+        return self._add(self.move.MovJ, (x, y, z, r), blend, dynParams)
+
+    def movl(self, x, y, z, r, *dynParams, blend=0):
+        return self._add(self.move.MovL, (x, y, z, r), blend, dynParams)
+
+    def joint_movj(self, j1, j2, j3, j4, *dynParams, blend=0):
+        return self._add(self.move.JointMovJ, (j1, j2, j3, j4), blend, dynParams)
+
+    @property
+    def target(self):
+        """
+    Values of the final waypoint
+    """
+        return self.waypoints[-1][1] if self.waypoints else None
+
+    def submit(self):
+        """
+    Queue every waypoint on the controller without waiting for motion
+    """
+        last = len(self.waypoints) - 1
+        blended = any(blend > 0 for _, _, blend, _ in self.waypoints[:last])
+        if blended and self.dash is None:
+            raise ValueError("Blended waypoints need the dashboard client: move.trajectory(dash)")
+        # Consecutive waypoints with the same ratio form one run
+        runs = []
+        for index, (command, values, blend, dynParams) in enumerate(self.waypoints):
+            wanted = min(blend, 100) if index != last else 0
+            if not runs or runs[-1][0] != wanted:
+                runs.append((wanted, []))
+            runs[-1][1].append((command, values, dynParams))
+        for wanted, segments in runs:
+            if blended:
+                # CP goes out on the dashboard port, so it is only ordered after
+                # the segments of the previous run because their replies were
+                # awaited when its deferred() block exited
+                reply = parse_reply(self.dash.CP(wanted))
+                if reply.error_id != 0:
+                    raise Exception(f"CP({wanted}) failed with error {reply.error_id}")
+            with self.move.deferred():
+                for command, values, dynParams in segments:
+                    command(*values, *dynParams)
+        return self
+
+    def run(self, sync=True):
+        """
+    Queue the path, then block on a single Sync() unless sync is False
+    """
+        self.submit()
+        if sync:
+            return self.move.Sync()
+        return None
+
+
+class ServoStreamer:
+    """
+  Fixed-rate setpoint stream on the move port (ServoP for poses, ServoJ for joints)
+  Setpoints come from a generator/iterator passed to run()/start(), or are
+  pushed into a bounded ring (the newest ones win when it overflows). Every
+  period the next setpoint is sent without waiting for its reply; missed
+  deadlines are counted and the schedule skips ahead instead of bursting.
+  The move client should be opened with pipelined=True.
+  example:
+      stream = move.servo_stream(rate=125)
+      stream.start()
+      stream.push((x, y, z, r))   # e.g. from the vision loop
+  """
+
+    def __init__(self, move, rate=125.0, joint=False, ring_size=32):
+        self.move = move
+        self.period = 1.0 / rate
+        self.encoder = COMMANDS["ServoJ" if joint else "ServoP"]
+        self.ring = deque(maxlen=ring_size)
+        self.running = False
+        self.thread = None
+        self.sent = 0
+        self.late = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_lateness = 0.0
+
+    def push(self, setpoint):
+        """
+    Queue a 4-value setpoint; the oldest queued one is dropped when full
+    """
+        if len(self.ring) == self.ring.maxlen:
+            self.dropped += 1
+        self.ring.append(setpoint)
+
+    def _on_reply(self, future):
+        if future.exception() is not None:
+            self.errors += 1
+            return
+        reply = parse_reply(future.result())
+        if reply.error_id != 0:
+            self.errors += 1
+
+    def _send(self, setpoint):
+        payload = self.encoder(*setpoint)
+        if self.move.pipelined:
+            self.move.submit(payload).add_done_callback(self._on_reply)
+        elif parse_reply(self.move.sendRecvMsg(payload)).error_id != 0:
+            self.errors += 1
+        self.sent += 1
+
+    def run(self, source=None, duration=None):
+        """
+    Stream until stop(), the source is exhausted or duration seconds elapse
+    """
+        self.running = True
+        source = iter(source) if source is not None else None
+        start = time.perf_counter()
+        deadline = start + self.period
+        try:
+            while self.running:
+                if duration is not None and deadline - start > duration:
+                    break
+                if source is not None:
+                    try:
+                        setpoint = next(source)
+                    except StopIteration:
+                        break
+                else:
+                    setpoint = self.ring.popleft() if self.ring else None
+                if setpoint is not None:
+                    self._send(setpoint)
+                now = time.perf_counter()
+                if now < deadline:
+                    time.sleep(deadline - now)
+                    deadline += self.period
+                else:
+                    lateness = now - deadline
+                    self.late += 1
+                    self.max_lateness = max(self.max_lateness, lateness)
+                    # Skip the periods already missed rather than catching up
+                    missed = int(lateness / self.period)
+                    self.dropped += missed
+                    deadline += (missed + 1) * self.period
+        finally:
+            self.running = False
+
+    def start(self, source=None, duration=None):
+        self.thread = threading.Thread(target=self.run, args=(source, duration), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def stats(self):
+        return {
+            "rate": 1.0 / self.period,
+            "sent": self.sent,
+            "late": self.late,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "max_lateness_ms": round(self.max_lateness * 1000.0, 3),
+            "queued": len(self.ring),
+        }
+
+
+class MoveCommands:
+    """
+  Motion port (30003) commands; each returns self.sendRecvMsg(command), so the
+  blocking and the asyncio clients share them
   """
 
     def MovJ(self, x, y, z, r, *dynParams):
@@ -539,13 +1165,7 @@ class DobotApiMove(DobotApi):
     z: A number in the Cartesian coordinate system z
     r: A number in the Cartesian coordinate system R
     """
-        string = "MovJ({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["MovJ"](x, y, z, r, dynParams=dynParams))
 
     def MovL(self, x, y, z, r, *dynParams):
         """
@@ -555,26 +1175,14 @@ class DobotApiMove(DobotApi):
     z: A number in the Cartesian coordinate system z
     r: A number in the Cartesian coordinate system R
     """
-        string = "MovL({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["MovL"](x, y, z, r, dynParams=dynParams))
 
     def JointMovJ(self, j1, j2, j3, j4, *dynParams):
         """
     Joint motion interface (linear motion mode)
     j1~j6:Point position values on each joint
     """
-        string = "JointMovJ({:f},{:f},{:f},{:f}".format(
-            j1, j2, j3, j4)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["JointMovJ"](j1, j2, j3, j4, dynParams=dynParams))
 
     def Jump(self):
         print("TBD")
@@ -584,12 +1192,7 @@ class DobotApiMove(DobotApi):
     Offset motion interface (point-to-point motion mode)
     j1~j6:Point position values on each joint
     """
-        string = "RelMovJ({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RelMovJ"](x, y, z, r, dynParams=dynParams))
 
     def RelMovL(self, offsetX, offsetY, offsetZ, offsetR, *dynParams):
         """
@@ -599,11 +1202,7 @@ class DobotApiMove(DobotApi):
     z: Offset in the Cartesian coordinate system Z
     r: Offset in the Cartesian coordinate system R
     """
-        string = "RelMovL({:f},{:f},{:f},{:f}".format(offsetX, offsetY, offsetZ, offsetR)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RelMovL"](offsetX, offsetY, offsetZ, offsetR, dynParams=dynParams))
 
     def MovLIO(self, x, y, z, r, *dynParams):
         """
@@ -619,13 +1218,7 @@ class DobotApiMove(DobotApi):
                 Index :Digital output index (Value range: 1~24)
                 Status :Digital output state (Value range: 0/1)
     """
-        # example： MovLIO(0,50,0,0,0,0,(0,50,1,0),(1,1,2,1))
-        string = "MovLIO({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["MovLIO"](x, y, z, r, dynParams=dynParams))
 
     def MovJIO(self, x, y, z, r, *dynParams):
         """
@@ -641,15 +1234,7 @@ class DobotApiMove(DobotApi):
                 Index :Digital output index (Value range: 1~24)
                 Status :Digital output state (Value range: 0/1)
     """
-        # example： MovJIO(0,50,0,0,0,0,(0,50,1,0),(1,1,2,1))
-        string = "MovJIO({:f},{:f},{:f},{:f}".format(
-            x, y, z, r)
-        self.log("Send to 192.168.1.6:29999:" + string)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["MovJIO"](x, y, z, r, dynParams=dynParams))
 
     def Arc(self, x1, y1, z1, r1, x2, y2, z2, r2, *dynParams):
         """
@@ -658,13 +1243,7 @@ class DobotApiMove(DobotApi):
     x2, y2, z2, r2 :Is the value of the end point coordinates
     Note: This instruction should be used together with other movement instructions
     """
-        string = "Arc({:f},{:f},{:f},{:f},{:f},{:f},{:f},{:f}".format(
-            x1, y1, z1, r1, x2, y2, z2, r2)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        print(string)
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["Arc"](x1, y1, z1, r1, x2, y2, z2, r2, dynParams=dynParams))
 
     def Circle(self, x1, y1, z1, r1, x2, y2, z2, r2, count, *dynParams):
         """
@@ -674,12 +1253,7 @@ class DobotApiMove(DobotApi):
     x2, y2, z2, r2 :Is the value of the end point coordinates
     Note: This instruction should be used together with other movement instructions
     """
-        string = "Circle({:f},{:f},{:f},{:f},{:f},{:f},{:f},{:f},{:d}".format(
-            x1, y1, z1, r1, x2, y2, z2, r2, count)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["Circle"](x1, y1, z1, r1, x2, y2, z2, r2, count, dynParams=dynParams))
 
     def MoveJog(self, axis_id=None, *dynParams):
         """
@@ -695,20 +1269,14 @@ class DobotApiMove(DobotApi):
                 tool_index: tool index is 0 ~ 9 (default value is 0)
     """
         if axis_id is not None:
-            string = "MoveJog({:s}".format(axis_id)
-        else:
-            string = "MoveJog("
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+            return self.sendRecvMsg(COMMANDS["MoveJog"](axis_id, dynParams=dynParams))
+        return self.sendRecvMsg(COMMANDS["MoveJog"](dynParams=dynParams))
 
     def Sync(self):
         """
     The blocking program executes the queue instruction and returns after all the queue instructions are executed
     """
-        string = "Sync()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["Sync"]())
 
     def RelMovJUser(self, offset_x, offset_y, offset_z, offset_r, user, *dynParams):
         """
@@ -724,12 +1292,7 @@ class DobotApiMove(DobotApi):
                 acc_j: Set acceleration scale value, value range: 1 ~ 100
                 tool: Set tool coordinate system index
     """
-        string = "RelMovJUser({:f},{:f},{:f},{:f}, {:d}".format(
-            offset_x, offset_y, offset_z, offset_r, user)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RelMovJUser"](offset_x, offset_y, offset_z, offset_r, user, dynParams=dynParams))
 
     def RelMovLUser(self, offset_x, offset_y, offset_z, offset_r, user, *dynParams):
         """
@@ -744,12 +1307,7 @@ class DobotApiMove(DobotApi):
                 acc_l: Set acceleration scale value, value range: 1 ~ 100
                 tool: Set tool coordinate system index
     """
-        string = "RelMovLUser({:f},{:f},{:f},{:f}, {:d}".format(
-            offset_x, offset_y, offset_z, offset_r, user)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RelMovLUser"](offset_x, offset_y, offset_z, offset_r, user, dynParams=dynParams))
 
     def RelJointMovJ(self, offset1, offset2, offset3, offset4, *dynParams):
         """
@@ -760,23 +1318,44 @@ class DobotApiMove(DobotApi):
                 speed_j: Set Cartesian speed scale, value range: 1 ~ 100
                 acc_j: Set acceleration scale value, value range: 1 ~ 100
     """
-        string = "RelJointMovJ({:f},{:f},{:f},{:f}".format(
-            offset1, offset2, offset3, offset4)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["RelJointMovJ"](offset1, offset2, offset3, offset4, dynParams=dynParams))
 
     def MovJExt(self, offset1, *dynParams):
-        string = "MovJExt({:f}".format(
-            offset1)
-        for params in dynParams:
-            string = string + "," + str(params)
-        string = string + ")"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(COMMANDS["MovJExt"](offset1, dynParams=dynParams))
 
     def SyncAll(self):
-        string = "SyncAll()"
-        return self.sendRecvMsg(string)
-    
-    
\ No newline at end of file
+        return self.sendRecvMsg(COMMANDS["SyncAll"]())
+
+    def ServoJ(self, j1, j2, j3, j4):
+        """
+    Joint setpoint for streaming servo motion (no queue, executed on arrival)
+    j1~j4: Target position of each joint
+    """
+        return self.sendRecvMsg(COMMANDS["ServoJ"](j1, j2, j3, j4))
+
+    def ServoP(self, x, y, z, r):
+        """
+    Cartesian setpoint for streaming servo motion (no queue, executed on arrival)
+    x, y, z, r: Target position in the Cartesian coordinate system
+    """
+        return self.sendRecvMsg(COMMANDS["ServoP"](x, y, z, r))
+
+
+class DobotApiMove(DobotApi, MoveCommands):
+    """
+  Define class dobot_api_move to establish a connection to Dobot
+  """
+
+    def trajectory(self, dash=None):
+        """
+    Start a Trajectory (queued path with per-waypoint blending) on this port
+    dash: the DobotApiDashboard used to set the CP ratio of blended waypoints
+    """
+        return Trajectory(self, dash)
+
+    def servo_stream(self, rate=125.0, joint=False, ring_size=32):
+        """
+    Create a ServoStreamer pushing ServoP (or ServoJ with joint=True) setpoints
+    at a fixed rate on this port
+    """
+        return ServoStreamer(self, rate, joint, ring_size)
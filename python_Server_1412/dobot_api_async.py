@@ -0,0 +1,242 @@
+import asyncio
+from collections import deque
+
+import numpy as np
+
+from dobot_api import (DobotApi, DashboardCommands, MoveCommands, MyType, ReplyFramer,
+                       parse_reply, FEED_PACKET_SIZE, FEED_MAGIC)
+
+
+class AsyncDobotApi:
+    """
+  asyncio counterpart of DobotApi
+  Commands are written as soon as they are issued and every reply resolves the
+  Future of its request in FIFO order, so several commands may be in flight
+  example:
+      dash = AsyncDobotDashboard(ip, 29999)
+      await dash.connect()
+      await dash.EnableRobot()
+  """
+
+    def __init__(self, ip, port, *args):
+        self.ip = ip
+        self.port = port
+        self.text_log = None
+        if args:
+            self.text_log = args[0]
+        if self.port not in (29999, 30003):
+            raise Exception(
+                f"Connect to dashboard server need use port {self.port} !")
+        self.reader = None
+        self.writer = None
+        self.framer = ReplyFramer()
+        self._pending = deque()
+        self._reader_task = None
+
+    @property
+    def log_level(self):
+        # Read at call time so a later DobotApi.log_level = ... applies here too
+        return self.__dict__.get("_log_level", DobotApi.log_level)
+
+    @log_level.setter
+    def log_level(self, value):
+        self._log_level = value
+
+    log = DobotApi.log
+    trace = DobotApi.trace
+
+    async def connect(self):
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.ip, self.port)
+        except OSError as e:
+            raise Exception(
+                f"Unable to set socket connection use port {self.port} !", e)
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_replies())
+        return self
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def submit(self, string):
+        """
+    Write a command and return the Future of its reply without waiting
+    """
+        future = asyncio.get_running_loop().create_future()
+        if self._reader_task is None or self._reader_task.done():
+            future.set_exception(ConnectionError(f"Port {self.port} is not connected"))
+            return future
+        self._pending.append(future)
+        self.trace("Send to", string)
+        self.writer.write(string if isinstance(string, bytes) else str.encode(string, 'utf-8'))
+        return future
+
+    async def sendRecvMsg(self, string):
+        """
+    send-recv, awaiting only this command's reply
+    """
+        future = self.submit(string)
+        if not future.done():
+            await self.writer.drain()
+        return await future
+
+    async def sendRecvReply(self, string):
+        return parse_reply(await self.sendRecvMsg(string))
+
+    async def wait_reply(self):
+        """
+    Read the return value of a command sent without submit()
+    """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        return await future
+
+    async def _read_replies(self):
+        error = None
+        try:
+            while True:
+                data = await self.reader.read(1024)
+                if len(data) == 0:
+                    error = ConnectionError(f"Connection to {self.ip}:{self.port} closed")
+                    break
+                self.framer.feed(data)
+                reply_str = self.framer.pop()
+                while reply_str is not None:
+                    self.trace("Receive from", reply_str)
+                    if self._pending:
+                        future = self._pending.popleft()
+                        if not future.done():
+                            future.set_result(reply_str)
+                    reply_str = self.framer.pop()
+        except asyncio.CancelledError:
+            # close(): fail the waiters, then let the task end as cancelled
+            self._fail_pending(ConnectionError(f"Connection to {self.ip}:{self.port} closed"))
+            raise
+        except Exception as e:
+            error = e
+        self._fail_pending(error)
+
+    def _fail_pending(self, error):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    def close(self):
+        """
+    Close the port
+    """
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    async def aclose(self):
+        self.close()
+        if self._reader_task is not None:
+            # Ends cancelled (or with the error that stopped it); either is expected here
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        if self.writer is not None:
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+
+    def __del__(self):
+        pass
+
+
+# The command methods are shared with the blocking clients: every method ends
+# in `return self.sendRecvMsg(string)`, which here returns an awaitable. The
+# blocking-only helpers (deferred, trajectory, servo_stream) live on the
+# blocking classes and are not inherited.
+class AsyncDobotDashboard(AsyncDobotApi, DashboardCommands):
+    """
+  asyncio dashboard client (port 29999), same methods as DobotApiDashboard
+  """
+
+
+class AsyncDobotMove(AsyncDobotApi, MoveCommands):
+    """
+  asyncio motion client (port 30003), same commands as DobotApiMove
+  """
+
+
+class AsyncDobotFeed:
+    """
+  asyncio reader for the realtime feedback port (30004)
+  latest holds the newest valid MyType record; packets() yields each one
+  """
+
+    def __init__(self, ip, port=30004):
+        self.ip = ip
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.latest = None
+        self.packet_count = 0
+        self._updated = None
+
+    async def connect(self):
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.ip, self.port)
+        except OSError as e:
+            raise Exception(
+                f"Unable to set socket connection use port {self.port} !", e)
+        # Created here so the event belongs to the running loop
+        self._updated = asyncio.Event()
+        return self
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def read_packet(self):
+        """
+    Read one packet; return the MyType record, or None if the magic is wrong
+    """
+        data = await self.reader.readexactly(FEED_PACKET_SIZE)
+        feedInfo = np.frombuffer(data, dtype=MyType)
+        if int(feedInfo['test_value'][0]) != FEED_MAGIC:
+            return None
+        self.latest = feedInfo[0]
+        self.packet_count += 1
+        self._updated.set()
+        self._updated.clear()
+        return self.latest
+
+    async def packets(self):
+        while True:
+            record = await self.read_packet()
+            if record is not None:
+                yield record
+
+    async def run(self):
+        """
+    Keep latest up to date until the connection closes
+    """
+        async for _ in self.packets():
+            pass
+
+    async def wait_update(self):
+        """
+    Wait for the next valid packet and return it
+    """
+        await self._updated.wait()
+        return self.latest
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    async def aclose(self):
+        self.close()
+        if self.writer is not None:
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
@@ -0,0 +1,166 @@
+import time
+
+import cv2
+import numpy as np
+
+SUBSAMPLING = ("444", "422", "420", "gray")
+
+# MCU size per TJSAMP_* value (444, 422, 420, gray, 440, 411), as in turbojpeg.h
+TJ_MCU_WIDTH = (8, 16, 16, 8, 8, 32)
+TJ_MCU_HEIGHT = (8, 8, 16, 8, 16, 8)
+
+
+def jpeg_buf_size(width, height, sample):
+    """
+  Worst-case JPEG size for an image, the same bound as libjpeg-turbo's tjBufSize()
+  """
+    mcu_w, mcu_h = TJ_MCU_WIDTH[sample], TJ_MCU_HEIGHT[sample]
+    chroma = 0 if sample == 3 else 4 * 64 // (mcu_w * mcu_h)
+    padded = (width + mcu_w - 1) // mcu_w * mcu_w * ((height + mcu_h - 1) // mcu_h * mcu_h)
+    return padded * (2 + chroma) + 2048
+
+
+class OpenCVEncoder:
+    """
+  JPEG through cv2.imencode
+  imencode() cannot write into a given buffer, so every encode() returns a
+  memoryview of a newly allocated array.
+  """
+
+    name = "opencv"
+
+    def __init__(self, subsampling=None):
+        self.subsampling = subsampling
+        self._flags = {}
+        factors = {
+            "444": "IMWRITE_JPEG_SAMPLING_FACTOR_444",
+            "422": "IMWRITE_JPEG_SAMPLING_FACTOR_422",
+            "420": "IMWRITE_JPEG_SAMPLING_FACTOR_420",
+        }
+        # Sampling factors need OpenCV >= 4.5.5; older builds use their default (4:2:0)
+        if subsampling in factors and hasattr(cv2, factors[subsampling]):
+            self._flags = {cv2.IMWRITE_JPEG_SAMPLING_FACTOR: getattr(cv2, factors[subsampling])}
+
+    def encode(self, image, quality=80):
+        if self.subsampling == "gray" and image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        for key, value in self._flags.items():
+            params += [key, value]
+        ok, jpeg = cv2.imencode(".jpg", image, params)
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        return memoryview(jpeg).cast("B")
+
+
+class TurboJPEGEncoder:
+    """
+  JPEG through libjpeg-turbo (PyTurboJPEG), encoding into a reused buffer
+  encode() returns a memoryview of that buffer, valid until the next call.
+  """
+
+    name = "turbojpeg"
+
+    def __init__(self, subsampling=None):
+        import turbojpeg
+        self.turbojpeg = turbojpeg
+        self.jpeg = turbojpeg.TurboJPEG()
+        self.subsampling = subsampling or "420"
+        self.sample = {
+            "444": turbojpeg.TJSAMP_444,
+            "422": turbojpeg.TJSAMP_422,
+            "420": turbojpeg.TJSAMP_420,
+            "gray": turbojpeg.TJSAMP_GRAY,
+        }[self.subsampling]
+        self._buffer = None
+        self._in_place = True
+
+    def encode(self, image, quality=80):
+        pixel_format = self.turbojpeg.TJPF_GRAY if image.ndim == 2 else self.turbojpeg.TJPF_BGR
+        sample = self.turbojpeg.TJSAMP_GRAY if image.ndim == 2 else self.sample
+        if self._in_place:
+            # A JPEG can be larger than the raw image (noise at high quality), so use
+            # libjpeg-turbo's own bound rather than a margin over image.nbytes
+            needed = jpeg_buf_size(image.shape[1], image.shape[0], sample)
+            if self._buffer is None or len(self._buffer) < needed:
+                self._buffer = bytearray(needed)
+            try:
+                _, size = self.jpeg.encode(image, quality=int(quality), pixel_format=pixel_format,
+                                           jpeg_subsample=sample, dst=self._buffer)
+                return memoryview(self._buffer)[:size]
+            except TypeError:
+                # PyTurboJPEG < 1.7 has no dst argument
+                self._in_place = False
+        return memoryview(self.jpeg.encode(image, quality=int(quality), pixel_format=pixel_format,
+                                           jpeg_subsample=sample))
+
+
+ENCODERS = {"opencv": OpenCVEncoder, "turbojpeg": TurboJPEGEncoder}
+
+
+def _check_subsampling(subsampling):
+    if subsampling is not None and subsampling not in SUBSAMPLING:
+        raise ValueError(f"subsampling must be one of {SUBSAMPLING}")
+
+
+def make_encoder(backend="auto", subsampling=None):
+    """
+  "auto" picks libjpeg-turbo when PyTurboJPEG and its library load, else OpenCV
+  """
+    _check_subsampling(subsampling)
+    if backend == "auto":
+        try:
+            return TurboJPEGEncoder(subsampling)
+        except Exception:
+            return OpenCVEncoder(subsampling)
+    return ENCODERS[backend](subsampling)
+
+
+def available_encoders(subsampling=None):
+    _check_subsampling(subsampling)
+    encoders = []
+    for cls in ENCODERS.values():
+        try:
+            encoders.append(cls(subsampling))
+        except Exception:
+            pass
+    return encoders
+
+
+def benchmark(encoders=None, resolutions=((640, 360), (1280, 720), (1920, 1080)),
+              quality=80, repeat=20, image=None):
+    """
+  Mean encode time per backend and resolution
+  image: a representative BGR frame (e.g. from the camera), resized to each
+  resolution; a synthetic test pattern is used when not given.
+  """
+    encoders = encoders or available_encoders()
+    if image is None:
+        height, width = 1080, 1920
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        image = np.dstack([x + 0 * y, y + 0 * x, (x + y) / 2]).astype(np.uint8)
+        noise = np.random.default_rng(0).integers(0, 24, image.shape, dtype=np.uint8)
+        image = cv2.add(image, noise)
+    results = []
+    for width, height in resolutions:
+        frame = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        for encoder in encoders:
+            size = len(encoder.encode(frame, quality))
+            start = time.perf_counter()
+            for _ in range(repeat):
+                encoder.encode(frame, quality)
+            elapsed = (time.perf_counter() - start) / repeat
+            results.append({
+                "backend": encoder.name,
+                "subsampling": encoder.subsampling,
+                "resolution": f"{width}x{height}",
+                "encode_ms": round(elapsed * 1000.0, 2),
+                "kbytes": round(size / 1024.0, 1),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(f"{row['backend']:10s} {row['resolution']:>10s} {row['encode_ms']:8.2f} ms {row['kbytes']:8.1f} KB")
@@ -1,8 +1,6 @@
 import threading
-from dobot_api import DobotApiDashboard, DobotApi, DobotApiMove, MyType, alarmAlarmJsonFile
+from dobot_api import DobotApiDashboard, DobotApi, DobotApiMove, FeedbackReader, MotionMonitor, alarmAlarmJsonFile, parse_reply
 from time import sleep
-import numpy as np
-import re
 
 # Global variable (current coordinates)
 current_actual = None
@@ -10,6 +8,7 @@ algorithm_queue = None
 enableStatus_robot = None
 robotErrorState = False
 globalLockValue = threading.Lock()
+motionMonitor = MotionMonitor(tolerance=1)
 
 def ConnectRobot():
     try:
@@ -35,39 +34,26 @@ def GetFeed(feed: DobotApi):
     global algorithm_queue
     global enableStatus_robot
     global robotErrorState
-    hasRead = 0
+    reader = FeedbackReader(feed)
+    reader.add_listener(motionMonitor.update)
     while True:
-        data = bytes()
-        while hasRead < 1440:
-            temp = feed.socket_dobot.recv(1440 - hasRead)
-            if len(temp) > 0:
-                hasRead += len(temp)
-                data += temp
-        hasRead = 0
-        feedInfo = np.frombuffer(data, dtype=MyType)
-        if hex((feedInfo['test_value'][0])) == '0x123456789abcdef':
+        feedInfo = reader.read_packet()
+        if feedInfo is not None:
             globalLockValue.acquire()
-            # Refresh Properties
-            current_actual = feedInfo["tool_vector_actual"][0]
-            algorithm_queue = feedInfo['isRunQueuedCmd'][0]
-            enableStatus_robot = feedInfo['EnableStatus'][0]
-            robotErrorState = feedInfo['ErrorStatus'][0]
+            # Refresh Properties (copied, the reader reuses its buffers)
+            current_actual = feedInfo["tool_vector_actual"][0].copy()
+            algorithm_queue = feedInfo['isRunQueuedCmd'][0].copy()
+            enableStatus_robot = feedInfo['EnableStatus'][0].copy()
+            robotErrorState = feedInfo['ErrorStatus'][0].copy()
             globalLockValue.release()
-        sleep(0.001)
 
 def WaitArrive(point_list):
-    while True:
-        is_arrive = True
-        globalLockValue.acquire()
-        if current_actual is not None:
-            for index in range(4):
-                if (abs(current_actual[index] - point_list[index]) > 1):
-                    is_arrive = False
-            if is_arrive:
-                globalLockValue.release()
-                return
-        globalLockValue.release() 
-        sleep(0.001)
+    # Woken by the feedback thread instead of polling current_actual
+    while not motionMonitor.wait_arrive(point_list[:4], timeout=1.0):
+        if motionMonitor.error:
+            print("Robot error before reaching", point_list)
+            return False
+    return True
 
 def ClearRobotError(dashboard: DobotApiDashboard):
     global robotErrorState
@@ -75,11 +61,11 @@ def ClearRobotError(dashboard: DobotApiDashboard):
     while True:
         globalLockValue.acquire()
         if robotErrorState:
-            numbers = re.findall(r'-?\d+', dashboard.GetErrorID())
-            numbers = [int(num) for num in numbers]
-            if (numbers[0] == 0):
-                if (len(numbers) > 1):
-                    for i in numbers[1:]:
+            reply = parse_reply(dashboard.GetErrorID())
+            if (reply.error_id == 0):
+                alarms = [int(num) for num in reply.numbers]
+                if (len(alarms) > 0):
+                    for i in alarms:
                         alarmState = False
                         if i == -2:
                             print("Robot Alarm: Robot Collision ", i)
@@ -128,7 +114,9 @@ if __name__ == '__main__':
     point_b = [160, 260, -30, 170]
     print(point_a, point_b)
     while True:   
-        RunPoint(move, point_a)
-        WaitArrive(point_a)
-        RunPoint(move, point_b)
-        WaitArrive(point_b)
\ No newline at end of file
+        for point in (point_a, point_b):
+            RunPoint(move, point)
+            if not WaitArrive(point):
+                # ClearRobotError() handles the alarm; carry on once it is cleared
+                while motionMonitor.error:
+                    sleep(0.5)
\ No newline at end of file
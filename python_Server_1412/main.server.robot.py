@@ -10,10 +10,21 @@ import os
 import json
 import numpy as np
 import math
-from flask import Flask, Response, jsonify, request, send_file
+from flask import Blueprint, Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
-from pupil_apriltags import Detector
-from dobot_api import DobotApiDashboard, DobotApi, DobotApiMove
+from dobot_api import DobotApi, MotionMonitor, LOG_ERROR
+from robot_state import RobotStateStore
+from robot_connection import RobotConnection
+from vision_capture import FrameGrabber
+from vision_detect import (DetectionEngine, zone_rois, detect_rois, crop_roi, detector_params,
+                           normalize_profile, local_detector, autotune)
+from vision_track import TagTracker, MotionGate
+from vision_overlay import OverlayStage, TagMark
+from vision_stream import MjpegBroadcaster, StreamSettings, stream_settings
+from jpeg_encoder import make_encoder, available_encoders, benchmark as jpeg_benchmark
+from zone_transform import ZoneTransform
+from web_push import StatePush, SSE_HEADERS
+from web_state import StateStore
 
 # -------------------------------------------------------------------------
 # [HARDWARE SETUP] GPIO for Jetson Nano / Orin Nano
@@ -52,6 +63,9 @@ ZONE2_CALIBRATION_POINTS = [
 # --- Picking Settings ---
 FIXED_OBJECT_HEIGHT = 20.0 
 Z_PICK_OFFSET = 62.0  # (ใช้สำหรับ Zone 1 และ 3)
+# CP (smooth transition) ratio when passing each pick-path waypoint, 0 = full stop.
+# The pick point and home always stop exactly.
+PICK_PATH_BLEND = {"standby": 50, "hover": 20, "lift": 20, "retreat": 50}
 
 # ======================================================================================
 # GLOBAL SETTINGS
@@ -66,6 +80,7 @@ AFFINE_FILE_CAM1 = "affine_params_cam1.json"
 AFFINE_FILE_CAM2 = "affine_params_cam2.json"
 ZONE_OVERRIDES_FILE = "zone_overrides.json"
 AUTO_CAL_FILE = "auto_z_calibration.json"
+DETECTOR_PROFILE_FILE = "detector_profiles.json"
 
 # --- Object Data ---
 OBJECT_INFO = {
@@ -83,19 +98,26 @@ is_robot_busy = False
 
 
 # --- Robot Clients ---
-client_dash = None
+DobotApi.log_level = LOG_ERROR  # No per-command send/receive tracing on the server
+robot_conn = None   # Managed dashboard/move/feed sockets with auto reconnect
+client_dash = None  # Proxies from robot_conn, always the live socket
 client_move = None
-client_feed = None
+robot_state = None  # Shared-memory snapshot of the latest feedback packet
+motion_monitor = MotionMonitor(tolerance=1.0)
+MOTION_TIMEOUT = 30.0
 is_connected = False
 
 # --- Global Data for Web ---
-web_data = {
+# Immutable versioned snapshots: writers publish with web_state.update(...),
+# readers take web_state.current() (no lock, never half-updated)
+web_state = StateStore({
     "x": 0.0, "y": 0.0, "stack_h": 0.0, "total_picked": 0, "cycle_time": 0.0,
     "status": "IDLE", "history": [], "active_id": "-",
     "object_counts": {0: 0, 1: 0, 2: 0, 3: 0, 4: 0},
     "tags": [], "cam2_enabled": True, "robot_mode": "MANUAL",
     "target_x": 0.0, "target_y": 0.0,
-}
+    "robot_connection": {"state": "DISCONNECTED"},
+})
 
 # --- Logic Variables ---
 history_log = []
@@ -115,9 +137,26 @@ locked_target_id_cam2 = None
 AUTO_PICK_DELAY = 5.0 # Required delay in seconds before triggering auto pick
 
 
-# --- Frame Buffers ---
-output_frame_cam1 = None; lock_cam1 = threading.Lock()
-output_frame_cam2 = None; lock_cam2 = threading.Lock()
+# --- Capture (each camera drained by its own thread, newest frame wins) ---
+# backend: "auto" (GStreamer + Jetson HW decode, else FFmpeg low latency), "gstreamer" or "ffmpeg"
+# Optional: "width"/"height" (zones must be drawn at that size), "gray": True
+CAPTURE_CAM1 = {"backend": "auto", "codec": "h264"}
+CAPTURE_CAM2 = {"backend": "auto", "codec": "h264"}
+grabber_cam1 = None  # Created by setup_vision()
+grabber_cam2 = None
+
+# --- Detection (AprilTag detector in worker processes, 0 = in the vision threads) ---
+DETECTION_WORKERS = 2
+detection_engine = None
+trackers = {}
+motion_gates = {}
+# Detect only inside the zones each camera handles (None = whole frame)
+ROI_ZONES_CAM1 = {2, 3}
+ROI_ZONES_CAM2 = {1}
+ROI_MARGIN = 40   # px around each zone, so tags on the edge stay whole
+ROI_SCALE = 1.0   # < 1.0 downsamples the crops before detection
+TRACK_DETECT_EVERY = 10  # Full detection every N frames, tags tracked locally in between
+MOTION_GATE = True  # Reuse the previous tags while nothing changes in the detection zones
 
 # ======================================================================================
 # 2. SYSTEM SETUP FUNCTIONS
@@ -132,8 +171,6 @@ def setup_gpio():
         except Exception as e:
             print(f"[ERROR] GPIO Setup failed: {e}")
 
-setup_gpio()
-
 def check_suction_status():
     if not HAS_GPIO: return True 
     try:
@@ -153,9 +190,10 @@ def save_json(file_path, data):
         return True
     except Exception: return False
 
-if not os.path.exists(DB_FILE):
-    with open(DB_FILE, 'w', newline='', encoding='utf-8') as f:
-        csv.writer(f).writerow(["Sequence", "Tag_ID", "Time", "Status", "Zone", "RobotX", "RobotY"])
+def init_database():
+    if not os.path.exists(DB_FILE):
+        with open(DB_FILE, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(["Sequence", "Tag_ID", "Time", "Status", "Zone", "RobotX", "RobotY"])
 
 def save_to_database(seq, tag_id, timestamp, zone_name, rx, ry):
     global history_log
@@ -165,7 +203,7 @@ def save_to_database(seq, tag_id, timestamp, zone_name, rx, ry):
         # [FIXED] Ensure history_log is correctly updated for dashboard
         history_log.insert(0, {"seq": seq, "id": tag_id, "time": timestamp, "status": "Success", "zone": zone_name})
         if len(history_log) > 50: history_log.pop()
-        web_data['history'] = history_log
+        web_state.update(history=history_log)
     except Exception as e:
         print(f"[DB Error] {e}")
 
@@ -179,9 +217,15 @@ default_zones = [
     {"id": 3, "name": "Zone 3", "x": 450, "y": 50, "w": 150, "h": 150, "z": 50.0, "color": "#ff0000"}
 ]
 
-zones_config_cam1 = load_json(ZONE_FILE_CAM1, default_zones)
-zones_config_cam2 = load_json(ZONE_FILE_CAM2, default_zones)
-zone_overrides = load_json(ZONE_OVERRIDES_FILE, {})
+# Loaded from their files by load_config()
+zones_config_cam1 = []
+zones_config_cam2 = []
+zone_overrides = {}
+
+# Detector tuning per camera (quad_decimate, quad_sigma, nthreads, refine_edges, decode_sharpening)
+detector_profiles = {"cam1": {}, "cam2": {}}
+detector_params_cam = {}
+autotune_status = {"cam1": {"state": "IDLE"}, "cam2": {"state": "IDLE"}}
 
 zone_matrices_cam1 = {}
 zone_matrices_cam2 = {}
@@ -198,13 +242,9 @@ def load_affine_matrices(file_path, target_dict):
                     target_dict[int(zid_str)] = mtx
             except Exception: pass
 
-load_affine_matrices(AFFINE_FILE_CAM1, zone_matrices_cam1)
-load_affine_matrices(AFFINE_FILE_CAM2, zone_matrices_cam2)
-
 # ======================================================================
 # [HARDCODED] CALIBRATION DATA
 # ======================================================================
-print(">>> [INIT] Computing Calibration Matrices...")
 
 # Zone 1 (Original)
 ZONE1_SRC = np.float32([[429.0, 452.0],[620.0, 459.0],[425.0, 557.0],[617.0, 569.0],[522.0, 506.0]])
@@ -226,86 +266,124 @@ ZONE2_DST = np.float32([
     [166.41, 246.13]  # C Robot
 ])
 
-ZONE1_MATRIX, _ = cv2.estimateAffine2D(ZONE1_SRC, ZONE1_DST)
-ZONE2_MATRIX, _ = cv2.estimateAffine2D(ZONE2_SRC, ZONE2_DST)
-
-zone_matrices_cam1[1] = ZONE1_MATRIX
-zone_matrices_cam1[2] = ZONE2_MATRIX
-print(">>> [INIT] Calibration Applied Success!")
-
-# --- 5-POINT CALIBRATION LOGIC (IDW) ---
-def calculate_correction_from_5_points(current_x, current_y):
-    """
-    คำนวณค่า X, Y, Z ที่ถูกต้อง โดยการเฉลี่ยน้ำหนักจาก 5 จุด (IDW)
-    ref_x, ref_y คือค่า Robot Coordinate ของจุด Calibration
-    """
-    points = ZONE2_CALIBRATION_POINTS
-    numerator_z = 0.0; numerator_x = 0.0; numerator_y = 0.0
-    denominator = 0.0
-    power = 3.0 # Power สูง เพื่อดึงค่าเข้าหาจุดที่ใกล้ที่สุด
-
-    for p in points:
-        dist = math.sqrt((current_x - p['ref_x'])**2 + (current_y - p['ref_y'])**2)
-        
-        if dist < 0.1: return p['true_x'], p['true_y'], p['true_z']
-        
-        weight = 1.0 / (dist ** power)
-        
-        # คำนวณ Offset (จริงๆแล้ว ref=true ดังนั้น offset=0 แต่นี่เผื่อไว้ปรับแก้ละเอียด)
-        offset_x = p['true_x'] - p['ref_x']
-        offset_y = p['true_y'] - p['ref_y']
-        
-        numerator_x += (offset_x * weight)
-        numerator_y += (offset_y * weight)
-        numerator_z += (p['true_z'] * weight)
-        denominator += weight
-
-    if denominator == 0: return current_x, current_y, -37.0 
-
-    avg_offset_x = numerator_x / denominator
-    avg_offset_y = numerator_y / denominator
-    final_z = numerator_z / denominator
-    
-    # พิกัดใหม่
-    final_x = current_x + avg_offset_x
-    final_y = current_y + avg_offset_y
-    
-    return final_x, final_y, final_z
-
-def pixel_to_robot_cam1(px, py, zone_id):
-    if zone_id in zone_matrices_cam1:
-        pt = np.array([px, py, 1.0], dtype=np.float32)
-        res = zone_matrices_cam1[zone_id].dot(pt)
-        return float(res[0]), float(res[1])
-    return float(px), float(py)
-
-def pixel_to_robot_cam2(px, py, zone_id):
-    if zone_id in zone_matrices_cam2:
-        pt = np.array([px, py, 1.0], dtype=np.float32)
-        res = zone_matrices_cam2[zone_id].dot(pt)
-        return float(res[0]), float(res[1])
-    return float(px), float(py)
+# --- PIXEL -> ROBOT (batched per frame) ---
+# Zones each camera picks from: "idw" = affine + 5-point IDW correction (Z interpolated),
+# "affine" = zone Z + object height. Other zones are only outlined.
+PICK_ZONES_CAM1 = {2: "idw", 3: "affine"}
+PICK_ZONES_CAM2 = {1: "affine"}
+IDW_Z_OFFSET = -2.0
+
+def build_transform(zones, matrices, pick_zones):
+    pick = {}
+    for z in zones:
+        mode = pick_zones.get(int(z['id']))
+        if mode == "idw": pick[int(z['id'])] = ("idw", IDW_Z_OFFSET)
+        elif mode == "affine": pick[int(z['id'])] = ("affine", float(z.get('z', 0.0)) + FIXED_OBJECT_HEIGHT - Z_PICK_OFFSET)
+    return ZoneTransform(zones, matrices, pick, ZONE2_CALIBRATION_POINTS, idw_power=3.0)
+
+def rebuild_transforms():
+    """ Call after zones, affine matrices or calibration points change """
+    global transform_cam1, transform_cam2
+    transform_cam1 = build_transform(zones_config_cam1, zone_matrices_cam1, PICK_ZONES_CAM1)
+    transform_cam2 = build_transform(zones_config_cam2, zone_matrices_cam2, PICK_ZONES_CAM2)
+
+transform_cam1 = None  # Built by load_config()
+transform_cam2 = None
+
+def load_config():
+    """ Zones, detector profiles, affine matrices and the hardcoded calibration """
+    global zones_config_cam1, zones_config_cam2, zone_overrides, detector_profiles
+    zones_config_cam1 = load_json(ZONE_FILE_CAM1, default_zones)
+    zones_config_cam2 = load_json(ZONE_FILE_CAM2, default_zones)
+    zone_overrides = load_json(ZONE_OVERRIDES_FILE, {})
+
+    detector_profiles = load_json(DETECTOR_PROFILE_FILE, {"cam1": {}, "cam2": {}})
+    for cam in (1, 2):
+        try: detector_params_cam[cam] = detector_params(detector_profiles.get(f"cam{cam}"))
+        except ValueError as e:
+            print(f"[DETECTOR] Invalid profile for cam{cam}, using defaults: {e}")
+            detector_params_cam[cam] = detector_params({})
+
+    load_affine_matrices(AFFINE_FILE_CAM1, zone_matrices_cam1)
+    load_affine_matrices(AFFINE_FILE_CAM2, zone_matrices_cam2)
+
+    print(">>> [INIT] Computing Calibration Matrices...")
+    zone_matrices_cam1[1], _ = cv2.estimateAffine2D(ZONE1_SRC, ZONE1_DST)
+    zone_matrices_cam1[2], _ = cv2.estimateAffine2D(ZONE2_SRC, ZONE2_DST)
+    print(">>> [INIT] Calibration Applied Success!")
+    rebuild_transforms()
+
+def transform_tags(transform, tags):
+    """ Zone, robot XY and pick Z of every tag in one batch (pixel centers truncated like int()) """
+    centers = np.array([tag.center for tag in tags], dtype=np.float64).reshape(-1, 2).astype(int)
+    return transform.apply(centers, [tag.tag_id for tag in tags], get_zone_tag_offset)
 
 def get_zone_tag_offset(zone_id, tag_id):
     try: return float(zone_overrides.get(str(zone_id), {}).get(str(tag_id), 0.0))
     except: return 0.0
 
-def check_zone_cam1(cx, cy):
-    for zone in zones_config_cam1:
-        if zone['x'] < cx < zone['x'] + zone['w'] and zone['y'] < cy < zone['y'] + zone['h']:
-            return zone
-    return None
-
-def check_zone_cam2(cx, cy):
-    for zone in zones_config_cam2:
-        if zone['x'] < cx < zone['x'] + zone['w'] and zone['y'] < cy < zone['y'] + zone['h']:
-            return zone
-    return None
+def split_frame(frame):
+    """ (BGR frame for display, grayscale frame for detection) from a BGR or gray capture """
+    if frame.ndim == 2: return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), frame
+    return frame, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+def camera_rois(cam, shape):
+    """ Detection regions of a camera, None = whole frame """
+    zones, zone_ids = (zones_config_cam1, ROI_ZONES_CAM1) if cam == 1 else (zones_config_cam2, ROI_ZONES_CAM2)
+    if zone_ids is None: return None
+    return zone_rois(zones, shape, zone_ids, ROI_MARGIN)
+
+def gated_tags(cam, gray, frame_id, frame_time, last_tags):
+    """ Tracked tags of this frame, or last_tags when the motion gate finds nothing changed """
+    gate = motion_gates[cam]
+    was_quiet = not gate.last_changed
+    if MOTION_GATE and not gate.check(gray, camera_rois(cam, gray.shape), frame_time, last_tags):
+        return last_tags
+    # Something started moving after a quiet spell: look everywhere, not only around known tags
+    return trackers[cam].update(gray, frame_id, frame_time, force=MOTION_GATE and was_quiet)
+
+def detect_tags(gray, frame_id, cam, rois=None):
+    """ rois=None: the camera's detection zones, else the given tracking windows """
+    params = detector_params_cam[cam]
+    scale = 1.0
+    if rois is None:
+        rois = camera_rois(cam, gray.shape)
+        if rois is None:
+            if detection_engine is None:
+                return local_detector(params).detect(gray)
+            return detection_engine.detect(gray, frame_id=frame_id, cam=cam, params=params).tags
+        scale = ROI_SCALE
+    if detection_engine is None:
+        return detect_rois(local_detector(params), gray, rois, scale)
+    return detection_engine.detect_rois(gray, rois, frame_id=frame_id, cam=cam, params=params, scale=scale).tags
 
 def hex_to_bgr(hex_color):
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (4, 2, 0))
 
+# --- Frame Buffers (annotated by the overlay stage, only while a stream client is attached) ---
+overlay_cam1 = None  # Created by setup_vision()
+overlay_cam2 = None
+# Each annotated frame is JPEG-encoded once per stream setting and the bytes shared by all /video_feed clients
+# Clients may ask for ?fps=&width=&quality=&adaptive=0|1 within STREAM_LIMITS (min, max)
+STREAM_DEFAULT = StreamSettings(fps=15.0, max_width=1280, quality=80)
+STREAM_LIMITS = StreamSettings(fps=(1.0, 25.0), max_width=(320, 1920), quality=(30, 95))
+# "auto" = libjpeg-turbo (PyTurboJPEG) when installed, else OpenCV; subsampling "444", "422", "420" or "gray"
+JPEG_BACKEND = "auto"
+JPEG_SUBSAMPLING = "420"
+stream_cam1 = None
+stream_cam2 = None
+
+def setup_vision():
+    """ Camera grabbers (not started), overlay stages and stream broadcasters """
+    global grabber_cam1, grabber_cam2, overlay_cam1, overlay_cam2, stream_cam1, stream_cam2
+    grabber_cam1 = FrameGrabber(RTSP_URL_CAM1, name="CAM1", **CAPTURE_CAM1)
+    grabber_cam2 = FrameGrabber(RTSP_URL_CAM2, name="CAM2", **CAPTURE_CAM2)
+    overlay_cam1 = OverlayStage("CAM1", hex_to_bgr)
+    overlay_cam2 = OverlayStage("CAM2", hex_to_bgr)
+    stream_cam1 = MjpegBroadcaster(overlay_cam1, "CAM1", STREAM_DEFAULT, make_encoder(JPEG_BACKEND, JPEG_SUBSAMPLING))
+    stream_cam2 = MjpegBroadcaster(overlay_cam2, "CAM2", STREAM_DEFAULT, make_encoder(JPEG_BACKEND, JPEG_SUBSAMPLING))
+
 def get_distance(x1, y1, x2, y2):
     return math.sqrt((x1-x2)**2 + (y1-y2)**2)
 
@@ -316,10 +394,11 @@ def get_distance(x1, y1, x2, y2):
 def set_light(color):
     if not is_connected: return
     try:
-        client_dash.DO(3, 0); client_dash.DO(4, 0); client_dash.DO(5, 0)
-        if color == 'green': client_dash.DO(3, 1)
-        elif color == 'yellow': client_dash.DO(4, 1)
-        elif color == 'red': client_dash.DO(5, 1)
+        with client_dash.deferred():
+            client_dash.DO(3, 0); client_dash.DO(4, 0); client_dash.DO(5, 0)
+            if color == 'green': client_dash.DO(3, 1)
+            elif color == 'yellow': client_dash.DO(4, 1)
+            elif color == 'red': client_dash.DO(5, 1)
     except: pass
 
 def control_suction(action):
@@ -331,28 +410,36 @@ def control_suction(action):
             client_dash.DO(9, 1); time.sleep(0.5); client_dash.DO(9, 0)
     except: pass
 
+def wait_motion(target, joint=False):
+    # Wait on the feedback stream when it is live, otherwise block on Sync()
+    if motion_monitor is not None and motion_monitor.has_feedback():
+        if not motion_monitor.wait_arrive(target, joint=joint, timeout=MOTION_TIMEOUT):
+            raise Exception(f"Motion to {target} did not complete")
+    else:
+        client_move.Sync()
+
 # [UPDATED] Pick Sequence with MovJ for Hover (Safe Motion)
 def execute_pick_sequence(rx, ry, z_pick, z_hover, sb, tag_id, zone_name):
-    global is_robot_busy, web_data, sequence_count, total_picked
+    global is_robot_busy, sequence_count, total_picked
     
     try:
         is_robot_busy = True
-        web_data['target_x'] = round(rx, 2)
-        web_data['target_y'] = round(ry, 2)
-        web_data['active_id'] = str(tag_id)
-        web_data['status'] = f"MOVING TO ID:{tag_id}"
+        web_state.update(target_x=round(rx, 2), target_y=round(ry, 2), active_id=str(tag_id),
+                         status=f"MOVING TO ID:{tag_id}")
         
         set_light('yellow')
         print(f"[ROBOT] Picking ID:{tag_id} Zone:{zone_name} at XYZ: ({rx:.2f}, {ry:.2f}, {z_pick:.2f})")
 
+        # The approach path is queued as one blended trajectory and waited on once.
+        approach = client_move.trajectory(client_dash)
         # 1. Standby (MovJ)
-        client_move.MovJ(float(sb['x']), float(sb['y']), float(sb['z']), float(sb['r'])); client_move.Sync()
-        
+        approach.movj(float(sb['x']), float(sb['y']), float(sb['z']), float(sb['r']), blend=PICK_PATH_BLEND['standby'])
         # 2. Hover (MovJ) - [FIX] ใช้ MovJ เพื่อแก้ปัญหาแขนกลเอื้อมไม่ถึง
-        client_move.MovJ(rx, ry, z_hover, float(sb['r'])); client_move.Sync()
-        
+        approach.movj(rx, ry, z_hover, float(sb['r']), blend=PICK_PATH_BLEND['hover'])
         # 3. Pick (MovL) - ลงแนวดิ่ง
-        client_move.MovL(rx, ry, z_pick, float(sb['r'])); client_move.Sync()
+        approach.movl(rx, ry, z_pick, float(sb['r']))
+        approach.submit()
+        wait_motion(approach.target)
 
         # 4. Suction
         control_suction('on')
@@ -361,26 +448,29 @@ def execute_pick_sequence(rx, ry, z_pick, z_hover, sb, tag_id, zone_name):
         # 5. Check Sensor
         if check_suction_status():
             print(">>> SUCTION SUCCESS")
-            web_data['status'] = "SUCTION SUCCESS"
             sequence_count += 1; total_picked += 1
+            web_state.update(status="SUCTION SUCCESS", total_picked=total_picked)
             ts = datetime.datetime.now().strftime("%H:%M:%S")
             # [FIXED] Save to database in the success path
             save_to_database(sequence_count, tag_id, ts, zone_name, round(rx, 2), round(ry, 2))
             
+            retreat = client_move.trajectory(client_dash)
             # ยกขึ้น (MovL)
-            client_move.MovL(rx, ry, z_hover, float(sb['r'])); client_move.Sync()
+            retreat.movl(rx, ry, z_hover, float(sb['r']), blend=PICK_PATH_BLEND['lift'])
             # กลับ Standby (MovJ)
-            client_move.MovJ(float(sb['x']), float(sb['y']), float(sb['z']), float(sb['r'])); client_move.Sync()
+            retreat.movj(float(sb['x']), float(sb['y']), float(sb['z']), float(sb['r']), blend=PICK_PATH_BLEND['retreat'])
             # Home
-            client_move.JointMovJ(0.0, 0.0, 0.0, 200.0); client_move.Sync()
+            retreat.joint_movj(0.0, 0.0, 0.0, 200.0)
+            retreat.submit()
+            wait_motion(retreat.target, joint=True)
             set_light('green')
             is_robot_busy = False
             return True
         else:
             print(">>> SUCTION FAILED")
-            web_data['status'] = "FAILED"
+            web_state.update(status="FAILED")
             control_suction('off')
-            client_move.MovL(rx, ry, z_hover, float(sb['r'])); client_move.Sync()
+            client_move.MovL(rx, ry, z_hover, float(sb['r'])); wait_motion((rx, ry, z_hover, float(sb['r'])))
             set_light('red')
             is_robot_busy = False
             return False
@@ -394,17 +484,23 @@ def execute_pick_sequence(rx, ry, z_pick, z_hover, sb, tag_id, zone_name):
 # ======================================================================================
 # 5. FLASK API SERVER
 # ======================================================================================
-app = Flask(__name__)
-CORS(app)
+# Routes live on a blueprint; create_app() builds the Flask app at startup
+routes = Blueprint("robot_server", __name__)
+
+def create_app():
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(routes)
+    return app
 
-@app.route('/api/robot/mode', methods=['POST'])
+@routes.route('/api/robot/mode', methods=['POST'])
 def set_robot_mode():
-    global ROBOT_MODE, web_data
+    global ROBOT_MODE
     body = request.json or {}
     new_mode = body.get('mode')
     if new_mode in ['MANUAL', 'AUTO']:
         ROBOT_MODE = new_mode
-        web_data['robot_mode'] = new_mode
+        web_state.update(robot_mode=new_mode)
         # Reset Target stability and locking when mode changes
         global tag_stability, locked_target_id, locked_target_id_cam2
         tag_stability = {}
@@ -414,7 +510,7 @@ def set_robot_mode():
         return jsonify({"status": "success", "mode": new_mode})
     return jsonify({"status": "error"}), 400
 
-@app.route('/api/robot/click_move', methods=['POST'])
+@routes.route('/api/robot/click_move', methods=['POST'])
 def click_move():
     global is_connected
     if not is_connected: return jsonify({"status": "error", "message": "Not Connected"})
@@ -452,55 +548,67 @@ def click_move():
     return jsonify({"status": "success", "message": "Command Sent"})
 
 # --- Robot APIs (Omitted for brevity) ---
-@app.route('/api/robot/connect', methods=['POST'])
+def on_robot_state(state, info):
+    global is_connected
+    is_connected = state == "CONNECTED"
+    # A dead feedback stream must not look live: wait_motion() then falls back to Sync()
+    if not is_connected: motion_monitor.reset()
+    web_state.update(robot_connection=info)
+
+def on_robot_connect(conn):
+    # Runs after the first connect and after every automatic reconnect
+    conn.dash.SpeedFactor(50); set_light('green')
+
+@routes.route('/api/robot/connect', methods=['POST'])
 def connect_robot():
-    global client_dash, client_move, client_feed, is_connected
+    global robot_conn, client_dash, client_move, robot_state
     ip = request.json.get('ip', '192.168.1.6')
     try:
-        if is_connected:
-            try: client_dash.close(); client_move.close(); client_feed.close()
-            except: pass
-        client_dash = DobotApiDashboard(ip, 29999)
-        client_move = DobotApiMove(ip, 30003)
-        client_feed = DobotApi(ip, 30004)
-        is_connected = True
-        client_dash.SpeedFactor(50); set_light('green')
+        if robot_conn is not None: robot_conn.close()
+        if robot_state is None: robot_state = RobotStateStore(create=True)
+        robot_conn = RobotConnection(ip, on_state=on_robot_state, on_connect=on_robot_connect,
+                                     feed_listeners=[robot_state.publish, motion_monitor.update])
+        client_dash = robot_conn.dash; client_move = robot_conn.move
+        robot_conn.connect()
         return jsonify({"status": "success"})
     except Exception as e: return jsonify({"status": "error", "message": str(e)})
 
-@app.route('/api/robot/enable', methods=['POST'])
+@routes.route('/api/robot/connection', methods=['GET'])
+def get_robot_connection(): return jsonify(dict(web_state.current()['robot_connection']))
+
+@routes.route('/api/robot/enable', methods=['POST'])
 def enable_robot():
     if not is_connected: return jsonify({"status": "error"})
     if request.json.get('enable'): client_dash.EnableRobot(); set_light('green')
     else: client_dash.DisableRobot(); set_light('yellow')
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/reset', methods=['POST'])
+@routes.route('/api/robot/reset', methods=['POST'])
 def reset_robot():
     if is_connected: client_dash.ResetRobot(); set_light('green')
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/clear', methods=['POST'])
+@routes.route('/api/robot/clear', methods=['POST'])
 def clear_error():
     if is_connected: client_dash.ClearError(); set_light('green')
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/emergency_stop', methods=['POST'])
+@routes.route('/api/robot/emergency_stop', methods=['POST'])
 def emergency_stop():
     if is_connected: client_dash.EmergencyStop(); set_light('red')
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/speed', methods=['POST'])
+@routes.route('/api/robot/speed', methods=['POST'])
 def set_speed():
     if is_connected: client_dash.SpeedFactor(int(request.json.get('val', 30)))
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/do', methods=['POST'])
+@routes.route('/api/robot/do', methods=['POST'])
 def set_do():
     if is_connected: client_dash.DO(int(request.json.get('index', 1)), 1 if request.json.get('status') == 'On' else 0)
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/move', methods=['POST'])
+@routes.route('/api/robot/move', methods=['POST'])
 def move_robot():
     if not is_connected: return jsonify({"status": "error"})
     d = request.json or {}; m = d.get('mode')
@@ -512,71 +620,70 @@ def move_robot():
         return jsonify({"status": "success"})
     except Exception as e: return jsonify({"status": "error", "message": str(e)})
 
-@app.route('/api/robot/position', methods=['GET'])
+@routes.route('/api/robot/position', methods=['GET'])
 def get_robot_position():
-    if not is_connected or client_feed is None: return jsonify({"status": "error"}), 400
-    try:
-        p = client_feed.GetPose()
-        return jsonify({"status": "success", "x": float(p[0]), "y": float(p[1]), "z": float(p[2]), "r": float(p[3])})
-    except: return jsonify({"status": "error"}), 500
+    if not is_connected or robot_state is None: return jsonify({"status": "error"}), 400
+    # Served from the feedback snapshot, no round trip to the controller
+    p = robot_state.pose()
+    if p is None: return jsonify({"status": "error", "message": "No feedback yet"}), 503
+    return jsonify({"status": "success", "x": p[0], "y": p[1], "z": p[2], "r": p[3]})
 
-@app.route('/api/robot/io', methods=['GET'])
+@routes.route('/api/robot/io', methods=['GET'])
 def get_robot_io():
-    if not is_connected or client_feed is None: return jsonify({"status": "error"}), 400
-    try:
-        di = [int(client_feed.DI(i)) for i in range(1, 9)]
-        do = [int(client_feed.DO(i)) for i in range(1, 9)]
-        return jsonify({"status": "success", "di": di, "do": do})
-    except: return jsonify({"status": "error"}), 500
+    if not is_connected or robot_state is None: return jsonify({"status": "error"}), 400
+    io = robot_state.io(8)
+    if io is None: return jsonify({"status": "error", "message": "No feedback yet"}), 503
+    di, do = io
+    return jsonify({"status": "success", "di": di, "do": do})
 
-@app.route('/api/cam2/toggle', methods=['POST'])
+@routes.route('/api/cam2/toggle', methods=['POST'])
 def toggle_cam2():
-    global CAM2_ENABLED, web_data
+    global CAM2_ENABLED
     body = request.json or {}
     if 'active' in body:
         CAM2_ENABLED = bool(body['active'])
-        web_data['cam2_enabled'] = CAM2_ENABLED
+        web_state.update(cam2_enabled=CAM2_ENABLED)
     return jsonify({"status": "success", "active": CAM2_ENABLED})
 
-@app.route('/api/cam2/state', methods=['GET'])
+@routes.route('/api/cam2/state', methods=['GET'])
 def get_cam2_state(): return jsonify({"active": CAM2_ENABLED})
 
-@app.route('/api/calibration/zones', methods=['GET', 'POST'])
+@routes.route('/api/calibration/zones', methods=['GET', 'POST'])
 def handle_zones_cam1():
     global zones_config_cam1
-    if request.method == 'POST': zones_config_cam1 = request.json; save_json(ZONE_FILE_CAM1, zones_config_cam1)
+    if request.method == 'POST': zones_config_cam1 = request.json; save_json(ZONE_FILE_CAM1, zones_config_cam1); rebuild_transforms()
     return jsonify(zones_config_cam1)
 
-@app.route('/api/cam2/calibration/zones', methods=['GET', 'POST'])
+@routes.route('/api/cam2/calibration/zones', methods=['GET', 'POST'])
 def handle_zones_cam2():
     global zones_config_cam2
-    if request.method == 'POST': zones_config_cam2 = request.json; save_json(ZONE_FILE_CAM2, zones_config_cam2)
+    if request.method == 'POST': zones_config_cam2 = request.json; save_json(ZONE_FILE_CAM2, zones_config_cam2); rebuild_transforms()
     return jsonify(zones_config_cam2)
 
-@app.route('/api/calibration/affine', methods=['GET', 'POST'])
+@routes.route('/api/calibration/affine', methods=['GET', 'POST'])
 def handle_affine_cam1():
     if request.method == 'GET': return jsonify(load_json(AFFINE_FILE_CAM1, {}))
     body = request.json or {}; zid = str(body.get('zone_id'))
     if zid:
         data = load_json(AFFINE_FILE_CAM1, {})
         data[zid] = body
-        save_json(AFFINE_FILE_CAM1, data); load_affine_matrices(AFFINE_FILE_CAM1, zone_matrices_cam1)
+        save_json(AFFINE_FILE_CAM1, data); load_affine_matrices(AFFINE_FILE_CAM1, zone_matrices_cam1); rebuild_transforms()
         return jsonify({"status": "saved"})
     return jsonify({"status": "error"}), 400
 
-@app.route('/api/cam2/calibration/affine', methods=['GET', 'POST'])
+@routes.route('/api/cam2/calibration/affine', methods=['GET', 'POST'])
 def handle_affine_cam2():
     if request.method == 'GET': return jsonify(load_json(AFFINE_FILE_CAM2, {}))
     body = request.json or {}; zid = str(body.get('zone_id'))
     if zid:
         data = load_json(AFFINE_FILE_CAM2, {})
         data[zid] = body
-        save_json(AFFINE_FILE_CAM2, data); load_affine_matrices(AFFINE_FILE_CAM2, zone_matrices_cam2)
+        save_json(AFFINE_FILE_CAM2, data); load_affine_matrices(AFFINE_FILE_CAM2, zone_matrices_cam2); rebuild_transforms()
         return jsonify({"status": "saved"})
     return jsonify({"status": "error"}), 400
 
-@app.route('/api/calibration/affine_compute', methods=['POST'])
-@app.route('/api/cam2/calibration/affine_compute', methods=['POST'])
+@routes.route('/api/calibration/affine_compute', methods=['POST'])
+@routes.route('/api/cam2/calibration/affine_compute', methods=['POST'])
 def compute_affine():
     body = request.json or {}; pairs = body.get('pairs', [])
     if len(pairs) < 3: return jsonify({"error": "Need 3 pts"}), 400
@@ -596,52 +703,146 @@ def compute_affine():
         return jsonify({"params": params, "residual": res})
     except Exception as e: return jsonify({"error": str(e)}), 500
 
-@app.route('/api/calibration/zone_override', methods=['POST'])
+@routes.route('/api/calibration/zone_override', methods=['POST'])
 def override_z():
     body = request.json or {}; zid = str(body.get('zone_id')); tid = str(body.get('tag_id')); off = float(body.get('offset_mm', 0.0))
     if zid not in zone_overrides: zone_overrides[zid] = {}
     zone_overrides[zid][tid] = off; save_json(ZONE_OVERRIDES_FILE, zone_overrides)
     return jsonify({"status": "success"})
 
-@app.route('/api/robot/sync_affine/<int:zone_id>', methods=['POST'])
-def sync_affine_1(zone_id): load_affine_matrices(AFFINE_FILE_CAM1, zone_matrices_cam1); return jsonify({"status":"synced"})
+@routes.route('/api/robot/sync_affine/<int:zone_id>', methods=['POST'])
+def sync_affine_1(zone_id): load_affine_matrices(AFFINE_FILE_CAM1, zone_matrices_cam1); rebuild_transforms(); return jsonify({"status":"synced"})
 
-@app.route('/api/robot/sync_affine_cam2/<int:zone_id>', methods=['POST'])
-def sync_affine_2(zone_id): load_affine_matrices(AFFINE_FILE_CAM2, zone_matrices_cam2); return jsonify({"status":"synced"})
+@routes.route('/api/robot/sync_affine_cam2/<int:zone_id>', methods=['POST'])
+def sync_affine_2(zone_id): load_affine_matrices(AFFINE_FILE_CAM2, zone_matrices_cam2); rebuild_transforms(); return jsonify({"status":"synced"})
 
-@app.route('/api/calibration/auto_z_probe', methods=['POST'])
+@routes.route('/api/calibration/auto_z_probe', methods=['POST'])
 def auto_z_probe(): return jsonify({"status": "started", "msg": "Z-Probe Logic triggered"})
 
-@app.route('/api/download_log')
+@routes.route('/api/download_log')
 def download_log():
     if os.path.exists(DB_FILE): return send_file(DB_FILE, as_attachment=True, download_name=f"log_{int(time.time())}.csv")
     return jsonify({"status": "error"}), 404
 
-@app.route("/data")
-def data_stream():
-    # [FIXED] Combine tags for web display
-    all_visible_tags = current_visible_tags_cam1 + current_visible_tags_cam2
-    
-    formatted_tags = []
-    for tag in all_visible_tags:
-        zone_name = tag.get('zone', {}).get('name') if tag.get('zone') else "None"
-        formatted_tags.append({
-            "id": tag['id'], 
-            "cx": tag['cx'], 
-            "cy": tag['cy'], 
-            "rx": round(tag.get('rx', 0.0), 2), 
-            "ry": round(tag.get('ry', 0.0), 2), 
-            "zone": zone_name
-        })
-        
-    web_data['tags'] = formatted_tags
-    return jsonify(web_data)
+def format_tag(tag):
+    zone_name = tag.get('zone', {}).get('name') if tag.get('zone') else "None"
+    return {
+        "id": tag['id'], 
+        "cx": tag['cx'], 
+        "cy": tag['cy'], 
+        "rx": round(tag.get('rx', 0.0), 2), 
+        "ry": round(tag.get('ry', 0.0), 2), 
+        "zone": zone_name,
+        "track": tag.get('track')
+    }
+
+web_tags = {1: [], 2: []}  # Dashboard form of each camera's visible tags
+
+def publish_web(cam, tags, changes):
+    """ One web_state snapshot with a camera's visible tags and the loop's other changes """
+    def edit(data):
+        # [FIXED] Combine tags for web display
+        web_tags[cam] = [format_tag(tag) for tag in tags]
+        data.update(changes)
+        data['tags'] = web_tags[1] + web_tags[2]
+    web_state.modify(edit)
+
+# Dashboard push: one "snapshot" event, then "diff"s (changed fields, tags set/removed, new history rows)
+PUSH_RATE = 5.0  # Max events per second
+web_push = StatePush(web_state, rate=PUSH_RATE, name="WEB")
+
+@routes.route("/data")
+def data_stream(): return Response(web_state.current().json(), mimetype="application/json")  # Encoded once per version
+
+@routes.route("/data/events")
+def data_events(): return Response(web_push.stream(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+@routes.route("/api/vision/stats")
+def vision_stats():
+    return jsonify({
+        "cam1": grabber_cam1.stats(), "cam2": grabber_cam2.stats(),
+        "detector": detection_engine.stats() if detection_engine else None,
+        "tracking": {f"cam{cam}": tracker.stats() for cam, tracker in trackers.items()},
+        "motion": {f"cam{cam}": gate.stats() for cam, gate in motion_gates.items()},
+        "overlay": {"cam1": overlay_cam1.stats(), "cam2": overlay_cam2.stats()},
+        "stream": {"cam1": stream_cam1.stats(), "cam2": stream_cam2.stats()},
+    })
+
+def set_detector_profile(cam, profile):
+    global detector_profiles
+    params = detector_params(profile)
+    detector_profiles = dict(detector_profiles, **{f"cam{cam}": profile})
+    detector_params_cam[cam] = params  # Picked up by the next detection
+    save_json(DETECTOR_PROFILE_FILE, detector_profiles)
+
+@routes.route("/api/vision/detector/<cam>", methods=['GET', 'POST'])
+def handle_detector_profile(cam):
+    if cam not in ("cam1", "cam2"): return jsonify({"status": "error", "msg": "Unknown camera"}), 404
+    cam_no = int(cam[-1])
+    if request.method == 'POST':
+        try: set_detector_profile(cam_no, normalize_profile(request.json or {}))
+        except (ValueError, TypeError) as e: return jsonify({"status": "error", "msg": str(e)}), 400
+    return jsonify({"profile": detector_profiles.get(cam, {}), "params": detector_params_cam[cam_no]})
+
+def run_autotune(cam, frames, interval, min_rate, candidates, apply):
+    """ Record detection regions from the live stream, then benchmark profiles on them """
+    status = autotune_status[f"cam{cam}"]
+    grabber = grabber_cam1 if cam == 1 else grabber_cam2
+    try:
+        status.update({"state": "RECORDING", "best": None, "results": []})
+        samples = []; last_id = 0
+        while len(samples) < frames:
+            grabbed = grabber.read(last_id, timeout=5.0, consumer="autotune")
+            if grabbed is None: raise RuntimeError("No frames from camera")
+            last_id, _, frame = grabbed
+            gray = split_frame(frame)[1]
+            rois = camera_rois(cam, gray.shape)
+            samples.extend([crop_roi(gray, roi) for roi in rois] if rois is not None else [gray])
+            time.sleep(interval)
+        status["state"] = "RUNNING"
+        best, results = autotune(samples, detector_profiles.get(f"cam{cam}"), candidates, min_rate)
+        status.update({"best": best, "results": results})
+        if best is None: status["msg"] = f"No profile reached {min_rate:.0%} of the reference detections (or no tags seen)"
+        if best is not None and apply: set_detector_profile(cam, best)
+        status["state"] = "DONE"
+        print(f"[DETECTOR] cam{cam} auto-tune picked {best}")
+    except Exception as e:
+        status.update({"state": "ERROR", "msg": str(e)})
+
+@routes.route("/api/vision/detector/<cam>/autotune", methods=['GET', 'POST'])
+def handle_detector_autotune(cam):
+    if cam not in autotune_status: return jsonify({"status": "error", "msg": "Unknown camera"}), 404
+    if request.method == 'GET': return jsonify(autotune_status[cam])
+    if autotune_status[cam]["state"] in ("RECORDING", "RUNNING"): return jsonify({"status": "error", "msg": "Auto-tune already running"}), 409
+    body = request.json or {}
+    try:
+        candidates = [normalize_profile(c) for c in body['candidates']] if body.get('candidates') else None
+        args = (int(cam[-1]), int(body.get('frames', 20)), float(body.get('interval', 0.2)),
+                float(body.get('min_rate', 0.95)), candidates, bool(body.get('apply', True)))
+    except (ValueError, TypeError) as e: return jsonify({"status": "error", "msg": str(e)}), 400
+    autotune_status[cam] = {"state": "RECORDING"}
+    threading.Thread(target=run_autotune, args=args, daemon=True).start()
+    return jsonify({"status": "started"})
+
+@routes.route("/api/vision/jpeg/benchmark")
+def handle_jpeg_benchmark():
+    """ Encode time per JPEG backend and resolution, on the latest frame of ?cam=1|2 when there is one """
+    grabber = grabber_cam2 if request.args.get('cam') == '2' else grabber_cam1
+    grabbed = grabber.read(0, timeout=0.5)
+    image = split_frame(grabbed[2])[0] if grabbed is not None else None
+    try:
+        repeat = min(max(int(request.args.get('repeat', 10)), 1), 100)
+        quality = int(request.args.get('quality', STREAM_DEFAULT.quality))
+        encoders = available_encoders(request.args.get('subsampling', JPEG_SUBSAMPLING))
+    except (ValueError, KeyError) as e: return jsonify({"status": "error", "msg": str(e)}), 400
+    results = jpeg_benchmark(encoders, quality=quality, repeat=repeat, image=image)
+    return jsonify({"source": "camera" if image is not None else "synthetic", "results": results})
 
-@app.route("/video_feed")
-def feed1(): return Response(gen_frames_cam1(), mimetype="multipart/x-mixed-replace; boundary=frame")
+@routes.route("/video_feed")
+def feed1(): return Response(stream_cam1.stream(*stream_settings(request.args, STREAM_DEFAULT, STREAM_LIMITS)), mimetype="multipart/x-mixed-replace; boundary=frame")
 
-@app.route("/video_feed_2")
-def feed2(): return Response(gen_frames_cam2(), mimetype="multipart/x-mixed-replace; boundary=frame")
+@routes.route("/video_feed_2")
+def feed2(): return Response(stream_cam2.stream(*stream_settings(request.args, STREAM_DEFAULT, STREAM_LIMITS)), mimetype="multipart/x-mixed-replace; boundary=frame")
 
 # ======================================================================================
 # 6. VISION LOOPS (Multi-Cam Logic)
@@ -649,33 +850,38 @@ def feed2(): return Response(gen_frames_cam2(), mimetype="multipart/x-mixed-repl
 
 def vision_loop_cam1():
     """ CAM 1: รับผิดชอบ Zone 2 (5-Point) และ Zone 3 (Affine) """
-    global output_frame_cam1, web_data, current_visible_tags_cam1, locked_target_id
+    global current_visible_tags_cam1, locked_target_id
     global processed_tags, tag_stability
 
-    cap = cv2.VideoCapture(RTSP_URL_CAM1)
-    at_detector = Detector(families="tag36h11")
+    grabber_cam1.start()
+    tracker_cam1 = TagTracker(lambda gray, frame_id, rois: detect_tags(gray, frame_id, 1, rois),
+                              detect_every=TRACK_DETECT_EVERY)
+    trackers[1] = tracker_cam1
+    motion_gates[1] = MotionGate()
+    tags = []
     print(">>> CAM1: STARTED (Top View) <<<")
+    last_frame_id = 0
 
     while True:
         try:
-            ret, frame = cap.read()
-            if not ret: time.sleep(2); cap.release(); cap = cv2.VideoCapture(RTSP_URL_CAM1); continue
+            grabbed = grabber_cam1.read(last_frame_id, timeout=2.0, consumer="vision")
+            if grabbed is None: continue
+            last_frame_id, frame_time, frame = grabbed
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY); tags = at_detector.detect(gray)
-            current_visible_tags_cam1 = []; status_text = web_data['status']; current_time = time.time(); visible_ids = set()
+            frame, gray = split_frame(frame); tags = gated_tags(1, gray, last_frame_id, frame_time, tags)
+            current_visible_tags_cam1 = []; status_text = web_state.current()['status']; current_time = time.time(); visible_ids = set()
             
             newly_detected_tags = {}
             closest_tag_id = None
             min_dist_to_center = float('inf')
+            web_update = {} # Published as one snapshot at the end of the frame
+
+            marks = [] # Tag outlines for the overlay stage (zones are pre-rendered there)
 
-            # Draw Zones
-            for z in zones_config_cam1:
-                color = hex_to_bgr(z['color'])
-                cv2.rectangle(frame, (z['x'], z['y']), (z['x']+z['w'], z['y']+z['h']), color, 2)
-                cv2.putText(frame, z['name'], (z['x'], z['y']-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            batch = transform_tags(transform_cam1, tags)
 
-            for tag in tags:
-                cx, cy = int(tag.center[0]), int(tag.center[1]); zone = check_zone_cam1(cx, cy); visible_ids.add(tag.tag_id)
+            for i, tag in enumerate(tags):
+                cx, cy = int(tag.center[0]), int(tag.center[1]); zone = batch.zones[i]; visible_ids.add(tag.tag_id)
                 
                 rx, ry, z_pick = 0.0, 0.0, 0.0
                 is_processed = False
@@ -683,25 +889,16 @@ def vision_loop_cam1():
                 if zone:
                     zone_id = int(zone['id'])
                     
-                    # 1. Calculate Robot Coordinates
-                    if zone_id == 2:
-                        # Zone 2: Use 5-Point Correction
-                        raw_rx, raw_ry = pixel_to_robot_cam1(cx, cy, zone_id)
-                        rx, ry, final_z = calculate_correction_from_5_points(raw_rx, raw_ry)
-                        z_pick = final_z - 2.0
-                        is_processed = True
-                    elif zone_id == 3:
-                        # Zone 3: ใช้ Affine ปกติ
-                        rx, ry = pixel_to_robot_cam1(cx, cy, zone_id)
-                        z_base = float(zone.get('z', 0.0))
-                        z_off = get_zone_tag_offset(zone_id, tag.tag_id)
-                        z_pick = z_base + FIXED_OBJECT_HEIGHT + z_off - Z_PICK_OFFSET
+                    # 1. Robot Coordinates (Zone 2: 5-Point Correction, Zone 3: ใช้ Affine ปกติ)
+                    if batch.processed[i]:
+                        rx, ry = float(batch.robot[i][0]), float(batch.robot[i][1])
+                        z_pick = float(batch.z_pick[i])
                         is_processed = True
                     
                     if is_processed:
                         tag_data = {
                             "id": tag.tag_id, "cx": cx, "cy": cy, "rx": rx, "ry": ry, 
-                            "z_pick": z_pick, "zone": zone, "cam": 1
+                            "z_pick": z_pick, "zone": zone, "cam": 1, "track": tag.info()
                         }
                         
                         newly_detected_tags[tag.tag_id] = tag_data
@@ -722,21 +919,19 @@ def vision_loop_cam1():
                         if remaining_delay > 0:
                             # State: WAITING (Yellow frame, countdown text)
                             color = hex_to_bgr("#ffff00") # Yellow
-                            cv2.polylines(frame, [tag.corners.astype(int)], True, color, 2)
-                            cv2.putText(frame, f"WAIT {remaining_delay:.1f}s", (cx - 10, cy + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                            marks.append(TagMark(tag.corners, color, f"WAIT {remaining_delay:.1f}s", (cx - 10, cy + 30)))
                         else:
                             # State: READY (Green frame)
                             color = hex_to_bgr("#00ff00") # Green
-                            cv2.polylines(frame, [tag.corners.astype(int)], True, color, 2)
-                            cv2.putText(frame, "READY", (cx - 10, cy + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                            marks.append(TagMark(tag.corners, color, "READY", (cx - 10, cy + 30)))
                     
 
                     elif zone_id == 1:
                         # Zone 1 seen by Cam 1 (low priority/distortion) - just draw its color
-                        cv2.polylines(frame, [tag.corners.astype(int)], True, hex_to_bgr(zone['color']), 2) 
+                        marks.append(TagMark(tag.corners, hex_to_bgr(zone['color']), None, None))
 
                 else:
-                    cv2.polylines(frame, [tag.corners.astype(int)], True, (0, 0, 255), 2)
+                    marks.append(TagMark(tag.corners, (0, 0, 255), None, None))
 
             
             # --- Target Locking Logic ---
@@ -758,9 +953,9 @@ def vision_loop_cam1():
             # 2. Update Target Position and Auto Pick Logic
             if target_data:
                 tag_id = target_data['id']
-                # Update web_data with the stable target position
-                web_data['target_x'] = round(target_data['rx'], 2)
-                web_data['target_y'] = round(target_data['ry'], 2)
+                # Update web_state with the stable target position
+                web_update['target_x'] = round(target_data['rx'], 2)
+                web_update['target_y'] = round(target_data['ry'], 2)
                 
                 time_elapsed = current_time - tag_stability.get(tag_id, current_time)
 
@@ -790,8 +985,8 @@ def vision_loop_cam1():
             
             elif not is_robot_busy:
                 status_text = "IDLE"
-                web_data['target_x'] = 0.0
-                web_data['target_y'] = 0.0
+                web_update['target_x'] = 0.0
+                web_update['target_y'] = 0.0
             
             
             # Cleanup stability dictionary
@@ -808,17 +1003,17 @@ def vision_loop_cam1():
             current_visible_tags_cam1 = list(newly_detected_tags.values())
 
 
-            # Update web_data (Ensure status is passed correctly)
-            web_data.update({
+            # Update web_state (Ensure status is passed correctly)
+            web_update.update({
                 "x": 0, "y": 0, "stack_h": current_stack,
                 "total_picked": total_picked,
-                "history": history_log,
                 "cam2_enabled": CAM2_ENABLED,
                 "robot_mode": ROBOT_MODE
             })
-            if not is_robot_busy: web_data["status"] = status_text # Prioritize motion status if busy
+            if not is_robot_busy: web_update["status"] = status_text # Prioritize motion status if busy
+            publish_web(1, current_visible_tags_cam1, web_update)
 
-            with lock_cam1: output_frame_cam1 = frame.copy()
+            overlay_cam1.publish(last_frame_id, frame, zones_config_cam1, marks)
             
         except Exception as e:
             # [FIXED] Catch exceptions in loop to prevent thread crash
@@ -826,21 +1021,28 @@ def vision_loop_cam1():
             time.sleep(0.1) # Prevent CPU hogging if a persistent error occurs in one frame
             # Continue the loop
 
-    cap.release()
+    grabber_cam1.stop()
 
 def vision_loop_cam2():
     """ CAM 2: รับผิดชอบ Zone 1 (ใช้ Affine) """
-    global output_frame_cam2, current_visible_tags_cam2, locked_target_id_cam2
+    global current_visible_tags_cam2, locked_target_id_cam2
     global processed_tags, tag_stability
     
-    cap = cv2.VideoCapture(RTSP_URL_CAM2)
-    at_detector = Detector(families="tag36h11")
+    grabber_cam2.start()
+    tracker_cam2 = TagTracker(lambda gray, frame_id, rois: detect_tags(gray, frame_id, 2, rois),
+                              detect_every=TRACK_DETECT_EVERY)
+    trackers[2] = tracker_cam2
+    motion_gates[2] = MotionGate()
+    tags = []
     print(">>> CAM2: STARTED (Side View) <<<")
+    last_frame_id = 0
     
     while True:
         try:
-            ret, frame = cap.read()
-            if not ret: time.sleep(2); cap = cv2.VideoCapture(RTSP_URL_CAM2); continue
+            grabbed = grabber_cam2.read(last_frame_id, timeout=2.0, consumer="vision")
+            if grabbed is None: continue
+            last_frame_id, frame_time, frame = grabbed
+            frame, gray = split_frame(frame)
             
             current_visible_tags_cam2 = []
             current_time = time.time()
@@ -849,18 +1051,17 @@ def vision_loop_cam2():
             closest_tag_id = None
             min_dist_to_center = float('inf')
             visible_ids = set()
+            web_update = {} # Published as one snapshot at the end of the frame
 
-            # Draw Zones 
-            for z in zones_config_cam2:
-                color = hex_to_bgr(z['color']) 
-                cv2.rectangle(frame, (z['x'], z['y']), (z['x']+z['w'], z['y']+z['h']), color, 2)
-                cv2.putText(frame, z['name'], (z['x'], z['y']-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            marks = [] # Tag outlines for the overlay stage (zones are pre-rendered there)
 
             if CAM2_ENABLED:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY); tags = at_detector.detect(gray)
+                tags = gated_tags(2, gray, last_frame_id, frame_time, tags)
                 
-                for tag in tags:
-                    cx, cy = int(tag.center[0]), int(tag.center[1]); zone = check_zone_cam2(cx, cy); visible_ids.add(tag.tag_id)
+                batch = transform_tags(transform_cam2, tags)
+
+                for i, tag in enumerate(tags):
+                    cx, cy = int(tag.center[0]), int(tag.center[1]); zone = batch.zones[i]; visible_ids.add(tag.tag_id)
                     
                     rx, ry, z_pick = 0.0, 0.0, 0.0
                     is_processed = False
@@ -868,19 +1069,16 @@ def vision_loop_cam2():
                     if zone:
                         zone_id = int(zone['id'])
                         
-                        # 1. Calculate Robot Coordinates
-                        if zone_id == 1:
-                            # Zone 1 (กลางภาพ Cam 2) -> ใช้ Affine ปกติ
-                            rx, ry = pixel_to_robot_cam2(cx, cy, zone_id)
-                            z_base = float(zone.get('z', 0.0))
-                            z_off = get_zone_tag_offset(zone_id, tag.tag_id)
-                            z_pick = z_base + FIXED_OBJECT_HEIGHT + z_off - Z_PICK_OFFSET
+                        # 1. Robot Coordinates (Zone 1 กลางภาพ Cam 2 -> ใช้ Affine ปกติ)
+                        if batch.processed[i]:
+                            rx, ry = float(batch.robot[i][0]), float(batch.robot[i][1])
+                            z_pick = float(batch.z_pick[i])
                             is_processed = True
                         
                         if is_processed:
                             tag_data = {
                                 "id": tag.tag_id, "cx": cx, "cy": cy, "rx": rx, "ry": ry, 
-                                "z_pick": z_pick, "zone": zone, "cam": 2
+                                "z_pick": z_pick, "zone": zone, "cam": 2, "track": tag.info()
                             }
                             newly_detected_tags[tag.tag_id] = tag_data
 
@@ -900,17 +1098,15 @@ def vision_loop_cam2():
                             if remaining_delay > 0:
                                 # State: WAITING (Yellow frame, countdown text)
                                 color = hex_to_bgr("#ffff00") # Yellow
-                                cv2.polylines(frame, [tag.corners.astype(int)], True, color, 2)
-                                cv2.putText(frame, f"WAIT {remaining_delay:.1f}s", (cx - 10, cy + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                                marks.append(TagMark(tag.corners, color, f"WAIT {remaining_delay:.1f}s", (cx - 10, cy + 30)))
                             else:
                                 # State: READY (Green frame)
                                 color = hex_to_bgr("#00ff00") # Green
-                                cv2.polylines(frame, [tag.corners.astype(int)], True, color, 2)
-                                cv2.putText(frame, "READY", (cx - 10, cy + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                                marks.append(TagMark(tag.corners, color, "READY", (cx - 10, cy + 30)))
                         
                         # Draw Zone 2, 3 detected by Cam 2 as low priority 
                         elif zone_id == 2 or zone_id == 3:
-                            cv2.polylines(frame, [tag.corners.astype(int)], True, hex_to_bgr(zone['color']), 2)
+                            marks.append(TagMark(tag.corners, hex_to_bgr(zone['color']), None, None))
                     
             
             # --- Target Locking Logic ---
@@ -929,9 +1125,9 @@ def vision_loop_cam2():
                 
                 if target_data and not is_robot_busy:
                     tag_id = target_data['id']
-                    # Update web_data with the stable target position
-                    web_data['target_x'] = round(target_data['rx'], 2)
-                    web_data['target_y'] = round(target_data['ry'], 2)
+                    # Update web_state with the stable target position
+                    web_update['target_x'] = round(target_data['rx'], 2)
+                    web_update['target_y'] = round(target_data['ry'], 2)
 
                     # 2. Delay Logic (5 seconds)
                     if tag_id not in tag_stability:
@@ -942,9 +1138,9 @@ def vision_loop_cam2():
                     if ROBOT_MODE == 'AUTO' and not is_robot_busy and is_connected:
                         
                         if time_elapsed < AUTO_PICK_DELAY:
-                            web_data['status'] = "DETECTED (WAITING)"
+                            web_update['status'] = "DETECTED (WAITING)"
                         else:
-                            web_data['status'] = "DETECTED (READY)"
+                            web_update['status'] = "DETECTED (READY)"
                              # Execute pick sequence after delay
                             if current_time - processed_tags.get(tag_id, 0) > 10.0:
                                 processed_tags[tag_id] = current_time
@@ -961,7 +1157,7 @@ def vision_loop_cam2():
                                                  args=(rx, ry, z_pick, z_hover, sb, tag_id, zone['name'])).start()
                     
                     elif not is_robot_busy:
-                        web_data['status'] = f"DETECTED (MANUAL)"
+                        web_update['status'] = f"DETECTED (MANUAL)"
                         
                 # Cleanup stability dictionary
                 for tid in list(tag_stability.keys()):
@@ -977,16 +1173,14 @@ def vision_loop_cam2():
             else:
                 # If no target is locked by either camera and not busy
                 if not is_robot_busy:
-                    web_data['status'] = "IDLE"
-                    web_data['target_x'] = 0.0
-                    web_data['target_y'] = 0.0
+                    web_update.update(status="IDLE", target_x=0.0, target_y=0.0)
                 
             
             # Update current_visible_tags_cam2 (used for /data API)
             current_visible_tags_cam2 = list(newly_detected_tags.values())
+            publish_web(2, current_visible_tags_cam2, web_update)
 
-
-            with lock_cam2: output_frame_cam2 = frame.copy()
+            overlay_cam2.publish(last_frame_id, frame, zones_config_cam2, marks)
             
         except Exception as e:
             # [FIXED] Catch exceptions in loop to prevent thread crash
@@ -994,31 +1188,26 @@ def vision_loop_cam2():
             time.sleep(0.1)
             # Continue the loop
 
-    cap.release()
-
-
-def gen_frames_cam1():
-    while True:
-        try:
-            with lock_cam1:
-                if output_frame_cam1 is None: time.sleep(0.1); continue
-                _, img = cv2.imencode(".jpg", output_frame_cam1)
-            yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + bytearray(img) + b'\r\n')
-        except Exception:
-            time.sleep(0.1)
-
-def gen_frames_cam2():
-    while True:
-        try:
-            with lock_cam2:
-                if output_frame_cam2 is None: time.sleep(0.1); continue
-                _, img = cv2.imencode(".jpg", output_frame_cam2)
-            yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + bytearray(img) + b'\r\n')
-        except Exception:
-            time.sleep(0.1)
-
-if __name__ == "__main__":
+    grabber_cam2.stop()
+
+# Detection workers run in forkserver/spawn processes, which re-import this
+# module: nothing with side effects may run at import time
+def setup():
+    """ GPIO, history file, config and calibration, cameras and streams """
+    setup_gpio()
+    init_database()
+    load_config()
+    setup_vision()
+
+def main():
+    global detection_engine
+    setup()
+    if DETECTION_WORKERS > 0:
+        detection_engine = DetectionEngine(DETECTION_WORKERS).start()
     t1 = threading.Thread(target=vision_loop_cam1); t1.daemon = True; t1.start()
     t2 = threading.Thread(target=vision_loop_cam2); t2.daemon = True; t2.start()
     print("--- ROBOT SERVER READY (FIXED) ---")
-    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=5000, debug=False, threaded=True)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,294 @@
+import random
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from dobot_api import DobotApiDashboard, DobotApiMove, DobotApi, FeedbackReader
+
+# Connection states reported to on_state
+DISCONNECTED = "DISCONNECTED"
+CONNECTING = "CONNECTING"
+CONNECTED = "CONNECTED"
+RECONNECTING = "RECONNECTING"
+
+CONNECTION_ERRORS = (ConnectionError, OSError, FutureTimeoutError)
+
+
+class ManagedClient:
+    """
+  Proxy for the current dashboard or move client of a RobotConnection
+  Any method of the wrapped DobotApi can be called on it. A connection failure
+  marks the connection broken; the command is then re-sent once on the client
+  of the next successful reconnect when the port's replay policy allows it,
+  otherwise it raises.
+  """
+
+    CLIENT_CLASSES = {"dash": DobotApiDashboard, "move": DobotApiMove}
+
+    def __init__(self, connection, port_name):
+        self._connection = connection
+        self._port_name = port_name
+
+    def __getattr__(self, name):
+        # Plain attributes come from the current client; methods are wrapped
+        # without resolving the client, so a call made while reconnecting can
+        # still wait for the new socket.
+        if not callable(getattr(self.CLIENT_CLASSES[self._port_name], name, None)):
+            return getattr(self._connection.client(self._port_name), name)
+
+        def call(*args, **kwargs):
+            connection = self._connection
+            generation, client = connection.current(self._port_name)
+            try:
+                return getattr(client, name)(*args, **kwargs)
+            except CONNECTION_ERRORS as e:
+                connection.report_failure(e, generation)
+                if not connection.replay[self._port_name]:
+                    raise
+                # Wait for the clients of a later (re)connect, never the failed one
+                if not connection.wait_connected(connection.replay_timeout, newer_than=generation):
+                    raise
+                return getattr(connection.client(self._port_name), name)(*args, **kwargs)
+        return call
+
+
+class RobotConnection:
+    """
+  Dashboard (29999), move (30003) and feedback (30004) sockets managed as one
+  - a health thread watches the feedback packet rate, the pipelined readers and
+    a periodic RobotMode() probe on the dashboard port
+  - on failure every socket is reopened with exponential backoff
+  - replay: per port, whether a command that failed in flight is re-sent after
+    the reconnect (dashboard settings are safe to repeat, motions are not)
+  - on_state(state, info) is called on every state change, on_connect(conn)
+    after every successful (re)connect
+  - generation counts the (re)connects; it tells a failure of the current
+    clients from a late one of clients already replaced
+  """
+
+    def __init__(self, ip, on_state=None, on_connect=None, feed_listeners=(),
+                 replay=None, health_interval=2.0, probe_timeout=3.0,
+                 backoff_initial=0.5, backoff_max=10.0, replay_timeout=15.0,
+                 connect_timeout=5.0, move_timeout=60.0):
+        self.ip = ip
+        self.on_state = on_state
+        self.on_connect = on_connect
+        self.feed_listeners = list(feed_listeners)
+        self.replay = {"dash": True, "move": False}
+        if replay:
+            self.replay.update(replay)
+        self.health_interval = health_interval
+        self.probe_timeout = probe_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.replay_timeout = replay_timeout
+        self.connect_timeout = connect_timeout
+        # Longest wait for a move port reply (Sync() returns when the queue is done)
+        self.move_timeout = move_timeout
+
+        self.state = DISCONNECTED
+        self.last_error = None
+        self.reconnect_count = 0
+        self.clients = {"dash": None, "move": None, "feed": None}
+        self.generation = 0
+        self.feed_reader = None
+        self.dash = ManagedClient(self, "dash")
+        self.move = ManagedClient(self, "move")
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._broken = threading.Event()
+        self._closing = False
+        self._thread = None
+
+    def client(self, port_name):
+        client = self.clients[port_name]
+        if client is None:
+            raise ConnectionError(f"Robot {self.ip} is {self.state.lower()}")
+        return client
+
+    def current(self, port_name):
+        """
+    (generation, client) of a port, read together
+    """
+        with self._lock:
+            generation, client = self.generation, self.clients[port_name]
+        if client is None:
+            raise ConnectionError(f"Robot {self.ip} is {self.state.lower()}")
+        return generation, client
+
+    @property
+    def is_connected(self):
+        return self.state == CONNECTED
+
+    def info(self):
+        return {
+            "state": self.state,
+            "ip": self.ip,
+            "reconnects": self.reconnect_count,
+            "error": str(self.last_error) if self.last_error else None,
+        }
+
+    def _set_state(self, state):
+        with self._cond:
+            self.state = state
+            self._cond.notify_all()
+        if self.on_state:
+            try:
+                self.on_state(state, self.info())
+            except Exception as e:
+                print(f"[CONNECTION] on_state error: {e}")
+
+    def connect(self):
+        """
+    Open all three sockets once (raises on failure), then keep them alive
+    """
+        self._set_state(CONNECTING)
+        try:
+            if not self._open():
+                return self
+        except Exception as e:
+            self.last_error = e
+            self._set_state(DISCONNECTED)
+            raise
+        self._thread = threading.Thread(target=self._supervise, daemon=True)
+        self._thread.start()
+        return self
+
+    def _open(self, reconnect=False):
+        """
+    Open the three sockets; return False (with them closed again) when
+    close() was called meanwhile
+    """
+        dash = move = feed = None
+        try:
+            dash = DobotApiDashboard(self.ip, 29999, pipelined=True, reply_timeout=10.0,
+                                     connect_timeout=self.connect_timeout)
+            move = DobotApiMove(self.ip, 30003, pipelined=True, reply_timeout=self.move_timeout,
+                                connect_timeout=self.connect_timeout)
+            feed = DobotApi(self.ip, 30004, connect_timeout=self.connect_timeout)
+        except Exception:
+            for client in (dash, move, feed):
+                if client is not None:
+                    client.close()
+            raise
+        reader = FeedbackReader(feed)
+        for listener in self.feed_listeners:
+            reader.add_listener(listener)
+        reader.start()
+        with self._lock:
+            closing = self._closing
+            if not closing:
+                self.clients = {"dash": dash, "move": move, "feed": feed}
+                self.feed_reader = reader
+                self.generation += 1
+        if closing:
+            for client in (dash, move, feed):
+                client.close()
+            reader.stop()
+            return False
+        self._broken.clear()
+        if reconnect:
+            self.reconnect_count += 1
+        self._set_state(CONNECTED)
+        if self._closing:
+            # close() ran between storing the clients and reporting CONNECTED
+            self._close_clients()
+            self._set_state(DISCONNECTED)
+            return False
+        if self.on_connect:
+            try:
+                self.on_connect(self)
+            except Exception as e:
+                print(f"[CONNECTION] on_connect error: {e}")
+        return True
+
+    def _close_clients(self):
+        with self._lock:
+            clients, self.clients = self.clients, {"dash": None, "move": None, "feed": None}
+            reader, self.feed_reader = self.feed_reader, None
+        # Sockets first: shutting them down is what wakes the blocked readers
+        for client in clients.values():
+            if client is not None:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+        if reader is not None:
+            reader.stop()
+
+    def report_failure(self, error, generation=None):
+        """
+    Mark the connection broken; the supervisor thread reconnects
+    generation: that of the client that failed; ignored when it was replaced
+    """
+        with self._cond:
+            if self.state != CONNECTED or self._broken.is_set():
+                return
+            if generation is not None and generation != self.generation:
+                return
+            self.last_error = error
+            self._broken.set()
+            self._cond.notify_all()
+
+    def wait_connected(self, timeout=None, newer_than=None):
+        """
+    Wait until connected and not reported broken; with newer_than, until the
+    clients of a later generation are up. Return False on timeout
+    """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: (self.state == CONNECTED and not self._broken.is_set()
+                         and (newer_than is None or self.generation > newer_than)), timeout)
+
+    def _check_health(self, last_count):
+        reader = self.feed_reader
+        if reader is None or not reader.running:
+            return ConnectionError("Feedback reader stopped"), 0
+        if reader.packet_count == last_count:
+            return ConnectionError("No feedback packets received"), last_count
+        for name in ("dash", "move"):
+            client = self.clients[name]
+            if client is None or client.connection_error is not None:
+                return ConnectionError(f"{name} port closed"), reader.packet_count
+        try:
+            self.clients["dash"].submit("RobotMode()").result(self.probe_timeout)
+        except Exception as e:
+            return e, reader.packet_count
+        return None, reader.packet_count
+
+    def _supervise(self):
+        last_count = -1
+        while not self._closing:
+            if not self._broken.wait(self.health_interval):
+                error, last_count = self._check_health(last_count)
+                if error is None or self._closing:
+                    continue
+                self.last_error = error
+            if self._closing:
+                break
+            print(f"[CONNECTION] Lost robot {self.ip}: {self.last_error}")
+            self._reconnect()
+            last_count = -1
+
+    def _reconnect(self):
+        self._set_state(RECONNECTING)
+        self._close_clients()
+        delay = self.backoff_initial
+        while not self._closing:
+            try:
+                if self._open(reconnect=True):
+                    print(f"[CONNECTION] Reconnected to {self.ip}")
+                return
+            except Exception as e:
+                self.last_error = e
+                self._set_state(RECONNECTING)
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, self.backoff_max)
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+        self._broken.set()
+        self._close_clients()
+        self._set_state(DISCONNECTED)
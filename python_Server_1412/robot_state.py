@@ -0,0 +1,171 @@
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from dobot_api import MyType
+
+STATE_NAME = "dobot_robot_state"
+# 8-byte version counter, then one MyType record
+STATE_HEADER = 8
+STATE_SIZE = STATE_HEADER + MyType.itemsize
+
+_fence_lock = threading.Lock()
+
+
+def _fence():
+    """
+  Full memory barrier around the seqlock's plain numpy loads and stores
+  A lock release keeps earlier accesses before it and the next acquire keeps
+  later ones after it; both touch the same lock word, so they stay in order.
+  Needed on weakly ordered CPUs (the ARM Jetson), a no-op cost on x86.
+  """
+    _fence_lock.acquire()
+    _fence_lock.release()
+    _fence_lock.acquire()
+    _fence_lock.release()
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached blocks with the resource tracker,
+        # which would unlink the writer's block when this process exits.
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class RobotStateStore:
+    """
+  Latest feedback record in shared memory, guarded by a seqlock
+  The feedback thread calls publish() for every packet (it can be registered
+  directly as a FeedbackReader listener); any thread or process attached with
+  the same name reads pose, joints, IO and error flags without touching the
+  controller socket.
+  The version is odd while a write is in progress, so a reader retries until
+  it copies the record between two equal even versions.
+  Only the store that created the block may publish, and publishes from
+  several threads (e.g. an old and a new feedback reader) are serialized.
+  """
+
+    def __init__(self, name=STATE_NAME, create=False):
+        self.name = name
+        self.owner = create
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=STATE_SIZE)
+            except FileExistsError:
+                # Left over from a writer that did not shut down cleanly
+                stale = _attach(name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=STATE_SIZE)
+        else:
+            self.shm = _attach(name)
+        self._version = np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=0)
+        self._record = np.ndarray((1,), dtype=MyType, buffer=self.shm.buf, offset=STATE_HEADER)
+        self._write_lock = threading.Lock()
+        if create:
+            self._version[0] = 0
+
+    @property
+    def version(self):
+        return int(self._version[0])
+
+    def publish(self, record):
+        """
+    Write a 1-element MyType record (the creating store only)
+    """
+        if not self.owner:
+            raise PermissionError(f"{self.name} is attached read-only; only its creator publishes")
+        with self._write_lock:
+            self._version[0] += 1
+            _fence()
+            np.copyto(self._record, record)
+            _fence()
+            self._version[0] += 1
+
+    def read(self, timeout=0.01):
+        """
+    Return a consistent copy of the latest record, or None if nothing was
+    published yet (or a write kept colliding for longer than timeout)
+    """
+        deadline = time.monotonic() + timeout
+        while True:
+            before = int(self._version[0])
+            if before == 0:
+                return None
+            if before % 2 == 0:
+                _fence()
+                record = self._record.copy()
+                _fence()
+                if int(self._version[0]) == before:
+                    return record
+            if time.monotonic() > deadline:
+                return None
+            # Let the writer (often a thread of this process) finish
+            time.sleep(0.0001)
+
+    def pose(self):
+        """
+    Cartesian pose (x, y, z, r)
+    """
+        record = self.read()
+        if record is None:
+            return None
+        return [float(v) for v in record['tool_vector_actual'][0][:4]]
+
+    def joints(self):
+        """
+    Joint angles (j1, j2, j3, j4)
+    """
+        record = self.read()
+        if record is None:
+            return None
+        return [float(v) for v in record['q_actual'][0][:4]]
+
+    def io(self, count=16):
+        """
+    Digital inputs and outputs 1..count as lists of 0/1
+    """
+        record = self.read()
+        if record is None:
+            return None
+        di_bits = int(record['digital_input_bits'][0])
+        do_bits = int(record['digital_outputs'][0])
+        di = [(di_bits >> i) & 1 for i in range(count)]
+        do = [(do_bits >> i) & 1 for i in range(count)]
+        return di, do
+
+    def status(self):
+        """
+    Robot mode and error/enable/running flags
+    """
+        record = self.read()
+        if record is None:
+            return None
+        return {
+            "robot_mode": int(record['robot_mode'][0]),
+            "error": bool(record['ErrorStatus'][0][0]),
+            "enabled": bool(record['EnableStatus'][0][0]),
+            "running": bool(record['RunningStatus'][0][0]),
+            "queue_running": bool(record['isRunQueuedCmd'][0][0]),
+            "speed_scaling": float(record['speed_scaling'][0]),
+        }
+
+    def close(self):
+        self._version = None
+        self._record = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,141 @@
+import re
+import socket
+import threading
+import time
+import types
+
+import numpy as np
+
+import dobot_api
+from dobot_api import MyType, FEED_MAGIC
+
+COMMAND = re.compile(rb"[A-Za-z]\w*\([^)]*\)")
+
+
+class FakeSocket:
+    """
+  Stand-in for socket.socket: one end of a socketpair whose other end is
+  served by a FakeController once connect() is called
+  """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self._sock, self._peer = socket.socketpair()
+
+    def connect(self, address):
+        self.controller.attach(address[1], self._peer)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class FakeController:
+    """
+  Dobot controller double for the 29999/30003/30004 ports
+  Commands are recorded per port in received and answered in order with
+  reply(port, command), "0,{},Command();" by default. The feedback port sends
+  a valid MyType packet every feed_interval seconds.
+  - refuse: connect() raises ConnectionRefusedError while set
+  - chunk: send each reply in pieces of that many bytes, so it is split
+    across reads
+  - hold(port): commands on that port are recorded but not answered until
+    release(port)
+  - drop(): close every open connection, as a controller reboot would
+  """
+
+    def __init__(self, feed_interval=0.01):
+        self.feed_interval = feed_interval
+        self.received = {29999: [], 30003: [], 30004: []}
+        self.events = []  # (port, command) across ports, in arrival order
+        self.connects = {29999: 0, 30003: 0, 30004: 0}
+        self.refuse = False
+        self.chunk = None
+        self.reply = lambda port, command: "0,{},%s;" % command.decode()
+        self._held = {}
+        self._conns = []
+        self._lock = threading.Lock()
+
+    def socket(self, *args, **kwargs):
+        return FakeSocket(self)
+
+    def patch(self, monkeypatch):
+        """
+    Route dobot_api's sockets to this controller for one test
+    """
+        fake = types.SimpleNamespace(socket=self.socket, error=socket.error, SHUT_RDWR=socket.SHUT_RDWR)
+        monkeypatch.setattr(dobot_api, "socket", fake)
+        return self
+
+    def attach(self, port, conn):
+        if self.refuse:
+            raise ConnectionRefusedError(f"Port {port} refused")
+        with self._lock:
+            self.connects[port] += 1
+            self._conns.append(conn)
+        target = self._feed if port == 30004 else self._serve
+        threading.Thread(target=target, args=(port, conn), daemon=True).start()
+
+    def hold(self, port):
+        self._held[port] = threading.Event()
+
+    def release(self, port):
+        self._held.pop(port).set()
+
+    def drop(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def _serve(self, port, conn):
+        buffered = b""
+        try:
+            while True:
+                data = conn.recv(1024)
+                if not data:
+                    return
+                buffered += data
+                end = 0
+                for match in COMMAND.finditer(buffered):
+                    command, end = match.group(), match.end()
+                    with self._lock:
+                        self.received[port].append(command.decode())
+                        self.events.append((port, command.decode()))
+                    held = self._held.get(port)
+                    if held is not None:
+                        held.wait()
+                    self._send(conn, self.reply(port, command).encode())
+                buffered = buffered[end:]
+        except OSError:
+            return
+
+    def _send(self, conn, reply):
+        if not self.chunk:
+            conn.sendall(reply)
+            return
+        for start in range(0, len(reply), self.chunk):
+            conn.sendall(reply[start:start + self.chunk])
+            time.sleep(0.002)
+
+    def _feed(self, port, conn):
+        packet = np.zeros(1, dtype=MyType)
+        packet['test_value'] = FEED_MAGIC
+        try:
+            while True:
+                conn.sendall(packet.tobytes())
+                time.sleep(self.feed_interval)
+        except OSError:
+            return
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from dobot_api import DobotApiDashboard, DobotApiMove
+from fake_dobot import FakeController, wait_until
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    return FakeController().patch(monkeypatch)
+
+
+@pytest.fixture
+def dash(controller):
+    client = DobotApiDashboard("fake", 29999, pipelined=True, reply_timeout=2.0)
+    yield client
+    client.close()
+
+
+def test_replies_resolve_futures_in_fifo_order(controller, dash):
+    controller.hold(29999)
+    futures = [dash.submit(f"SpeedFactor({i})") for i in range(5)]
+    assert not any(future.done() for future in futures)
+    controller.release(29999)
+    assert [future.result(2.0) for future in futures] == ["0,{},SpeedFactor(%d);" % i for i in range(5)]
+    assert controller.received[29999] == ["SpeedFactor(%d)" % i for i in range(5)]
+
+
+def test_commands_from_several_threads_each_get_their_own_reply(controller, dash):
+    results = {}
+
+    def worker(n):
+        results[n] = [dash.SpeedFactor(n * 10 + i) for i in range(20)]
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5.0)
+    for n in range(4):
+        assert results[n] == ["0,{},SpeedFactor(%d);" % (n * 10 + i) for i in range(20)]
+
+
+def test_deferred_returns_futures_and_waits_on_exit(controller):
+    move = DobotApiMove("fake", 30003, pipelined=True, reply_timeout=2.0)
+    try:
+        with move.deferred() as pending:
+            first = move.MovJ(1, 2, 3, 4)
+            second = move.MovL(5, 6, 7, 8)
+            assert pending == [first, second]
+        assert first.done() and second.done()
+        assert second.result().startswith("0,{},MovL(")
+    finally:
+        move.close()
+
+
+def test_close_fails_pending_commands(controller, dash):
+    controller.hold(29999)
+    future = dash.submit("RobotMode()")
+    dash.close()
+    with pytest.raises(ConnectionError):
+        future.result(1.0)
+    controller.release(29999)
+
+
+def test_lost_connection_fails_pending_and_later_commands(controller, dash):
+    controller.hold(29999)
+    future = dash.submit("RobotMode()")
+    controller.drop()
+    with pytest.raises(ConnectionError):
+        future.result(1.0)
+    assert wait_until(lambda: dash.connection_error is not None)
+    with pytest.raises(ConnectionError):
+        dash.submit("RobotMode()").result(1.0)
+    controller.release(29999)
+
+
+def test_blocking_mode_still_waits_for_each_reply(controller):
+    dash = DobotApiDashboard("fake", 29999)
+    try:
+        assert dash.EnableRobot() == "0,{},EnableRobot();"
+        assert dash.RobotMode() == "0,{},RobotMode();"
+        with pytest.raises(Exception):
+            dash.submit("RobotMode()")
+    finally:
+        dash.close()
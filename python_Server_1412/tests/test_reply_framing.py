@@ -0,0 +1,75 @@
+import pytest
+
+from dobot_api import DobotApiDashboard, ReplyFramer, parse_reply
+from fake_dobot import FakeController
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    return FakeController().patch(monkeypatch)
+
+
+def test_framer_joins_a_reply_split_across_reads():
+    framer = ReplyFramer()
+    framer.feed(b"0,{1.5,")
+    assert framer.pop() is None
+    framer.feed(b"2},GetAngle()")
+    assert framer.pop() is None
+    framer.feed(b";")
+    assert framer.pop() == "0,{1.5,2},GetAngle();"
+    assert framer.pop() is None
+
+
+def test_framer_splits_coalesced_replies_and_keeps_the_rest():
+    framer = ReplyFramer()
+    framer.feed(b"0,{},EnableRobot();-1,{},MovJ();0,{5},Rob")
+    assert framer.pop() == "0,{},EnableRobot();"
+    assert framer.pop() == "-1,{},MovJ();"
+    assert framer.pop() is None
+    framer.feed(b"otMode();")
+    assert framer.pop() == "0,{5},RobotMode();"
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("0,{},EnableRobot();", (0, (), "EnableRobot()")),
+    ("-1,{},MovJ(1,2,3,4);", (-1, (), "MovJ(1,2,3,4)")),
+    ("0,{5},RobotMode();", (0, (5,), "RobotMode()")),
+    ("0,{[[22],[],[],[],[],[]]},GetErrorID();", (0, (((22,), (), (), (), (), ()),), "GetErrorID()")),
+    ("0,{1.5,-2.25,3,0},GetAngle();", (0, (1.5, -2.25, 3, 0), "GetAngle()")),
+    ("0,{on,off},GetDO();", (0, ("on", "off"), "GetDO()")),
+])
+def test_parse_reply(raw, expected):
+    assert tuple(parse_reply(raw)) == expected
+
+
+def test_parse_reply_of_unexpected_text():
+    reply = parse_reply("Control Mode Is Not Tcp")
+    assert reply.error_id is None
+    assert reply.command == "Control Mode Is Not Tcp"
+    assert parse_reply("").error_id is None
+
+
+def test_numbers_flattens_nested_values():
+    assert parse_reply("0,{[[22,-2],[],[7]]},GetErrorID();").numbers == [22, -2, 7]
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_split_replies_over_the_socket(controller, pipelined):
+    controller.chunk = 3
+    dash = DobotApiDashboard("fake", 29999, pipelined=pipelined, reply_timeout=2.0)
+    try:
+        assert dash.RobotMode() == "0,{},RobotMode();"
+        assert dash.sendRecvReply("GetAngle()") == (0, (), "GetAngle()")
+    finally:
+        dash.close()
+
+
+def test_blocking_mode_keeps_bytes_of_the_next_reply(controller):
+    replies = iter(["0,{},EnableRobot();0,{9},", "RobotMode();"])
+    controller.reply = lambda port, command: next(replies)
+    dash = DobotApiDashboard("fake", 29999)
+    try:
+        assert dash.EnableRobot() == "0,{},EnableRobot();"
+        assert dash.RobotMode() == "0,{9},RobotMode();"
+    finally:
+        dash.close()
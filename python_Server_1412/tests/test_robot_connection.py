@@ -0,0 +1,86 @@
+import pytest
+
+import robot_connection
+from robot_connection import RobotConnection, CONNECTED
+from fake_dobot import FakeController, wait_until
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    return FakeController().patch(monkeypatch)
+
+
+def connect(**kwargs):
+    kwargs.setdefault("health_interval", 0.05)
+    kwargs.setdefault("backoff_initial", 0.01)
+    return RobotConnection("fake", **kwargs).connect()
+
+
+def test_connect_opens_all_three_ports(controller):
+    conn = connect()
+    try:
+        assert conn.state == CONNECTED
+        assert conn.generation == 1
+        assert controller.connects == {29999: 1, 30003: 1, 30004: 1}
+        assert wait_until(lambda: conn.feed_reader.packet_count > 0)
+    finally:
+        conn.close()
+
+
+def test_dashboard_command_is_replayed_on_the_new_connection(controller):
+    conn = connect()
+    try:
+        controller.drop()
+        assert conn.dash.RobotMode() == "0,{},RobotMode();"
+        assert conn.generation == 2
+        assert conn.reconnect_count == 1
+        assert controller.connects[29999] == 2
+    finally:
+        conn.close()
+
+
+def test_move_command_is_not_replayed(controller):
+    conn = connect()
+    try:
+        controller.drop()
+        with pytest.raises(robot_connection.CONNECTION_ERRORS):
+            conn.move.MovJ(1, 2, 3, 4)
+        assert wait_until(lambda: conn.generation == 2 and conn.is_connected)
+        assert controller.received[30003] == []
+    finally:
+        conn.close()
+
+
+def test_failure_of_a_replaced_client_is_ignored(controller):
+    conn = connect()
+    try:
+        conn.report_failure(ConnectionError("stale"), generation=conn.generation - 1)
+        assert conn.wait_connected(0)
+        assert conn.reconnect_count == 0
+    finally:
+        conn.close()
+
+
+def test_reported_failure_blocks_waiters_until_the_next_connection(controller):
+    conn = connect(health_interval=10.0)
+    try:
+        generation = conn.generation
+        controller.refuse = True
+        conn.report_failure(ConnectionError("boom"), generation)
+        assert not conn.wait_connected(0)
+        controller.refuse = False
+        assert conn.wait_connected(2.0, newer_than=generation)
+        assert conn.generation == generation + 1
+    finally:
+        conn.close()
+
+
+def test_close_during_reconnect_stops_retrying(controller):
+    conn = connect()
+    controller.refuse = True
+    controller.drop()
+    assert wait_until(lambda: conn.state == "RECONNECTING")
+    conn.close()
+    controller.refuse = False
+    assert not wait_until(lambda: conn.is_connected, timeout=0.3)
+    assert conn.state == "DISCONNECTED"
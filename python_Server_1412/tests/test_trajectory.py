@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from dobot_api import DobotApiDashboard, DobotApiMove
+from fake_dobot import FakeController, wait_until
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    return FakeController().patch(monkeypatch)
+
+
+@pytest.fixture
+def clients(controller):
+    dash = DobotApiDashboard("fake", 29999, pipelined=True, reply_timeout=2.0)
+    move = DobotApiMove("fake", 30003, pipelined=True, reply_timeout=2.0)
+    yield dash, move
+    dash.close()
+    move.close()
+
+
+def test_cp_is_set_per_run_of_equal_blends(controller, clients):
+    dash, move = clients
+    move.trajectory(dash).movj(1, 1, 1, 0, blend=50).movl(2, 2, 2, 0, blend=50) \
+        .movl(3, 3, 3, 0, blend=20).movj(4, 4, 4, 0, blend=50).submit()
+    assert [command.split("(")[0] if port == 30003 else command for port, command in controller.events] == [
+        "CP(50)", "MovJ", "MovL", "CP(20)", "MovL", "CP(0)", "MovJ"]
+
+
+def test_cp_waits_for_the_previous_segments_to_be_queued(controller, clients):
+    dash, move = clients
+    controller.hold(30003)
+    trajectory = move.trajectory(dash).movj(1, 1, 1, 0, blend=50).movl(2, 2, 2, 0, blend=50).movl(3, 3, 3, 0)
+    worker = threading.Thread(target=trajectory.submit)
+    worker.start()
+    assert wait_until(lambda: len(controller.received[30003]) == 1)
+    # Both segments of the first run are written at once, CP(0) waits for their replies
+    assert not wait_until(lambda: "CP(0)" in controller.received[29999], timeout=0.2)
+    controller.release(30003)
+    worker.join(2.0)
+    assert controller.received[29999] == ["CP(50)", "CP(0)"]
+    assert [port for port, _ in controller.events] == [29999, 30003, 30003, 29999, 30003]
+
+
+def test_unblended_path_sends_no_cp(controller, clients):
+    dash, move = clients
+    move.trajectory(dash).movj(1, 1, 1, 0).movl(2, 2, 2, 0).submit()
+    assert controller.received[29999] == []
+    assert len(controller.received[30003]) == 2
+
+
+def test_blending_without_dashboard_raises(controller, clients):
+    _, move = clients
+    with pytest.raises(ValueError):
+        move.trajectory().movj(1, 1, 1, 0, blend=50).movl(2, 2, 2, 0).submit()
+    assert controller.received[30003] == []
+
+
+def test_cp_error_stops_the_path(controller, clients):
+    dash, move = clients
+    controller.reply = lambda port, command: "-1,{},%s;" % command.decode() if port == 29999 else \
+        "0,{},%s;" % command.decode()
+    with pytest.raises(Exception, match="CP\\(50\\) failed"):
+        move.trajectory(dash).movj(1, 1, 1, 0, blend=50).movl(2, 2, 2, 0).submit()
+    assert controller.received[30003] == []
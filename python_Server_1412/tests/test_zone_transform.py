@@ -0,0 +1,148 @@
+import math
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+from zone_transform import ZoneTransform
+
+CALIBRATION_POINTS = [
+    {"ref_x": 122.18, "ref_y": 175.45, "true_x": 122.18, "true_y": 175.45, "true_z": -34.59},
+    {"ref_x": 121.66, "ref_y": 318.27, "true_x": 121.66, "true_y": 318.27, "true_z": -38.92},
+    {"ref_x": 205.21, "ref_y": 175.15, "true_x": 205.21, "true_y": 175.15, "true_z": -36.00},
+    {"ref_x": 208.83, "ref_y": 318.74, "true_x": 208.83, "true_y": 318.74, "true_z": -40.68},
+    # Shifted from its reference, so the IDW offsets are not all zero
+    {"ref_x": 166.41, "ref_y": 246.13, "true_x": 167.9, "true_y": 244.6, "true_z": -37.30},
+]
+FIXED_OBJECT_HEIGHT = 20.0
+Z_PICK_OFFSET = 62.0
+IDW_Z_OFFSET = -2.0
+
+
+# Per-tag code the batch transform replaced (check_zone_cam1, pixel_to_robot_cam1,
+# calculate_correction_from_5_points and the zone 2/3 branches of the vision loop)
+def reference_zone(zones, cx, cy):
+    for zone in zones:
+        if zone['x'] < cx < zone['x'] + zone['w'] and zone['y'] < cy < zone['y'] + zone['h']:
+            return zone
+    return None
+
+
+def reference_idw(x, y):
+    numerator_x = numerator_y = numerator_z = denominator = 0.0
+    for p in CALIBRATION_POINTS:
+        dist = math.sqrt((x - p['ref_x']) ** 2 + (y - p['ref_y']) ** 2)
+        if dist < 0.1:
+            return p['true_x'], p['true_y'], p['true_z']
+        weight = 1.0 / dist ** 3.0
+        numerator_x += (p['true_x'] - p['ref_x']) * weight
+        numerator_y += (p['true_y'] - p['ref_y']) * weight
+        numerator_z += p['true_z'] * weight
+        denominator += weight
+    return x + numerator_x / denominator, y + numerator_y / denominator, numerator_z / denominator
+
+
+def reference_tag(zones, matrices, cx, cy, tag_id, tag_offset):
+    zone = reference_zone(zones, cx, cy)
+    if zone is None:
+        return None, False, None
+    zone_id = int(zone['id'])
+    if zone_id in matrices:
+        rx, ry = matrices[zone_id].dot(np.array([cx, cy, 1.0], dtype=np.float32))
+    else:
+        rx, ry = float(cx), float(cy)
+    if zone_id == 2:
+        rx, ry, z = reference_idw(rx, ry)
+        return zone, True, (rx, ry, z + IDW_Z_OFFSET)
+    if zone_id == 3:
+        z = float(zone.get('z', 0.0)) + FIXED_OBJECT_HEIGHT + tag_offset(zone_id, tag_id) - Z_PICK_OFFSET
+        return zone, True, (rx, ry, z)
+    return zone, False, None
+
+
+def random_zones(rng, fractional):
+    zones = []
+    for zone_id in (1, 2, 3, 4):
+        x, y, w, h = rng.uniform(0, 500), rng.uniform(0, 350), rng.uniform(20, 250), rng.uniform(20, 200)
+        if not fractional:
+            x, y, w, h = int(x), int(y), int(w), int(h)
+        zones.append({"id": zone_id, "x": x, "y": y, "w": w, "h": h, "z": rng.uniform(-40, 150)})
+    return zones
+
+
+def matrices_for(zones):
+    src = np.float32([[429.0, 452.0], [620.0, 459.0], [425.0, 557.0], [617.0, 569.0], [522.0, 506.0]])
+    dst = np.float32([[269.24, 71.70], [272.26, 212.65], [350.53, 71.82], [354.85, 214.52], [309.74, 143.01]])
+    matrix, _ = cv2.estimateAffine2D(src, dst)
+    # Zone 3 as loaded from an affine_params file (float32), zone 4 without a matrix
+    loaded = np.array([[0.45, 0.01, 40.0], [-0.02, 0.47, 12.5]], dtype=np.float32)
+    return {1: matrix, 2: matrix, 3: loaded}
+
+
+@pytest.mark.parametrize("fractional", [False, True])
+def test_batch_transform_matches_the_per_tag_code(fractional):
+    rng = random.Random(19 + fractional)
+    for _ in range(40):
+        zones = random_zones(rng, fractional)
+        matrices = matrices_for(zones)
+        pick = {2: ("idw", IDW_Z_OFFSET),
+                3: ("affine", float(zones[2]['z']) + FIXED_OBJECT_HEIGHT - Z_PICK_OFFSET)}
+        transform = ZoneTransform(zones, matrices, pick, CALIBRATION_POINTS, idw_power=3.0)
+        offsets = {(3, tag_id): rng.uniform(-5, 5) for tag_id in range(10)}
+        tag_offset = lambda zone_id, tag_id: offsets.get((zone_id, tag_id), 0.0)
+
+        centers = np.array([[rng.randint(-10, 800), rng.randint(-10, 600)] for _ in range(200)])
+        tag_ids = [rng.randrange(10) for _ in centers]
+        result = transform.apply(centers, tag_ids, tag_offset)
+        for i, (cx, cy) in enumerate(centers):
+            zone, processed, expected = reference_tag(zones, matrices, cx, cy, tag_ids[i], tag_offset)
+            assert result.zones[i] is zone
+            assert bool(result.processed[i]) == processed
+            if processed:
+                assert result.robot[i] == pytest.approx(expected[:2], abs=1e-3)
+                assert result.z_pick[i] == pytest.approx(expected[2], abs=1e-6)
+
+
+def test_points_on_a_calibration_point_snap_to_it():
+    matrices = {2: np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])}
+    transform = ZoneTransform([{"id": 2, "x": 0, "y": 0, "w": 400, "h": 400}], matrices,
+                              {2: ("idw", 0.0)}, CALIBRATION_POINTS)
+    result = transform.apply([[166.41, 246.13], [166.45, 246.1], [167, 246]])
+    assert tuple(result.robot[0]) == pytest.approx((167.9, 244.6))
+    assert tuple(result.robot[1]) == pytest.approx((167.9, 244.6))
+    assert result.z_pick[1] == pytest.approx(-37.30)
+    assert tuple(result.robot[2]) == pytest.approx(reference_idw(167.0, 246.0)[:2])
+    assert result.z_pick[2] == pytest.approx(reference_idw(167.0, 246.0)[2])
+
+
+@pytest.mark.parametrize("fractional", [False, True])
+def test_label_raster_matches_the_strict_rectangle_test(fractional):
+    rng = random.Random(20 + fractional)
+    for _ in range(40):
+        zones = random_zones(rng, fractional)
+        transform = ZoneTransform(zones, {}, {})
+        # Every pixel within two of a zone edge, the only place the raster can disagree
+        xs = sorted({v for zone in zones for edge in (zone['x'], zone['x'] + zone['w'])
+                     for v in range(math.floor(edge) - 2, math.ceil(edge) + 3)})
+        ys = sorted({v for zone in zones for edge in (zone['y'], zone['y'] + zone['h'])
+                     for v in range(math.floor(edge) - 2, math.ceil(edge) + 3)})
+        centers = np.array([[cx, cy] for cy in ys for cx in xs], dtype=np.float64)
+        expected = []
+        for cx, cy in centers:
+            zone = reference_zone(zones, cx, cy)
+            expected.append(len(zones) if zone is None else zones.index(zone))
+        assert list(transform.locate(centers)) == expected
+
+
+def test_fractional_centers_use_the_exact_test():
+    zones = [{"id": 1, "x": 10.5, "y": 10.5, "w": 20.25, "h": 20.25}]
+    transform = ZoneTransform(zones, {}, {})
+    centers = np.array([[10.4, 20.0], [10.6, 20.0], [30.7, 20.0], [30.8, 20.0], [20.0, 30.74]])
+    assert list(transform.locate(centers)) == [1, 0, 0, 1, 0]
+
+
+def test_polygon_zone_includes_its_outline():
+    zones = [{"id": 1, "points": [[10, 10], [50, 10], [50, 40], [10, 40]]}]
+    transform = ZoneTransform(zones, {}, {})
+    assert list(transform.locate(np.array([[10, 10], [30, 25], [50, 40], [51, 25]], dtype=float))) == [0, 0, 0, 1]
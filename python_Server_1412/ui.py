@@ -414,25 +414,17 @@ class RobotUI(object):
             self.frame_feed, text_list[2][3], rely=0.5, x=x4, command=lambda: self.move_jog(text_list[2][3]))
 
     def feed_back(self):
-        hasRead = 0
+        reader = FeedbackReader(self.client_feed)
         while True:
             if not self.global_state["connect"]:
                 break
-            data = bytes()
-            while hasRead < 1440:
-                try:
-                    temp = self.client_feed.socket_dobot.recv(1440 - hasRead)
-                    if len(temp) > 0:
-                        hasRead += len(temp)
-                        data += temp
-                    else: break
-                except: break
-            
-            if len(data) < 1440: continue
-            hasRead = 0
+            try:
+                a = reader.read_packet()
+            except Exception:
+                time.sleep(0.1)
+                continue
 
-            a = np.frombuffer(data, dtype=MyType)
-            if hex((a['test_value'][0])) == '0x123456789abcdef':
+            if a is not None:
                 try:
                     self.label_feed_speed["text"] = a["speed_scaling"][0]
                     self.label_robot_mode["text"] = LABEL_ROBOT_MODE[a["robot_mode"][0]]
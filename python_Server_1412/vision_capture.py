@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+import time
+
+import cv2
+
+# Read by OpenCV's FFmpeg backend when a capture is opened: RTSP over TCP,
+# no input buffering or reordering delay
+FFMPEG_LOW_LATENCY = "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay|max_delay;0|reorder_queue_size;0"
+
+# Decoder elements per codec: (Jetson hardware, software)
+GST_DECODERS = {
+    "h264": ("nvv4l2decoder", "avdec_h264"),
+    "h265": ("nvv4l2decoder", "avdec_h265"),
+}
+
+_ffmpeg_lock = threading.Lock()
+
+
+def has_gstreamer():
+    return re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()) is not None
+
+
+def gstreamer_pipeline(url, codec="h264", hw=True, width=None, height=None, gray=False, latency=0):
+    """
+  appsink pipeline for an RTSP camera that always hands over the newest frame
+  hw=True decodes with nvv4l2decoder and scales/converts with nvvidconv on the
+  Jetson's hardware; otherwise the software decoder and videoconvert are used.
+  """
+    hw_decoder, sw_decoder = GST_DECODERS[codec]
+    size = f",width={int(width)},height={int(height)}" if width and height else ""
+    out_format = "GRAY8" if gray else "BGR"
+    source = (f'rtspsrc location="{url}" latency={int(latency)} protocols=tcp drop-on-latency=true '
+              f'! rtp{codec}depay ! {codec}parse')
+    if hw:
+        if gray:
+            convert = f"nvvidconv ! video/x-raw,format=GRAY8{size}"
+        else:
+            convert = f"nvvidconv ! video/x-raw,format=BGRx{size} ! videoconvert ! video/x-raw,format=BGR"
+        decode = f"{hw_decoder} ! {convert}"
+    else:
+        decode = f"{sw_decoder} ! videoscale ! videoconvert ! video/x-raw,format={out_format}{size}"
+    return f"{source} ! {decode} ! appsink drop=true max-buffers=1 sync=false"
+
+
+def open_ffmpeg(url):
+    with _ffmpeg_lock:
+        previous = os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS")
+        os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = FFMPEG_LOW_LATENCY
+        try:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+        finally:
+            if previous is None:
+                del os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"]
+            else:
+                os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = previous
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class FrameGrabber:
+    """
+  Capture stage for one RTSP camera
+  A thread drains the stream as fast as it arrives and keeps only the newest
+  frame, so the consumer always gets fresh data no matter how slow it is.
+  read() returns (frame_id, timestamp, frame). Several consumers may read the
+  same grabber; one that names itself (consumer="vision") gets the frames it
+  skipped between two reads counted as dropped, per consumer, in stats().
+  backend: "auto" tries a GStreamer pipeline with hardware decode, then with
+  software decode, then FFmpeg in low-latency mode; "gstreamer" or "ffmpeg"
+  limit the choice, and open() raises when the requested one is unavailable. width/height and gray request a smaller or single-channel
+  frame (done in the pipeline with GStreamer, after decode with FFmpeg);
+  zone coordinates are in pixels of the delivered frame.
+  """
+
+    def __init__(self, url, name="CAM", reconnect_delay=2.0, backend="auto", codec="h264",
+                 width=None, height=None, gray=False):
+        self.url = url
+        self.name = name
+        self.reconnect_delay = reconnect_delay
+        self.backend = backend
+        self.codec = codec
+        self.width = width
+        self.height = height
+        self.gray = gray
+        self.active_backend = None
+        self.convert_after_read = False
+        self.cap = None
+        self.frame = None
+        self.frame_id = 0
+        self.timestamp = 0.0
+        self.frames_read = 0
+        self.consumers = {}
+        self.reconnects = 0
+        self.running = False
+        self.thread = None
+        self._cond = threading.Condition()
+
+    def check_backend(self):
+        """
+    Raise RuntimeError when the requested backend is not available
+    """
+        if self.backend not in ("auto", "gstreamer", "ffmpeg"):
+            raise RuntimeError(f"[{self.name}] Unknown capture backend {self.backend!r}")
+        if self.backend == "gstreamer" and not has_gstreamer():
+            raise RuntimeError(f"[{self.name}] Backend 'gstreamer' requested but OpenCV has no GStreamer support")
+
+    def open(self):
+        """
+    Open the capture with the configured backend
+    With backend="gstreamer" a pipeline that fails to open is returned
+    unopened (so the stream is retried) instead of falling back to FFmpeg.
+    """
+        self.check_backend()
+        if self.backend == "gstreamer" or (self.backend == "auto" and has_gstreamer()):
+            for hw in (True, False):
+                pipeline = gstreamer_pipeline(self.url, self.codec, hw, self.width, self.height, self.gray)
+                cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+                if cap.isOpened():
+                    self.active_backend = "gstreamer-hw" if hw else "gstreamer"
+                    self.convert_after_read = False
+                    return cap
+                cap.release()
+            if self.backend == "gstreamer":
+                print(f"[{self.name}] GStreamer pipeline failed to open")
+                self.active_backend = None
+                return cap
+            print(f"[{self.name}] GStreamer pipeline failed, falling back to FFmpeg")
+        self.active_backend = "ffmpeg"
+        self.convert_after_read = bool(self.gray or (self.width and self.height))
+        return open_ffmpeg(self.url)
+
+    def _convert(self, frame):
+        if self.width and self.height and frame.shape[:2] != (self.height, self.width):
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        if self.gray and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def start(self):
+        self.check_backend()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self):
+        self.cap = self.open()
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                print(f"[{self.name}] Stream lost, reconnecting")
+                self.cap.release()
+                time.sleep(self.reconnect_delay)
+                self.cap = self.open()
+                self.reconnects += 1
+                continue
+            if self.convert_after_read:
+                frame = self._convert(frame)
+            now = time.time()
+            with self._cond:
+                self.frame = frame
+                self.frame_id += 1
+                self.timestamp = now
+                self.frames_read += 1
+                self._cond.notify_all()
+        self.cap.release()
+
+    def read(self, last_id=0, timeout=1.0, consumer=None):
+        """
+    Wait for a frame newer than last_id (the frame_id this consumer read last)
+    Return (frame_id, timestamp, frame), or None on timeout
+    The frame is never written to again by the grabber, so the caller owns it.
+    """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.frame_id > last_id or not self.running, timeout):
+                return None
+            if self.frame_id <= last_id:
+                return None
+            if consumer is not None:
+                counts = self.consumers.setdefault(consumer, {"reads": 0, "dropped": 0})
+                counts["reads"] += 1
+                if last_id:
+                    counts["dropped"] += self.frame_id - last_id - 1
+            return self.frame_id, self.timestamp, self.frame
+
+    def stats(self):
+        return {
+            "backend": self.active_backend,
+            "frame_id": self.frame_id,
+            "frames_read": self.frames_read,
+            "consumers": {name: dict(counts) for name, counts in self.consumers.items()},
+            "reconnects": self.reconnects,
+            "age_ms": round((time.time() - self.timestamp) * 1000.0, 1) if self.timestamp else None,
+        }
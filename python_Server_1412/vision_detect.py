@@ -0,0 +1,413 @@
+import queue
+import threading
+import time
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import cv2
+import numpy as np
+
+from zone_transform import zone_bounds
+
+# Same attribute names as pupil_apriltags.Detection, so the vision loops can
+# use either interchangeably
+TagDetection = namedtuple("TagDetection", ["tag_id", "center", "corners", "decision_margin"])
+DetectionResult = namedtuple("DetectionResult", ["frame_id", "cam", "tags"])
+
+DEFAULT_DETECTOR = {"families": "tag36h11"}
+
+# Tunable Detector arguments and their types
+PROFILE_KEYS = {
+    "quad_decimate": float,
+    "quad_sigma": float,
+    "nthreads": int,
+    "refine_edges": int,
+    "decode_sharpening": float,
+}
+
+# Auto-tune search space; nthreads and anything else keep the current value
+AUTOTUNE_CANDIDATES = [
+    {"quad_decimate": decimate, "quad_sigma": sigma}
+    for decimate in (1.0, 1.5, 2.0, 3.0) for sigma in (0.0, 0.8)
+]
+
+# Detector objects are not thread-safe, so each thread gets its own
+_local = threading.local()
+
+
+def normalize_profile(profile):
+    """
+  Validate a detector profile; return it with every value converted
+  Raises ValueError for unknown keys or out-of-range values
+  """
+    result = {}
+    for key, value in (profile or {}).items():
+        if key not in PROFILE_KEYS:
+            raise ValueError(f"Unknown detector setting {key}")
+        value = PROFILE_KEYS[key](value)
+        if key == "quad_decimate" and value < 1.0:
+            raise ValueError("quad_decimate must be >= 1.0")
+        if key == "nthreads" and value < 1:
+            raise ValueError("nthreads must be >= 1")
+        if value < 0:
+            raise ValueError(f"{key} must be >= 0")
+        result[key] = value
+    return result
+
+
+def detector_params(profile):
+    """
+  Detector keyword arguments for a profile
+  """
+    params = dict(DEFAULT_DETECTOR)
+    params.update(normalize_profile(profile))
+    return params
+
+
+def local_detector(params):
+    """
+  In-process Detector for a parameter set, created once per thread
+  """
+    detectors = getattr(_local, "detectors", None)
+    if detectors is None:
+        detectors = _local.detectors = {}
+    key = tuple(sorted(params.items()))
+    detector = detectors.get(key)
+    if detector is None:
+        from pupil_apriltags import Detector
+        detector = detectors[key] = Detector(**params)
+    return detector
+
+
+def autotune(frames, base=None, candidates=None, min_rate=0.95):
+    """
+  Benchmark detector profiles on recorded grayscale frames
+  The reference is what the most thorough setting (quad_decimate 1) finds;
+  the fastest candidate that finds at least min_rate of those tags is picked.
+  Return (best_profile or None, per-candidate results).
+  """
+    base = normalize_profile(base)
+    candidates = candidates or AUTOTUNE_CANDIDATES
+    reference_detector = local_detector(detector_params(dict(base, quad_decimate=1.0)))
+    reference = [set(t.tag_id for t in reference_detector.detect(f)) for f in frames]
+    expected = sum(len(ids) for ids in reference)
+    results = []
+    for candidate in candidates:
+        profile = dict(base, **normalize_profile(candidate))
+        detector = local_detector(detector_params(profile))
+        found = 0
+        start = time.perf_counter()
+        for frame, ids in zip(frames, reference):
+            found += len(ids & set(t.tag_id for t in detector.detect(frame)))
+        elapsed = time.perf_counter() - start
+        results.append({
+            "profile": profile,
+            "ms_per_frame": round(elapsed * 1000.0 / max(1, len(frames)), 2),
+            "detection_rate": round(found / expected, 3) if expected else None,
+        })
+    if not expected:
+        return None, results
+    passing = [r for r in results if r["detection_rate"] >= min_rate]
+    if not passing:
+        return None, results
+    return min(passing, key=lambda r: r["ms_per_frame"])["profile"], results
+
+
+def zone_rois(zones, frame_shape, zone_ids=None, margin=40):
+    """
+  Detection regions for a camera: the zones it is responsible for, padded by
+  margin so tags on a zone edge are not cut, overlapping boxes merged
+  Return a list of (x0, y0, x1, y1) clamped to the frame
+  """
+    height, width = frame_shape[:2]
+    boxes = []
+    for zone in zones:
+        if zone_ids is not None and int(zone['id']) not in zone_ids:
+            continue
+        x0, y0, x1, y1 = zone_bounds(zone)
+        boxes.append([max(0, x0 - margin), max(0, y0 - margin),
+                      min(width, x1 + margin), min(height, y1 + margin)])
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(box) for box in boxes if box[2] > box[0] and box[3] > box[1]]
+
+
+def crop_roi(gray, roi, scale=1.0):
+    """
+  Contiguous (optionally downscaled) copy of one region of the frame
+  """
+    x0, y0, x1, y1 = roi
+    crop = gray[y0:y1, x0:x1]
+    if scale != 1.0:
+        return cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(crop)
+
+
+def map_tags(tags, roi, scale=1.0):
+    """
+  Move detections made on a crop back to full-frame coordinates
+  """
+    offset = np.array(roi[:2], dtype=np.float64)
+    return [TagDetection(t.tag_id, np.asarray(t.center) / scale + offset,
+                         np.asarray(t.corners) / scale + offset, t.decision_margin)
+            for t in tags]
+
+
+def detect_rois(detector, gray, rois, scale=1.0):
+    """
+  In-process counterpart of DetectionEngine.detect_rois() for a Detector
+  """
+    tags = []
+    for roi in rois:
+        tags.extend(map_tags(detector.detect(crop_roi(gray, roi, scale)), roi, scale))
+    return tags
+
+
+def default_mp_context():
+    """
+  forkserver where the platform has it, else spawn; never fork, since the
+  server has threads (and their locks) by the time workers are (re)started
+  """
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def _detect_worker(slot_names, conn):
+    from pupil_apriltags import Detector
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    detectors = {}
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        seq, slot, frame_id, cam, shape, params = task
+        try:
+            key = tuple(sorted(params.items()))
+            detector = detectors.get(key)
+            if detector is None:
+                detector = detectors[key] = Detector(**params)
+            gray = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+            tags = [(int(t.tag_id), np.array(t.center), np.array(t.corners), float(t.decision_margin))
+                    for t in detector.detect(gray)]
+            conn.send((seq, frame_id, cam, tags, None))
+        except Exception as e:
+            conn.send((seq, frame_id, cam, [], repr(e)))
+    for shm in slots:
+        shm.close()
+
+
+class DetectionEngine:
+    """
+  AprilTag detection in worker processes, outside the server's GIL
+  Grayscale frames are copied into shared-memory slots; a worker runs
+  pupil_apriltags.Detector on the slot and sends back tag ids, centers and
+  corners with the frame id. Each worker keeps one Detector per parameter set.
+  Workers are started with forkserver/spawn (see default_mp_context), so the
+  main module must guard its startup code with if __name__ == "__main__".
+  Every worker has its own pipe, so one that dies holds no lock the others
+  need; the collector thread restarts it, fails the frames it had been given
+  with RuntimeError and frees their slots.
+  """
+
+    def __init__(self, workers=2, slots=None, max_frame_bytes=1920 * 1080, mp_context=None):
+        self.workers = workers
+        self.slot_count = slots or workers * 2
+        self.max_frame_bytes = max_frame_bytes
+        self.context = multiprocessing.get_context(mp_context or default_mp_context())
+        self.slots = []
+        self.processes = []
+        self.conns = []
+        self.assigned = []  # Per worker: sequence numbers of its unfinished tasks
+        self.free_slots = queue.Queue()
+        self.pending = {}  # Sequence number -> (slot, worker index, Future)
+        self.sequence = 0
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.restarts = 0
+        self.running = False
+        self._lock = threading.Lock()
+        self._collector = None
+
+    def start(self):
+        self.slots = [shared_memory.SharedMemory(create=True, size=self.max_frame_bytes)
+                      for _ in range(self.slot_count)]
+        for slot in range(self.slot_count):
+            self.free_slots.put(slot)
+        for _ in range(self.workers):
+            self.processes.append(None)
+            self.conns.append(None)
+            self.assigned.append(set())
+        for index in range(self.workers):
+            self._start_worker(index)
+        self.running = True
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        return self
+
+    def _start_worker(self, index):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_detect_worker, daemon=True,
+                                       args=([shm.name for shm in self.slots], child_conn))
+        process.start()
+        child_conn.close()
+        self.processes[index], self.conns[index] = process, conn
+
+    def submit(self, gray, frame_id=0, cam=0, params=None, timeout=1.0):
+        """
+    Queue a grayscale frame; return a Future of DetectionResult
+    """
+        if gray.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {gray.nbytes} bytes exceeds the {self.max_frame_bytes} byte slots")
+        slot = self.free_slots.get(timeout=timeout)
+        view = np.ndarray(gray.shape, dtype=np.uint8, buffer=self.slots[slot].buf)
+        np.copyto(view, gray)
+        future = Future()
+        with self._lock:
+            self.sequence += 1
+            seq = self.sequence
+            index = min(range(self.workers), key=lambda i: len(self.assigned[i]))
+            self.pending[seq] = (slot, index, future)
+            self.assigned[index].add(seq)
+            self.submitted += 1
+            try:
+                # Small message and at most slot_count in flight, so this never blocks
+                self.conns[index].send((seq, slot, frame_id, cam, gray.shape, dict(params or DEFAULT_DETECTOR)))
+            except OSError:
+                pass  # The worker died; the collector restarts it and fails this task
+        return future
+
+    def detect(self, gray, frame_id=0, cam=0, params=None, timeout=2.0):
+        """
+    Blocking submit(); return the DetectionResult
+    """
+        return self.submit(gray, frame_id, cam, params, timeout).result(timeout)
+
+    def detect_rois(self, gray, rois, frame_id=0, cam=0, params=None, scale=1.0, timeout=2.0):
+        """
+    Detect on each region in parallel; return the tags in full-frame coordinates
+    """
+        futures = [(roi, self.submit(crop_roi(gray, roi, scale), frame_id, cam, params, timeout))
+                   for roi in rois]
+        tags = []
+        for roi, future in futures:
+            tags.extend(map_tags(future.result(timeout).tags, roi, scale))
+        return DetectionResult(frame_id, cam, tags)
+
+    def _release(self, seq):
+        """
+    Drop a pending task and free its slot; return its Future, or None if it
+    was already released
+    """
+        with self._lock:
+            entry = self.pending.pop(seq, None)
+            if entry is None:
+                return None
+            slot, index, future = entry
+            self.assigned[index].discard(seq)
+        self.free_slots.put(slot)
+        return future
+
+    def _finish(self, result):
+        seq, frame_id, cam, tags, error = result
+        future = self._release(seq)
+        if future is None:
+            return
+        with self._lock:
+            self.completed += 1
+            if error:
+                self.errors += 1
+        if error:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(DetectionResult(frame_id, cam, [TagDetection(*t) for t in tags]))
+
+    def _restart_worker(self, index):
+        """
+    Replace a dead worker; fail the tasks it had not answered
+    """
+        process, conn = self.processes[index], self.conns[index]
+        print(f"[DETECT] Worker {process.pid} exited with code {process.exitcode}, restarting")
+        process.join(timeout=0)
+        with self._lock:
+            self._start_worker(index)
+            lost, self.assigned[index] = self.assigned[index], set()
+            self.restarts += 1
+        # Results it sent before dying are still in the old pipe
+        try:
+            while conn.poll():
+                self._finish(conn.recv())
+        except (EOFError, OSError):
+            pass
+        conn.close()
+        for seq in lost:
+            with self._lock:
+                entry = self.pending.pop(seq, None)
+                if entry is not None:
+                    self.errors += 1
+            if entry is None:
+                continue
+            self.free_slots.put(entry[0])
+            entry[2].set_exception(RuntimeError(f"Detection worker exited with code {process.exitcode}"))
+
+    def _collect(self):
+        while self.running:
+            conns = list(self.conns)
+            sentinels = [process.sentinel for process in self.processes]
+            ready = wait(conns + sentinels, timeout=0.5)
+            if not self.running:
+                break
+            for index, (conn, sentinel) in enumerate(zip(conns, sentinels)):
+                if sentinel in ready:
+                    self._restart_worker(index)
+                elif conn in ready:
+                    try:
+                        self._finish(conn.recv())
+                    except (EOFError, OSError):
+                        pass  # Its sentinel is ready on the next pass
+
+    def stats(self):
+        return {
+            "workers": sum(1 for p in self.processes if p.is_alive()),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "busy_slots": self.slot_count - self.free_slots.qsize(),
+        }
+
+    def close(self):
+        self.running = False
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=2.0)
+        if self._collector is not None:
+            self._collector.join(timeout=2.0)
+        for conn in self.conns:
+            conn.close()
+        for shm in self.slots:
+            shm.close()
+            shm.unlink()
+        self.slots = []
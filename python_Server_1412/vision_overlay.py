@@ -0,0 +1,121 @@
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from zone_transform import zone_polygon, zone_bounds
+
+# One tag outline to draw; label (e.g. "WAIT 3.2s") is written at origin
+TagMark = namedtuple("TagMark", ["corners", "color", "label", "origin"])
+
+
+class ZoneOverlay:
+    """
+  Zone outlines and names rendered once per zone list and frame size
+  Only the pixels the overlay covers are stored, so applying it to a frame
+  costs a copy of those pixels (or a blend of them when alpha < 1).
+  """
+
+    def __init__(self, zone_color, alpha=1.0):
+        self.zone_color = zone_color
+        self.alpha = alpha
+        self._zones = None
+        self._shape = None
+        self._index = None
+        self._pixels = None
+
+    def _render(self, zones, shape):
+        image = np.zeros(shape[:2] + (3,), dtype=np.uint8)
+        mask = np.zeros(shape[:2], dtype=np.uint8)
+        for z in zones:
+            color = self.zone_color(z['color'])
+            outline = zone_polygon(z)
+            x0, y0 = zone_bounds(z)[:2]
+            for target, value in ((image, color), (mask, 255)):
+                cv2.polylines(target, [outline], True, value, 2)
+                cv2.putText(target, z['name'], (x0, y0-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, value, 1)
+        self._index = np.nonzero(mask)
+        self._pixels = image[self._index]
+        self._zones = zones
+        self._shape = shape
+
+    def apply(self, frame, zones):
+        # Zone lists are replaced, never edited in place, when the config is saved
+        if zones is not self._zones or frame.shape != self._shape:
+            self._render(zones, frame.shape)
+        if self.alpha >= 1.0:
+            frame[self._index] = self._pixels
+        else:
+            blended = frame[self._index] * (1.0 - self.alpha) + self._pixels * self.alpha
+            frame[self._index] = blended.astype(np.uint8)
+        return frame
+
+
+class OverlayStage:
+    """
+  Annotated stream frames, drawn only for attached clients
+  The vision loop publishes each frame with its zones and TagMarks and does
+  no drawing itself. A stream client holds client() while connected and calls
+  render(), which draws every frame once however many clients ask for it.
+  The published frame is never modified; annotations go on a copy.
+  """
+
+    def __init__(self, name, zone_color, alpha=1.0):
+        self.name = name
+        self.zones = ZoneOverlay(zone_color, alpha)
+        self.frame = None
+        self.frame_id = 0
+        self.zone_list = ()
+        self.marks = ()
+        self.clients = 0
+        self.renders = 0
+        self.rendered_id = 0
+        self.rendered = None
+        self._cond = threading.Condition()
+        self._render_lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.clients > 0
+
+    def publish(self, frame_id, frame, zones, marks):
+        with self._cond:
+            self.frame = frame
+            self.frame_id = frame_id
+            self.zone_list = zones
+            self.marks = marks
+            self._cond.notify_all()
+
+    @contextmanager
+    def client(self):
+        with self._cond:
+            self.clients += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def render(self, last_id=0, timeout=1.0):
+        """
+    Wait for a frame newer than last_id; return (frame_id, annotated frame) or None
+    """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.frame_id > last_id, timeout):
+                return None
+            frame_id, frame, zones, marks = self.frame_id, self.frame, self.zone_list, self.marks
+        with self._render_lock:
+            if self.rendered_id != frame_id:
+                image = self.zones.apply(frame.copy(), zones)
+                for mark in marks:
+                    cv2.polylines(image, [mark.corners.astype(int)], True, mark.color, 2)
+                    if mark.label:
+                        cv2.putText(image, mark.label, mark.origin, cv2.FONT_HERSHEY_SIMPLEX, 0.7, mark.color, 2)
+                self.rendered_id, self.rendered = frame_id, image
+                self.renders += 1
+            return self.rendered_id, self.rendered
+
+    def stats(self):
+        return {"clients": self.clients, "renders": self.renders}
@@ -0,0 +1,266 @@
+import math
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import cv2
+
+from jpeg_encoder import make_encoder
+
+MJPEG_BOUNDARY = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+# What a client receives; clients with equal settings share every encode
+StreamSettings = namedtuple("StreamSettings", ["fps", "max_width", "quality"])
+
+
+def stream_settings(args, defaults, limits):
+    """
+  StreamSettings and adaptive flag from request query parameters
+  (fps, width, quality, adaptive), clamped to the server's limits; values
+  that are not finite numbers fall back to the defaults
+  limits: StreamSettings of (min, max) pairs
+  """
+    def value(name, field, cast):
+        low, high = getattr(limits, field)
+        try:
+            number = cast(args.get(name, getattr(defaults, field)))
+        except (TypeError, ValueError, OverflowError):
+            number = getattr(defaults, field)
+        # nan slips through min()/max() and inf is no rate
+        if not math.isfinite(number):
+            number = getattr(defaults, field)
+        return min(max(number, low), high)
+
+    settings = StreamSettings(value("fps", "fps", float), value("width", "max_width", int),
+                              value("quality", "quality", int))
+    adaptive = str(args.get("adaptive", "1")).lower() not in ("0", "false", "no", "off")
+    return settings, adaptive
+
+
+class AdaptiveRate:
+    """
+  Per-client settings that follow how fast its socket drains
+  A frame whose send took longer than backlog of the frame interval counts as
+  backed up; after `patience` of them in a row the client steps down (JPEG
+  quality first, then frame rate, then width). After `recover` fast sends in
+  a row it steps back up towards the requested settings.
+  """
+
+    def __init__(self, target, floor=StreamSettings(2.0, 320, 30), backlog=0.5, patience=3, recover=60):
+        self.target = target
+        self.floor = floor
+        self.settings = target
+        self.backlog = backlog
+        self.patience = patience
+        self.recover = recover
+        self.slow = 0
+        self.fast = 0
+        self.steps_down = 0
+
+    def _down(self, s):
+        if s.quality > self.floor.quality:
+            return s._replace(quality=max(self.floor.quality, s.quality - 15))
+        if s.fps > self.floor.fps:
+            return s._replace(fps=max(self.floor.fps, s.fps / 2.0))
+        if s.max_width > self.floor.max_width:
+            return s._replace(max_width=max(self.floor.max_width, s.max_width // 2))
+        return s
+
+    def _up(self, s):
+        if s.max_width < self.target.max_width:
+            return s._replace(max_width=min(self.target.max_width, s.max_width * 2))
+        if s.fps < self.target.fps:
+            return s._replace(fps=min(self.target.fps, s.fps * 2.0))
+        if s.quality < self.target.quality:
+            return s._replace(quality=min(self.target.quality, s.quality + 15))
+        return s
+
+    def update(self, send_time):
+        """
+    Record how long the last frame took to send; return the settings to use
+    """
+        if send_time > self.backlog / self.settings.fps:
+            self.slow += 1
+            self.fast = 0
+            if self.slow >= self.patience:
+                self.slow = 0
+                lower = self._down(self.settings)
+                if lower != self.settings:
+                    self.settings = lower
+                    self.steps_down += 1
+        else:
+            self.fast += 1
+            self.slow = 0
+            if self.fast >= self.recover:
+                self.fast = 0
+                self.settings = self._up(self.settings)
+        return self.settings
+
+
+class MjpegBroadcaster:
+    """
+  Encode-once MJPEG fan-out for one camera
+  While at least one subscriber is attached, a thread takes every new frame
+  from source (an OverlayStage) and encodes it once per distinct
+  StreamSettings in use, no faster than that setting's fps. Each encode is
+  published with a sequence number, already wrapped as a multipart part.
+  Subscribers wait on a condition variable for the next sequence number of
+  their settings and all send the same bytes object.
+  encoder: a jpeg_encoder backend used only by this broadcaster's thread
+  (its output buffer is reused); make_encoder() when not given.
+  """
+
+    def __init__(self, source, name="CAM", default=StreamSettings(15.0, 1280, 80), encoder=None):
+        self.source = source
+        self.name = name
+        self.default = default
+        self.encoder = encoder or make_encoder()
+        self.seq = 0
+        self.variants = {}
+        self.subscribers = 0
+        self.encodes = 0
+        self.encode_time = 0.0
+        self.thread = None
+        self._cond = threading.Condition()
+
+    def _attach(self, settings):
+        variant = self.variants.setdefault(settings, {"subscribers": 0, "seq": 0, "part": None, "encoded_at": 0.0})
+        variant["subscribers"] += 1
+
+    def _detach(self, settings):
+        variant = self.variants[settings]
+        variant["subscribers"] -= 1
+        if variant["subscribers"] == 0:
+            del self.variants[settings]
+
+    @contextmanager
+    def subscribe(self, settings=None):
+        settings = settings or self.default
+        with self._cond:
+            self.subscribers += 1
+            self._attach(settings)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        subscription = {"settings": settings}
+        try:
+            yield subscription
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                self._detach(subscription["settings"])
+
+    def change(self, subscription, settings):
+        """
+    Move a subscription to other settings
+    """
+        with self._cond:
+            self._detach(subscription["settings"])
+            self._attach(settings)
+            subscription["settings"] = settings
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # Also after an unexpected error, so the next subscriber starts a new thread
+            with self._cond:
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def _loop(self):
+        last_id = 0
+        with self.source.client():
+            while True:
+                with self._cond:
+                    if self.subscribers == 0:
+                        self.thread = None
+                        return
+                    now = time.monotonic()
+                    remaining = {s: 1.0 / s.fps - (now - v["encoded_at"]) for s, v in self.variants.items()}
+                due = [s for s, left in remaining.items() if left <= 0]
+                if not due:
+                    wait = min(remaining.values())
+                    time.sleep(wait if 0 < wait < 1.0 else 1.0)
+                    continue
+                try:
+                    rendered = self.source.render(last_id)
+                    if rendered is None:
+                        continue
+                    last_id, image = rendered
+                    parts = {}
+                    resized = {}
+                    for settings in due:
+                        width = image.shape[1]
+                        if width > settings.max_width:
+                            width = settings.max_width
+                            if width not in resized:
+                                height = image.shape[0] * width // image.shape[1]
+                                resized[width] = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                        start = time.perf_counter()
+                        jpeg = self.encoder.encode(resized.get(width, image), settings.quality)
+                        self.encode_time += time.perf_counter() - start
+                        self.encodes += 1
+                        # Copy out of the encoder's buffer before the next encode reuses it
+                        parts[settings] = b''.join((MJPEG_BOUNDARY, jpeg, b'\r\n'))
+                except Exception as e:
+                    print(f"[{self.name}] Stream encode error: {e}")
+                    time.sleep(0.1)
+                    continue
+                now = time.monotonic()
+                with self._cond:
+                    self.seq += 1
+                    for settings, part in parts.items():
+                        variant = self.variants.get(settings)
+                        if variant is not None:
+                            variant.update(seq=self.seq, part=part, encoded_at=now)
+                    self._cond.notify_all()
+
+    def wait(self, settings, last_seq=0, timeout=1.0):
+        """
+    Wait for a frame after last_seq at these settings; return (seq, multipart part) or None
+    """
+        def ready():
+            variant = self.variants.get(settings)
+            return variant is not None and variant["seq"] > last_seq
+
+        with self._cond:
+            if not self._cond.wait_for(ready, timeout):
+                return None
+            variant = self.variants[settings]
+            return variant["seq"], variant["part"]
+
+    def stream(self, settings=None, adaptive=False):
+        """
+    multipart/x-mixed-replace body for one client
+    """
+        with self.subscribe(settings) as subscription:
+            rate = AdaptiveRate(subscription["settings"]) if adaptive else None
+            last_seq = 0
+            while True:
+                frame = self.wait(subscription["settings"], last_seq)
+                if frame is None:
+                    continue
+                last_seq, part = frame
+                # The server writes the part before asking for the next one,
+                # so the time spent here is the time the socket took to take it
+                start = time.monotonic()
+                yield part
+                if rate is not None:
+                    settings = rate.update(time.monotonic() - start)
+                    if settings != subscription["settings"]:
+                        self.change(subscription, settings)
+
+    def stats(self):
+        with self._cond:
+            variants = [dict(s._asdict(), clients=v["subscribers"]) for s, v in self.variants.items()]
+        return {
+            "encoder": self.encoder.name,
+            "subsampling": self.encoder.subsampling,
+            "subscribers": self.subscribers,
+            "seq": self.seq,
+            "encodes": self.encodes,
+            "encode_ms": round(self.encode_time * 1000.0 / self.encodes, 2) if self.encodes else None,
+            "variants": variants,
+        }
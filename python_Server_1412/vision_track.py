@@ -0,0 +1,197 @@
+import cv2
+import numpy as np
+
+
+class Track:
+    """
+  One tag followed across frames
+  Has the tag_id/center/corners of a detection, so the vision loops can use
+  it in place of one, plus track_id, velocity (px/s) and confidence (0..1).
+  """
+
+    def __init__(self, track_id, tag, timestamp):
+        self.track_id = track_id
+        self.tag_id = tag.tag_id
+        self.center = np.asarray(tag.center, dtype=np.float64)
+        self.corners = np.asarray(tag.corners, dtype=np.float64)
+        self.velocity = np.zeros(2)
+        self.confidence = 1.0
+        self.misses = 0
+        self.timestamp = timestamp
+
+    def predict(self, timestamp):
+        return self.center + self.velocity * (timestamp - self.timestamp)
+
+    def update(self, tag, timestamp, smoothing=0.5):
+        center = np.asarray(tag.center, dtype=np.float64)
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            velocity = (center - self.center) / dt
+            self.velocity = smoothing * velocity + (1.0 - smoothing) * self.velocity
+        self.center = center
+        self.corners = np.asarray(tag.corners, dtype=np.float64)
+        self.timestamp = timestamp
+        self.misses = 0
+        self.confidence = 0.7 * self.confidence + 0.3
+
+    def miss(self):
+        self.misses += 1
+        self.confidence *= 0.7
+
+    def size(self):
+        return float(np.ptp(self.corners, axis=0).max())
+
+    def info(self):
+        return {
+            "track_id": self.track_id,
+            "velocity": [round(float(v), 1) for v in self.velocity],
+            "confidence": round(self.confidence, 2),
+        }
+
+
+class TagTracker:
+    """
+  Full detection every detect_every frames, local search in between
+  detect(gray, frame_id, rois) runs the detector, on the whole detection area
+  when rois is None, otherwise on the given (x0, y0, x1, y1) windows with
+  results in full-frame coordinates.
+  Between full detections each known tag is re-detected in a small window
+  around its predicted position. A tag that is not found there triggers a full
+  detection on the next frame; only tags found in the current frame are
+  returned, so a removed tag disappears as quickly as without tracking.
+  """
+
+    def __init__(self, detect, detect_every=10, window_scale=2.0, min_window=48):
+        self.detect = detect
+        self.detect_every = detect_every
+        self.window_scale = window_scale
+        self.min_window = min_window
+        self.tracks = {}
+        self.next_track_id = 1
+        self.frames_since_full = None
+        self.full_detections = 0
+        self.local_searches = 0
+
+    def _window(self, track, timestamp, shape):
+        cx, cy = track.predict(timestamp)
+        half = max(self.min_window, track.size() * self.window_scale) / 2.0
+        half += float(np.abs(track.velocity).max()) * max(0.0, timestamp - track.timestamp)
+        height, width = shape[:2]
+        x0, y0 = max(0, int(cx - half)), max(0, int(cy - half))
+        x1, y1 = min(width, int(cx + half)), min(height, int(cy + half))
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    def update(self, gray, frame_id, timestamp, force=False):
+        """
+    Return the tracks seen in this frame
+    """
+        full = (force or self.frames_since_full is None
+                or self.frames_since_full + 1 >= self.detect_every
+                or any(track.misses for track in self.tracks.values()))
+        if full:
+            tags = self.detect(gray, frame_id, None)
+            self.frames_since_full = 0
+            self.full_detections += 1
+        else:
+            rois = [self._window(track, timestamp, gray.shape) for track in self.tracks.values()]
+            rois = [roi for roi in rois if roi is not None]
+            tags = self.detect(gray, frame_id, rois) if rois else []
+            self.frames_since_full += 1
+            self.local_searches += 1
+
+        found = {}
+        for tag in tags:
+            found[tag.tag_id] = tag
+        for tag_id in list(self.tracks):
+            track = self.tracks[tag_id]
+            if tag_id in found:
+                track.update(found.pop(tag_id), timestamp)
+            elif full:
+                del self.tracks[tag_id]
+            else:
+                track.miss()
+        # New tags can only come from a full detection
+        for tag_id, tag in found.items():
+            if full:
+                self.tracks[tag_id] = Track(self.next_track_id, tag, timestamp)
+                self.next_track_id += 1
+        return [track for track in self.tracks.values() if track.misses == 0]
+
+    def stats(self):
+        frames = self.full_detections + self.local_searches
+        return {
+            "tracks": len(self.tracks),
+            "full_detections": self.full_detections,
+            "local_searches": self.local_searches,
+            "full_ratio": round(self.full_detections / frames, 3) if frames else None,
+        }
+
+
+class MotionGate:
+    """
+  Skip detection while nothing moves in the detection regions
+  Each frame is shrunk by scale and compared with the frame of the last
+  detection; a region counts as changed when more than area_threshold of its
+  pixels differ by more than pixel_threshold. The bounding box of every known
+  tag is checked on its own against tag_threshold, so a small tag being picked
+  up is not lost in the area of its zone. Detection is also forced every
+  max_skip seconds, so slow drift and lighting changes are picked up.
+  """
+
+    def __init__(self, scale=0.125, pixel_threshold=20, area_threshold=0.01, tag_threshold=0.1,
+                 max_skip=2.0):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.tag_threshold = tag_threshold
+        self.max_skip = max_skip
+        self.reference = None
+        self.reference_time = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.last_changed = True
+
+    def _shrink(self, gray):
+        return cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def _moved(self, moved, box, threshold):
+        x0, y0, x1, y1 = box
+        area = moved[max(0, int(y0 * self.scale)):int(np.ceil(y1 * self.scale)),
+                     max(0, int(x0 * self.scale)):int(np.ceil(x1 * self.scale))]
+        return area.size and area.mean() > threshold
+
+    def check(self, gray, rois, timestamp, tags=()):
+        """
+    Return True when the frame must be detected; rois=None checks the whole
+    frame, tags are the last known tags (anything with corners)
+    """
+        self.frames += 1
+        small = self._shrink(gray)
+        changed = (self.reference is None or self.reference.shape != small.shape
+                   or timestamp - self.reference_time >= self.max_skip)
+        if not changed:
+            moved = np.abs(small.astype(np.int16) - self.reference) > self.pixel_threshold
+            if rois is None:
+                rois = [(0, 0, gray.shape[1], gray.shape[0])]
+            # One shrunk pixel of margin, so a tag of a few pixels still has a box
+            margin = 1.0 / self.scale
+            boxes = [(*(np.min(tag.corners, axis=0) - margin), *(np.max(tag.corners, axis=0) + margin))
+                     for tag in tags]
+            changed = (any(self._moved(moved, box, self.tag_threshold) for box in boxes)
+                       or any(self._moved(moved, roi, self.area_threshold) for roi in rois))
+        if changed:
+            self.reference = small.astype(np.int16)
+            self.reference_time = timestamp
+        else:
+            self.skipped += 1
+        self.last_changed = changed
+        return changed
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else None,
+        }
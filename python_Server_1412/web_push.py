@@ -0,0 +1,148 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from web_state import encode_json
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+SSE_KEEPALIVE = b": keepalive\n\n"
+
+
+def tag_key(tag):
+    """
+  Identity of a dashboard tag across updates (the same id can be seen in two zones)
+  """
+    return f"{tag['id']}@{tag['zone']}"
+
+
+def history_diff(old, new):
+    """
+  Rows prepended to a newest-first history list, {"new": rows, "size": len(new)}
+  Rows dropped off the end need no message, the client cuts its list at size.
+  When new is not old with rows prepended, {"new": new, "size": ..., "reset": True}.
+  """
+    if new == old:
+        return None
+    count = len(new)
+    if old:
+        count = next((i for i, row in enumerate(new) if row == old[0]), None)
+        if count is None or new[count:] != old[:len(new) - count]:
+            return {"new": new, "size": len(new), "reset": True}
+    return {"new": new[:count], "size": len(new)}
+
+
+def state_diff(old, new):
+    """
+  Changes from one dashboard state to the next, None when there are none
+  changed: top-level fields whose value differs, sent whole;
+  tags: {"set": new or changed tags, "removed": tag_key() of the gone ones};
+  history: see history_diff()
+  """
+    diff = {}
+    changed = {key: value for key, value in new.items()
+               if key not in ("tags", "history") and (key not in old or old[key] != value)}
+    if changed:
+        diff["changed"] = changed
+    old_tags = {tag_key(tag): tag for tag in old.get("tags", [])}
+    new_tags = {tag_key(tag): tag for tag in new.get("tags", [])}
+    updated = [tag for key, tag in new_tags.items() if old_tags.get(key) != tag]
+    removed = [key for key in old_tags if key not in new_tags]
+    if updated or removed:
+        diff["tags"] = {"set": updated, "removed": removed}
+    history = history_diff(old.get("history", []), new.get("history", []))
+    if history is not None:
+        diff["history"] = history
+    return diff or None
+
+
+class StatePush:
+    """
+  Server-Sent Events feed of a StateStore
+  While at least one client is attached, a thread follows the store's
+  versions, no faster than rate per second, and publishes the diff between
+  consecutive snapshots it saw (see state_diff), JSON encoded once for all
+  clients. A client gets a full "snapshot" event first (the snapshot's cached
+  JSON), and again whenever it missed a diff; after that only "diff" events.
+  A comment line is sent when nothing has changed for keepalive seconds, so
+  proxies keep the connection open.
+  """
+
+    def __init__(self, store, rate=5.0, keepalive=15.0, name="PUSH"):
+        self.store = store
+        self.rate = rate
+        self.keepalive = keepalive
+        self.name = name
+        self.snapshot = None  # Latest snapshot seen by the thread
+        self.base = None      # Version the current diff event applies to
+        self.event = None
+        self.clients = 0
+        self.diffs = 0
+        self.snapshots = 0
+        self.thread = None
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _message(version, kind, data):
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (version, kind.encode(), data)
+
+    @contextmanager
+    def subscribe(self):
+        with self._cond:
+            self.clients += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def _run(self):
+        previous = None
+        while True:
+            with self._cond:
+                if self.clients == 0:
+                    self.thread = None
+                    self.snapshot = None
+                    return
+            snapshot = self.store.wait(previous.version if previous is not None else 0, timeout=1.0)
+            if snapshot is previous:
+                continue
+            try:
+                diff = state_diff(previous.data, snapshot.data) if previous is not None else None
+                event = self._message(snapshot.version, "diff", encode_json(diff).encode()) if diff else None
+                with self._cond:
+                    self.base = previous.version if previous is not None else None
+                    self.snapshot, self.event = snapshot, event
+                    self._cond.notify_all()
+                if event is not None:
+                    self.diffs += 1
+                previous = snapshot
+            except Exception as e:
+                print(f"[{self.name}] State push error: {e}")
+            time.sleep(1.0 / self.rate)
+
+    def stream(self):
+        """
+    text/event-stream body for one client
+    """
+        with self.subscribe():
+            version = None
+            while True:
+                with self._cond:
+                    if not self._cond.wait_for(lambda: self.snapshot is not None and self.snapshot.version != version,
+                                               self.keepalive):
+                        message = SSE_KEEPALIVE
+                    elif self.event is not None and self.base == version:
+                        message = self.event
+                        version = self.snapshot.version
+                    else:
+                        message = self._message(self.snapshot.version, "snapshot", self.snapshot.json())
+                        version = self.snapshot.version
+                        self.snapshots += 1
+                yield message
+
+    def stats(self):
+        return {"clients": self.clients, "version": self.snapshot.version if self.snapshot else None,
+                "diffs": self.diffs, "snapshots": self.snapshots}
@@ -0,0 +1,120 @@
+import json
+import threading
+from types import MappingProxyType
+
+
+def freeze(value):
+    """
+  Read-only copy of a JSON-like value: dicts become MappingProxyType, lists tuples
+  """
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    # numpy scalars from the vision loops
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_json(payload):
+    return json.dumps(payload, separators=(",", ":"), default=_json_default)
+
+
+class Snapshot:
+    """
+  One published state: its version and read-only data
+  json() is encoded on first use and kept, so every reader of this version
+  shares one encoding.
+  """
+
+    __slots__ = ("version", "data", "_json")
+
+    def __init__(self, version, data):
+        self.version = version
+        self.data = data
+        self._json = None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def json(self):
+        # Two readers may both encode a fresh snapshot; either result is the same
+        if self._json is None:
+            self._json = encode_json(self.data).encode()
+        return self._json
+
+
+class StateStore:
+    """
+  Versioned, immutable state shared between threads
+  Writers call update() or modify(); when that changes any value, a new
+  Snapshot with the next version replaces the current one. Readers take
+  current() without locking (one attribute read) and see a consistent state
+  for as long as they hold it. Values that did not change are shared between
+  snapshots, and a write that changes nothing publishes nothing.
+  """
+
+    def __init__(self, initial):
+        self._snapshot = Snapshot(1, freeze(initial))
+        self._cond = threading.Condition()
+        self.publishes = 0
+
+    def current(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def _publish(self, changes):
+        data = self._snapshot.data
+        frozen = {}
+        for key, value in changes.items():
+            if key in data and data[key] is value:
+                continue
+            value = freeze(value)
+            if key not in data or data[key] != value:
+                frozen[key] = value
+        if frozen:
+            self._snapshot = Snapshot(self._snapshot.version + 1, MappingProxyType(dict(data, **frozen)))
+            self.publishes += 1
+            self._cond.notify_all()
+        return self._snapshot
+
+    def update(self, changes=None, **fields):
+        """
+    Publish new values for some fields; return the resulting snapshot
+    """
+        with self._cond:
+            return self._publish(dict(changes or {}, **fields))
+
+    def modify(self, edit):
+        """
+    edit(data) changes a mutable shallow copy of the current data, under the
+    writer lock, for updates that depend on the current values
+    """
+        with self._cond:
+            data = dict(self._snapshot.data)
+            edit(data)
+            return self._publish(data)
+
+    def wait(self, version, timeout=None):
+        """
+    Wait for a version newer than the given one; return the current snapshot
+    """
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot.version > version, timeout)
+            return self._snapshot
+
+    def stats(self):
+        return {"version": self._snapshot.version, "publishes": self.publishes}
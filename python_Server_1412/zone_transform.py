@@ -0,0 +1,166 @@
+import math
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Per-tag results of ZoneTransform.apply(), all indexed like the input centers
+# zones: zone dict or None; robot: (N, 2) robot XY; z_pick: (N,) pick Z;
+# processed: (N,) bool, True where the zone is picked from by this camera
+TransformResult = namedtuple("TransformResult", ["zones", "robot", "z_pick", "processed"])
+
+
+def zone_polygon(zone):
+    """
+  Outline of a zone as an (M, 2) int array: its "points" when given,
+  otherwise the x/y/w/h rectangle
+  """
+    if zone.get('points'):
+        return np.array(zone['points'], dtype=np.int32).reshape(-1, 2)
+    x, y, w, h = int(zone['x']), int(zone['y']), int(zone['w']), int(zone['h'])
+    return np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.int32)
+
+
+def zone_bounds(zone):
+    """
+  Bounding box (x0, y0, x1, y1) of a rectangle or polygon zone
+  """
+    points = zone_polygon(zone)
+    return (int(points[:, 0].min()), int(points[:, 1].min()),
+            int(points[:, 0].max()), int(points[:, 1].max()))
+
+
+def zone_label_image(zones, cell=1):
+    """
+  Label raster of a zone list: each pixel (or cell x cell block) holds the
+  index of the first zone containing it, len(zones) where there is none
+  Rectangles keep the strict x < cx < x + w test of integer centers, also for
+  fractional x/y/w/h (pixels floor(x) + 1 .. ceil(x + w) - 1); polygons
+  include their outline.
+  """
+    count = len(zones)
+    # +3: zone_bounds() truncates, the raster reaches ceil(x + w) - 1
+    width = max([zone_bounds(z)[2] for z in zones], default=0) + 3
+    height = max([zone_bounds(z)[3] for z in zones], default=0) + 3
+    label = np.full((height, width), count, dtype=np.uint8 if count < 255 else np.uint16)
+    # Paint in reverse so the first zone in the list wins where zones overlap
+    for index in range(count - 1, -1, -1):
+        zone = zones[index]
+        if zone.get('points'):
+            cv2.fillPoly(label, [zone_polygon(zone)], int(index))
+        else:
+            x0, x1 = math.floor(zone['x']) + 1, math.ceil(zone['x'] + zone['w'])
+            y0, y1 = math.floor(zone['y']) + 1, math.ceil(zone['y'] + zone['h'])
+            label[max(0, y0):max(0, y1), max(0, x0):max(0, x1)] = index
+    return label[::cell, ::cell].copy() if cell > 1 else label
+
+
+def zone_contains(zone, point):
+    """
+  Exact test of one (x, y) point: strict x < px < x + w for rectangles,
+  outline included for polygons
+  """
+    if zone.get('points'):
+        return cv2.pointPolygonTest(zone_polygon(zone), (float(point[0]), float(point[1])), False) >= 0
+    return (zone['x'] < point[0] < zone['x'] + zone['w']
+            and zone['y'] < point[1] < zone['y'] + zone['h'])
+
+
+def idw_correct(points, ref, offsets, z, power=3.0, snap=0.1):
+    """
+  Inverse-distance-weighted correction for an (N, 2) array of robot XY
+  ref (M, 2) are the calibration points, offsets (M, 2) their XY correction
+  and z (M,) their measured height. A point closer than snap to a calibration
+  point takes that point's values exactly.
+  Return (corrected XY (N, 2), Z (N,))
+  """
+    diff = points[:, None, :] - ref[None, :, :]
+    dist = np.sqrt((diff ** 2).sum(axis=2))
+    with np.errstate(divide="ignore"):
+        weight = 1.0 / dist ** power
+    nearest = dist.argmin(axis=1)
+    snapped = dist[np.arange(len(points)), nearest] < snap
+    weight[snapped] = 0.0
+    weight[snapped, nearest[snapped]] = 1.0
+    weight /= weight.sum(axis=1, keepdims=True)
+    corrected = points + weight @ offsets
+    # The calibration point's own corrected XY, not this point plus its offset
+    corrected[snapped] = ref[nearest[snapped]] + offsets[nearest[snapped]]
+    return corrected, weight @ z
+
+
+class ZoneTransform:
+    """
+  Pixel to robot mapping for every tag of a frame in one batch
+  pick: {zone_id: ("affine", z_pick) or ("idw", z_offset)} for the zones this
+  camera picks from. "affine" zones use their matrix and a fixed pick height;
+  "idw" zones correct the affine result with the calibration points and pick at
+  the interpolated height plus z_offset. Zones without a matrix keep pixel
+  coordinates. Build a new instance whenever zones, matrices or points change.
+  Zones are located through a label raster (see zone_label_image), so zone
+  shape and count do not change the per-tag cost; cell > 1 trades precision
+  at zone edges for a smaller raster. Centers that are not whole pixels are
+  located with the exact per-zone test instead.
+  """
+
+    def __init__(self, zones, matrices, pick, idw_points=(), idw_power=3.0, cell=1):
+        self.zone_list = list(zones)
+        count = len(self.zone_list)
+        self.cell = cell
+        self.label = zone_label_image(self.zone_list, cell)
+        self.zone_ids = np.array([int(z['id']) for z in self.zone_list], dtype=np.int64)
+        # One 2x3 matrix per zone (plus identity for "no zone" at index count)
+        self.matrices = np.tile(np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]), (count + 1, 1, 1))
+        self.mode = np.zeros(count + 1, dtype=np.int8)  # 0 = not picked, 1 = affine, 2 = idw
+        self.z_value = np.zeros(count + 1)
+        for i, zone_id in enumerate(self.zone_ids):
+            if int(zone_id) in matrices:
+                self.matrices[i] = np.asarray(matrices[int(zone_id)], dtype=np.float64)
+            if int(zone_id) in pick:
+                mode, value = pick[int(zone_id)]
+                self.mode[i] = 1 if mode == "affine" else 2
+                self.z_value[i] = value
+        self.idw_ref = np.array([[p['ref_x'], p['ref_y']] for p in idw_points], dtype=np.float64).reshape(-1, 2)
+        self.idw_offsets = np.array([[p['true_x'] - p['ref_x'], p['true_y'] - p['ref_y']]
+                                     for p in idw_points], dtype=np.float64).reshape(-1, 2)
+        self.idw_z = np.array([p['true_z'] for p in idw_points], dtype=np.float64)
+        self.idw_power = idw_power
+
+    def locate(self, centers):
+        """
+    Index of the first zone containing each center, len(zones) for none
+    """
+        x = np.floor(centers[:, 0]).astype(np.int64) // self.cell
+        y = np.floor(centers[:, 1]).astype(np.int64) // self.cell
+        height, width = self.label.shape
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        index = np.full(len(centers), len(self.zone_list), dtype=np.int64)
+        index[inside] = self.label[y[inside], x[inside]]
+        # The raster holds the answer for whole-pixel centers only
+        for i in np.nonzero((centers != np.floor(centers)).any(axis=1))[0]:
+            index[i] = next((k for k, zone in enumerate(self.zone_list) if zone_contains(zone, centers[i])),
+                            len(self.zone_list))
+        return index
+
+    def apply(self, centers, tag_ids=None, tag_offset=None):
+        """
+    centers: (N, 2) pixel centers; tag_offset(zone_id, tag_id) adds a per-tag
+    height correction to "affine" zones
+    """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        index = self.locate(centers)
+        homogeneous = np.hstack([centers, np.ones((len(centers), 1))])
+        robot = np.einsum("nij,nj->ni", self.matrices[index], homogeneous)
+        mode = self.mode[index]
+        z_pick = self.z_value[index].copy()
+
+        idw = mode == 2
+        if idw.any() and len(self.idw_ref):
+            robot[idw], z = idw_correct(robot[idw], self.idw_ref, self.idw_offsets, self.idw_z, self.idw_power)
+            z_pick[idw] += z
+        if tag_offset is not None and tag_ids is not None:
+            for i in np.nonzero(mode == 1)[0]:
+                z_pick[i] += tag_offset(int(self.zone_ids[index[i]]), tag_ids[i])
+
+        zones = [self.zone_list[i] if i < len(self.zone_list) else None for i in index]
+        return TransformResult(zones, robot, z_pick, mode > 0)
@@ -6,6 +6,73 @@ export async function getRobotData() {
   return axios.get(API_ENDPOINTS.data);
 }
 
+// eslint-disable-next-line @typescript-eslint/no-explicit-any
+export type RobotData = Record<string, any>;
+
+// Must match tag_key() in python_Server_1412/web_push.py
+const tagKey = (tag: RobotData) => `${tag.id}@${tag.zone}`;
+
+type Listener = { onData: (data: RobotData) => void; onError?: () => void };
+
+// One EventSource per tab, shared by every subscriber and closed with the last one
+let source: EventSource | null = null;
+let state: RobotData | null = null;
+let tags = new Map<string, RobotData>();
+const listeners = new Set<Listener>();
+
+const publish = (data: RobotData) => listeners.forEach((listener) => listener.onData(data));
+
+function open() {
+  source = new EventSource(API_ENDPOINTS.dataEvents);
+
+  source.addEventListener('snapshot', (event) => {
+    state = JSON.parse((event as MessageEvent).data) as RobotData;
+    tags = new Map((state.tags as RobotData[]).map((tag) => [tagKey(tag), tag]));
+    publish(state);
+  });
+
+  source.addEventListener('diff', (event) => {
+    if (!state) return;
+    const diff = JSON.parse((event as MessageEvent).data);
+    const next: RobotData = { ...state, ...diff.changed };
+    if (diff.tags) {
+      diff.tags.removed.forEach((key: string) => tags.delete(key));
+      diff.tags.set.forEach((tag: RobotData) => tags.set(tagKey(tag), tag));
+      next.tags = Array.from(tags.values());
+    }
+    if (diff.history) {
+      next.history = diff.history.reset
+        ? diff.history.new
+        : [...diff.history.new, ...state.history].slice(0, diff.history.size);
+    }
+    state = next;
+    publish(state);
+  });
+
+  source.onerror = () => listeners.forEach((listener) => listener.onError?.());
+}
+
+// Live robot data pushed by the server (/data/events) instead of polling /data.
+// The first event is the full state; later ones only carry what changed.
+// EventSource reconnects by itself and the server starts again with a full state.
+// All subscribers share one connection; a late subscriber gets the current
+// state right away. Returns a function that unsubscribes.
+export function subscribeRobotData(onData: (data: RobotData) => void, onError?: () => void) {
+  const listener: Listener = { onData, onError };
+  listeners.add(listener);
+  if (!source) open();
+  else if (state) onData(state);
+  return () => {
+    listeners.delete(listener);
+    if (listeners.size === 0 && source) {
+      source.close();
+      source = null;
+      state = null;
+      tags = new Map();
+    }
+  };
+}
+
 export function getVideoFeedUrl() {
   return API_ENDPOINTS.videoFeed;
 }
@@ -4,7 +4,7 @@ import Typography from '@mui/material/Typography';
 import Box from '@mui/material/Box';
 import Stack from '@mui/material/Stack';
 import StackPolarChart from './StackPolarChart'; // ดึงไฟล์ที่เราเพิ่งสร้างมาใช้
-import { API_ENDPOINTS } from 'config/api';
+import { subscribeRobotData } from 'api/data';
 
 const CompletedTask = () => {
   
@@ -13,17 +13,14 @@ const CompletedTask = () => {
 
   // ดึงข้อมูลจาก Python
   useEffect(() => {
-    const interval = setInterval(() => {
-      fetch(API_ENDPOINTS.data)
-        .then((res) => res.json())
-        .then((data) => {
-          let h = data.stack_h;
-          if (h > MAX_STACK_HEIGHT) h = MAX_STACK_HEIGHT;
-          setStackHeight(h);
-        })
-        .catch(() => setStackHeight(0));
-    }, 200);
-    return () => clearInterval(interval);
+    return subscribeRobotData(
+      (data) => {
+        let h = data.stack_h;
+        if (h > MAX_STACK_HEIGHT) h = MAX_STACK_HEIGHT;
+        setStackHeight(h);
+      },
+      () => setStackHeight(0),
+    );
   }, []);
 
   return (
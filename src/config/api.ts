@@ -10,6 +10,7 @@ export const BASE_URL = "http://localhost:5000";
 export const API_ENDPOINTS = {
   // Data
   data: `${BASE_URL}/data`,
+  dataEvents: `${BASE_URL}/data/events`, // Server-Sent Events: snapshot, then diffs
 
   // Video Feeds
   videoFeed: `${BASE_URL}/video_feed`,
@@ -8,7 +8,7 @@ import RevenueByCustomer from 'components/sections/dashboard/Camera1'; // Camera
 import Products from 'components/sections/dashboard/Camera2'; // Camera 2
 import CompletedTask from 'components/sections/dashboard/Stack_Progress'; // Stack Chart
 import OrdersStatus from 'components/sections/dashboard/orders-status'; // Database Log
-import { API_ENDPOINTS } from 'config/api';
+import { subscribeRobotData } from 'api/data';
 
 const Dashboard = () => {
   // 1. State สำหรับเก็บข้อมูลทั้งหมดจาก Robot API
@@ -23,20 +23,12 @@ const Dashboard = () => {
     active_id: "-"
   });
 
-  // 2. Fetch Data loop (ดึงข้อมูลทุกๆ 0.2 วินาที)
+  // 2. Live data pushed by the server (only changes are sent)
   useEffect(() => {
-    const interval = setInterval(() => {
-      fetch(API_ENDPOINTS.data)
-        .then((res) => res.json())
-        .then((data) => {
-          setRobotData(data);
-        })
-        .catch(() => {
-          setRobotData(prev => ({ ...prev, status: "OFFLINE" }));
-        });
-    }, 200);
-
-    return () => clearInterval(interval);
+    return subscribeRobotData(
+      (data) => setRobotData(data as typeof robotData),
+      () => setRobotData(prev => ({ ...prev, status: "OFFLINE" })),
+    );
   }, []);
 
   // >>> 3. ตรวจสอบสถานะเพื่อทำ Visual Alarm (เพิ่มตรงนี้) <<<
@@ -3,6 +3,7 @@ import { Box, Typography, Stack, Chip, FormControlLabel, Switch } from '@mui/mat
 import AdsClickIcon from '@mui/icons-material/AdsClick';
 import PrecisionManufacturingIcon from '@mui/icons-material/PrecisionManufacturing';
 import { API_ENDPOINTS } from 'config/api';
+import { subscribeRobotData } from 'api/data';
 
 const InteractivePage = () => {
   const [lastClick, setLastClick] = useState<{x:number, y:number} | null>(null);
@@ -11,21 +12,17 @@ const InteractivePage = () => {
   const [targetPos, setTargetPos] = useState({ x: 0, y: 0 }); // [NEW] เก็บค่า XY
   const imgRef = useRef<HTMLImageElement>(null);
 
-  // [NEW] Polling Loop: ดึงข้อมูลจาก Server ทุก 500ms
+  // Live data pushed by the server (only changes are sent)
   useEffect(() => {
-    const interval = setInterval(() => {
-      fetch(API_ENDPOINTS.data)
-        .then(res => res.json())
-        .then(data => {
-          // อัปเดตข้อมูลบนหน้าจอ
-          if (data.robot_mode) setRobotMode(data.robot_mode);
-          if (data.status) setStatus(data.status);
-          if (data.target_x !== undefined) setTargetPos({ x: data.target_x, y: data.target_y });
-        })
-        .catch(() => setStatus("Connection Lost"));
-    }, 500);
-
-    return () => clearInterval(interval);
+    return subscribeRobotData(
+      (data) => {
+        // อัปเดตข้อมูลบนหน้าจอ
+        if (data.robot_mode) setRobotMode(data.robot_mode);
+        if (data.status) setStatus(data.status);
+        if (data.target_x !== undefined) setTargetPos({ x: data.target_x, y: data.target_y });
+      },
+      () => setStatus("Connection Lost"),
+    );
   }, []);
 
   const handleModeToggle = (e: React.ChangeEvent<HTMLInputElement>) => {